@@ -1,13 +1,19 @@
+from django.conf import settings
 from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
+from django.db import transaction
 from django.shortcuts import redirect
 from django.urls import path
-from django.http import HttpResponse
 from django.utils.html import format_html
-from .models import YouTubeComment, UserProfile, Plan, UserPlan
-import csv
-from io import TextIOWrapper
+from .models import (
+    YouTubeComment, UserProfile, Plan, UserPlan, AnalysisJob, DashboardSnapshot, ImportJob, EngagementAggregate,
+)
+from .aggregates import AGGREGATE_FIELDS, apply_aggregate_changes, reset_aggregates
+from .importers import get_import_mode
+from .import_jobs import delete_import_job, enqueue_import, run_import_job
+from .exporters import get_export_format, report_response
+from .versioning import bump_data_version, suspend_version_signals
 from datetime import datetime, timedelta
 
 # 管理画面のタイトルをカスタマイズ
@@ -111,12 +117,54 @@ class UserProfileAdmin(admin.ModelAdmin):
     search_fields = ('user__username', 'user__email')
     readonly_fields = ('created_at', 'updated_at')
 
+@admin.register(AnalysisJob)
+class AnalysisJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'data_key', 'status', 'created_at', 'started_at', 'finished_at')
+    list_filter = ('status',)
+    readonly_fields = ('data_key', 'status', 'error', 'created_at', 'started_at', 'finished_at')
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'file_name', 'owner', 'source_format', 'status', 'processed_rows', 'skipped_count', 'created_at', 'finished_at')
+    list_filter = ('status', 'source_format')
+    readonly_fields = (
+        'owner', 'source_format', 'mode', 'file_name', 'file_path', 'file_size', 'status',
+        'bytes_read', 'total_rows', 'processed_rows', 'created_count', 'updated_count',
+        'unchanged_count', 'skipped_count', 'error_report_path', 'message', 'error',
+        'created_at', 'started_at', 'finished_at',
+    )
+
+    def delete_model(self, request, obj):
+        # アップロードファイル・エラーレポートも削除
+        delete_import_job(obj)
+
+    def delete_queryset(self, request, queryset):
+        for job in queryset:
+            delete_import_job(job)
+
+@admin.register(DashboardSnapshot)
+class DashboardSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('id', 'data_key', 'payload_size', 'build_seconds', 'created_at')
+    readonly_fields = ('data_key', 'payload_size', 'build_seconds', 'created_at')
+    exclude = ('payload',)
+
+@admin.register(EngagementAggregate)
+class EngagementAggregateAdmin(admin.ModelAdmin):
+    list_display = ('scope', 'comment_count', 'like_sum', 'like_max', 'reply_sum', 'reply_max', 'maxima_stale', 'updated_at')
+    search_fields = ('scope', 'video_id')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 @admin.register(YouTubeComment)
 class YouTubeCommentAdmin(admin.ModelAdmin):
     list_display = ('id', 'author', 'owner', 'like_count', 'reply_count', 'created_at')
     list_filter = ('owner', 'created_at')
     search_fields = ('author', 'comment_text', 'video_id', 'owner__username')
-    readonly_fields = ('id',)
+    readonly_fields = ('id', 'embedding_dim')
     fieldsets = (
         ('基本情報', {
             'fields': ('video_id', 'comment_id', 'comment_text', 'author')
@@ -125,7 +173,7 @@ class YouTubeCommentAdmin(admin.ModelAdmin):
             'fields': ('like_count', 'reply_count', 'reply_depth_potential', 'engagement_score')
         }),
         ('その他', {
-            'fields': ('created_at', 'ai_reply', 'embedding', 'owner')
+            'fields': ('created_at', 'ai_reply', 'embedding_dim', 'owner')
         }),
     )
     change_list_template = "admin/myapp/youtubecomment/change_list.html"
@@ -147,6 +195,15 @@ class YouTubeCommentAdmin(admin.ModelAdmin):
         extra_context['current_plan'] = current_plan
         return super().changelist_view(request, extra_context=extra_context)
 
+    def delete_queryset(self, request, queryset):
+        # 一括削除時はデータバージョンの更新を1回にまとめる
+        removed = list(queryset.values_list(*AGGREGATE_FIELDS))
+        owner_ids = {row[0] for row in removed}
+        with transaction.atomic(), suspend_version_signals():
+            super().delete_queryset(request, queryset)
+            bump_data_version(owner_ids)
+            apply_aggregate_changes(removed=removed)
+
     # ✅ URLルーティング追加
     def get_urls(self):
         urls = super().get_urls()
@@ -160,25 +217,20 @@ class YouTubeCommentAdmin(admin.ModelAdmin):
     # ✅ CSVインポート機能
     def import_csv(self, request):
         if request.method == "POST" and request.FILES.get("csv_file"):
-            csv_file = TextIOWrapper(request.FILES["csv_file"].file, encoding="utf-8")
-            reader = csv.DictReader(csv_file)
-            count = 0
-            for row in reader:
-                YouTubeComment.objects.create(
-                    video_id=row.get("video_id"),
-                    comment_id=row.get("comment_id"),
-                    comment_text=row.get("comment_text"),
-                    author=row.get("author"),
-                    like_count=int(row.get("like_count") or 0),
-                    reply_count=int(row.get("reply_count") or 0),
-                    reply_depth_potential=int(row.get("reply_depth_potential") or 0),
-                    engagement_score=float(row.get("engagement_score") or 0),
-                    created_at=row.get("created_at") or None,
-                    ai_reply=row.get("ai_reply") if row.get("ai_reply") != "null" else None,
-                    embedding=row.get("embedding") if row.get("embedding") else None,
-                )
-                count += 1
-            messages.success(request, f"{count} 件のコメントをインポートしました。")
+            # ファイルを保存してインポートジョブとして処理（IMPORT_ASYNC=True の場合はワーカーに任せる）
+            run_async = getattr(settings, 'IMPORT_ASYNC', False)
+            job = enqueue_import(
+                request.FILES["csv_file"], ImportJob.FORMAT_CSV,
+                owner=request.user, mode=get_import_mode(request), run_inline=not run_async,
+            )
+            if run_async:
+                messages.info(request, f"{job.file_name} のインポートを受け付けました（インポートジョブ #{job.pk}）。")
+                return redirect("..")
+            job = run_import_job(job)
+            if job.status == ImportJob.STATUS_DONE:
+                messages.success(request, job.message)
+            else:
+                messages.error(request, job.message)
             return redirect("..")
 
         messages.error(request, "CSVファイルを選択してください。")
@@ -186,8 +238,12 @@ class YouTubeCommentAdmin(admin.ModelAdmin):
 
     # ✅ 全件削除機能（CSVと同じレベルに定義）
     def delete_all(self, request):
-        count = YouTubeComment.objects.count()
-        YouTubeComment.objects.all().delete()
+        owner_ids = list(YouTubeComment.objects.values_list('owner_id', flat=True).distinct())
+        with transaction.atomic(), suspend_version_signals():
+            _, deleted = YouTubeComment.objects.all().delete()
+            count = deleted.get(YouTubeComment._meta.label, 0)
+            bump_data_version(owner_ids)
+            reset_aggregates()
         messages.success(request, f"{count} 件のコメントを削除しました。")
         return redirect("..")
 
@@ -208,36 +264,22 @@ class YouTubeCommentAdmin(admin.ModelAdmin):
             messages.error(request, "この機能は有料プランのみ利用可能です。")
             return redirect("..")
         
-        # CSVレポートを生成
-        response = HttpResponse(content_type='text/csv; charset=utf-8-sig')
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        response['Content-Disposition'] = f'attachment; filename="youtube_comments_report_{timestamp}.csv"'
-        
-        writer = csv.writer(response)
-        
-        # ヘッダー行
-        writer.writerow([
-            'ID', 'Video ID', 'Comment ID', 'Author', 'Comment Text',
-            'Like Count', 'Reply Count', 'Engagement Score',
-            'Reply Depth Potential', 'Created At', 'AI Reply'
-        ])
+        # レポートを生成（件数が多くてもメモリに溜めずにストリーミングで送信する）
+        # ?format=csv|jsonl|parquet|arrow で形式を指定、?gzip=1 の場合は CSV / JSONL を gzip 圧縮
+        try:
+            export_format = get_export_format(request.GET.get('format'))
+        except ValueError:
+            messages.error(request, "指定された形式では出力できません（Parquet / Arrow には pyarrow が必要です）。")
+            return redirect("..")
         
-        # データ行
-        comments = YouTubeComment.objects.all().order_by('-created_at')
-        for comment in comments:
-            writer.writerow([
-                comment.id,
-                comment.video_id,
-                comment.comment_id,
-                comment.author,
-                comment.comment_text,
-                comment.like_count,
-                comment.reply_count,
-                comment.engagement_score,
-                comment.reply_depth_potential,
-                comment.created_at.strftime('%Y-%m-%d %H:%M:%S') if comment.created_at else '',
-                comment.ai_reply or '',
-            ])
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        comments = YouTubeComment.objects.order_by('-created_at')
+        response = report_response(
+            comments,
+            f"youtube_comments_report_{timestamp}",
+            export_format=export_format,
+            compress=request.GET.get('gzip') == '1',
+        )
         
-        messages.success(request, f"レポートを出力しました（{comments.count()}件）。")
+        messages.success(request, "レポートを出力しました。")
         return response
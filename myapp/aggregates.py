@@ -0,0 +1,290 @@
+"""
+いいね数・返信数の集計テーブル（EngagementAggregate）の管理
+
+ダッシュボードの統計（平均・最大・合計など）を表示するたびにコメントを全件集計しないよう、
+全体・ユーザー別・ユーザーの動画別に 件数・合計・二乗和・最大値 を保持しておき、
+コメントの変更時に F() 式の UPDATE で差分だけ反映する。読み込みは1行で済む。
+
+最大値は減らす方向の差分では更新できないため、最大値のコメントが削除・更新された場合は
+maxima_stale を立てておき、次に読む時にそのスコープだけ Max() で再計算する。
+"""
+import math
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import BooleanField, Count, ExpressionWrapper, F, FloatField, Max, Q, Sum
+from django.db.models.functions import Cast, Greatest, Now
+
+from .models import EngagementAggregate, YouTubeComment
+from .versioning import GLOBAL_SCOPE, owner_scope
+
+# 集計に使うコメントのフィールド（差分を計算する行のタプルの並び）
+AGGREGATE_FIELDS = ('owner_id', 'video_id', 'like_count', 'reply_count', 'engagement_score')
+
+
+def video_scope(owner_id, video_id):
+    return f"{owner_scope(owner_id)}:video:{video_id}"
+
+
+def aggregate_row(comment):
+    """コメントから差分計算用の行 (owner_id, video_id, いいね数, 返信数, エンゲージメントスコア) を作る"""
+    return tuple(getattr(comment, field) for field in AGGREGATE_FIELDS)
+
+
+def _scopes(owner_id, video_id):
+    return [
+        (GLOBAL_SCOPE, ''),
+        (owner_scope(owner_id), ''),
+        (video_scope(owner_id, video_id), video_id),
+    ]
+
+
+class _Delta:
+    """1スコープ分の差分"""
+
+    def __init__(self, video_id):
+        self.video_id = video_id
+        self.count = 0
+        self.like_sum = 0
+        self.like_sq_sum = 0.0
+        self.reply_sum = 0
+        self.reply_sq_sum = 0.0
+        self.engagement_sum = 0.0
+        # 追加された行の最大値・削除された行の最大値（None: 該当なし）
+        self.like_max = None
+        self.reply_max = None
+        self.removed_like_max = None
+        self.removed_reply_max = None
+
+    def add(self, like, reply, engagement, sign):
+        like = like or 0
+        reply = reply or 0
+        self.count += sign
+        self.like_sum += sign * like
+        self.like_sq_sum += sign * float(like) * like
+        self.reply_sum += sign * reply
+        self.reply_sq_sum += sign * float(reply) * reply
+        self.engagement_sum += sign * (engagement or 0.0)
+        if sign > 0:
+            self.like_max = like if self.like_max is None else max(self.like_max, like)
+            self.reply_max = reply if self.reply_max is None else max(self.reply_max, reply)
+        else:
+            self.removed_like_max = like if self.removed_like_max is None else max(self.removed_like_max, like)
+            self.removed_reply_max = reply if self.removed_reply_max is None else max(self.removed_reply_max, reply)
+
+    def update_kwargs(self):
+        kwargs = {
+            'comment_count': F('comment_count') + self.count,
+            'like_sum': F('like_sum') + self.like_sum,
+            'like_sq_sum': F('like_sq_sum') + self.like_sq_sum,
+            'reply_sum': F('reply_sum') + self.reply_sum,
+            'reply_sq_sum': F('reply_sq_sum') + self.reply_sq_sum,
+            'engagement_sum': F('engagement_sum') + self.engagement_sum,
+            'updated_at': Now(),
+        }
+        if self.like_max is not None:
+            kwargs['like_max'] = Greatest('like_max', self.like_max)
+            kwargs['reply_max'] = Greatest('reply_max', self.reply_max)
+        if self.removed_like_max is not None:
+            # 削除した値が現在の最大値以上なら、最大値が減った可能性がある
+            stale = (
+                Q(maxima_stale=True)
+                | Q(like_max__lte=self.removed_like_max, like_max__gt=0)
+                | Q(reply_max__lte=self.removed_reply_max, reply_max__gt=0)
+            )
+            kwargs['maxima_stale'] = ExpressionWrapper(stale, output_field=BooleanField())
+        return kwargs
+
+    def create_kwargs(self):
+        return {
+            'video_id': self.video_id,
+            'comment_count': self.count,
+            'like_sum': self.like_sum,
+            'like_sq_sum': self.like_sq_sum,
+            'like_max': self.like_max or 0,
+            'reply_sum': self.reply_sum,
+            'reply_sq_sum': self.reply_sq_sum,
+            'reply_max': self.reply_max or 0,
+            'engagement_sum': self.engagement_sum,
+        }
+
+
+def apply_aggregate_changes(added=(), removed=()):
+    """
+    コメントの追加・削除を集計テーブルに反映する（更新は 旧の値を削除 + 新しい値を追加）
+    added / removed は aggregate_row() 形式の行のイテラブル
+    コメントの変更と同じトランザクション内で呼ぶこと
+    """
+    deltas = {}
+    for rows, sign in ((added, 1), (removed, -1)):
+        for owner_id, video_id, like, reply, engagement in rows:
+            for scope, scope_video_id in _scopes(owner_id, video_id):
+                delta = deltas.get(scope)
+                if delta is None:
+                    delta = deltas[scope] = _Delta(scope_video_id)
+                delta.add(like, reply, engagement, sign)
+    if not deltas:
+        return
+
+    with transaction.atomic():
+        for scope in sorted(deltas):
+            delta = deltas[scope]
+            updated = EngagementAggregate.objects.filter(scope=scope).update(**delta.update_kwargs())
+            if updated or delta.count <= 0:
+                # 行がない状態での削除（集計前のデータなど）は無視する
+                continue
+            _, created = EngagementAggregate.objects.get_or_create(scope=scope, defaults=delta.create_kwargs())
+            if not created:
+                # 他の処理が同時に行を作成した場合
+                EngagementAggregate.objects.filter(scope=scope).update(**delta.update_kwargs())
+
+
+def _scope_queryset(aggregate):
+    """集計行に対応するコメントのクエリセット"""
+    queryset = YouTubeComment.objects.all()
+    if aggregate.scope == GLOBAL_SCOPE:
+        return queryset
+    owner_part = aggregate.scope.split(':')[1]
+    if owner_part == 'none':
+        queryset = queryset.filter(owner__isnull=True)
+    else:
+        queryset = queryset.filter(owner_id=int(owner_part))
+    if ':video:' in aggregate.scope:
+        queryset = queryset.filter(video_id=aggregate.video_id)
+    return queryset
+
+
+def refresh_maxima(aggregate):
+    """最大値を再計算する"""
+    maxima = _scope_queryset(aggregate).aggregate(like_max=Max('like_count'), reply_max=Max('reply_count'))
+    aggregate.like_max = maxima['like_max'] or 0
+    aggregate.reply_max = maxima['reply_max'] or 0
+    aggregate.maxima_stale = False
+    EngagementAggregate.objects.filter(pk=aggregate.pk).update(
+        like_max=aggregate.like_max,
+        reply_max=aggregate.reply_max,
+        maxima_stale=False,
+    )
+    return aggregate
+
+
+def _stddev(total, sq_total, count):
+    if count <= 0:
+        return 0.0
+    mean = total / count
+    return math.sqrt(max(0.0, sq_total / count - mean * mean))
+
+
+def get_engagement_stats(owner_id=None, video_id=None, scope=None):
+    """
+    集計テーブルから統計を取得する（コメントがない場合は None）
+    owner_id / video_id を省略すると全体の統計
+    """
+    if scope is None:
+        if video_id is not None:
+            scope = video_scope(owner_id, video_id)
+        elif owner_id is not None:
+            scope = owner_scope(owner_id)
+        else:
+            scope = GLOBAL_SCOPE
+    aggregate = EngagementAggregate.objects.filter(scope=scope).first()
+    if aggregate is None or aggregate.comment_count <= 0:
+        return None
+    if aggregate.maxima_stale:
+        refresh_maxima(aggregate)
+
+    count = aggregate.comment_count
+    return {
+        "total_comments": count,
+        "avg_likes": aggregate.like_sum / count,
+        "avg_replies": aggregate.reply_sum / count,
+        "max_likes": aggregate.like_max,
+        "max_replies": aggregate.reply_max,
+        "total_likes": aggregate.like_sum,
+        "total_replies": aggregate.reply_sum,
+        "std_likes": _stddev(aggregate.like_sum, aggregate.like_sq_sum, count),
+        "std_replies": _stddev(aggregate.reply_sum, aggregate.reply_sq_sum, count),
+        "avg_engagement": aggregate.engagement_sum / count,
+    }
+
+
+def _group_rows(queryset):
+    """(owner_id, video_id) ごとの集計をコメントテーブルから求める"""
+    return (
+        queryset.order_by()
+        .values('owner_id', 'video_id')
+        .annotate(
+            comment_count=Count('id'),
+            like_sum=Sum('like_count'),
+            like_sq_sum=Sum(Cast('like_count', FloatField()) * Cast('like_count', FloatField())),
+            like_max=Max('like_count'),
+            reply_sum=Sum('reply_count'),
+            reply_sq_sum=Sum(Cast('reply_count', FloatField()) * Cast('reply_count', FloatField())),
+            reply_max=Max('reply_count'),
+            engagement_sum=Sum('engagement_score'),
+        )
+    )
+
+
+_SUM_FIELDS = ('comment_count', 'like_sum', 'like_sq_sum', 'reply_sum', 'reply_sq_sum', 'engagement_sum')
+_MAX_FIELDS = ('like_max', 'reply_max')
+
+
+def _merge(target, values):
+    for field in _SUM_FIELDS:
+        target[field] = target.get(field, 0) + (values[field] or 0)
+    for field in _MAX_FIELDS:
+        target[field] = max(target.get(field, 0), values[field] or 0)
+
+
+def rebuild_aggregates(owner_ids=None):
+    """
+    集計テーブルをコメントテーブルから作り直す
+    owner_ids を指定した場合はそのユーザー分だけ作り直し、全体の行はユーザー別の行から再計算する
+    """
+    with transaction.atomic():
+        if owner_ids is None:
+            EngagementAggregate.objects.all().delete()
+            queryset = YouTubeComment.objects.all()
+        else:
+            owner_ids = set(owner_ids)
+            scopes = Q(pk__in=[])
+            owners = Q(pk__in=[])
+            for owner_id in owner_ids:
+                scope = owner_scope(owner_id)
+                scopes |= Q(scope=scope) | Q(scope__startswith=f"{scope}:video:")
+                owners |= Q(owner__isnull=True) if owner_id is None else Q(owner_id=owner_id)
+            EngagementAggregate.objects.filter(scopes).delete()
+            queryset = YouTubeComment.objects.filter(owners)
+
+        per_owner = defaultdict(dict)
+        rows = []
+        for values in _group_rows(queryset).iterator():
+            owner_id, video_id = values['owner_id'], values['video_id']
+            _merge(per_owner[owner_id], values)
+            rows.append(EngagementAggregate(
+                scope=video_scope(owner_id, video_id),
+                video_id=video_id,
+                **{field: values[field] or 0 for field in _SUM_FIELDS + _MAX_FIELDS},
+            ))
+        rows.extend(
+            EngagementAggregate(scope=owner_scope(owner_id), **values)
+            for owner_id, values in per_owner.items()
+        )
+        EngagementAggregate.objects.bulk_create(rows, batch_size=1000)
+
+        # 全体の行 = ユーザー別の行の合計
+        EngagementAggregate.objects.filter(scope=GLOBAL_SCOPE).delete()
+        owner_rows = EngagementAggregate.objects.filter(scope__startswith='owner:').exclude(scope__contains=':video:')
+        total = {}
+        stale = False
+        for values in owner_rows.values(*_SUM_FIELDS, *_MAX_FIELDS, 'maxima_stale').iterator():
+            _merge(total, values)
+            stale = stale or values['maxima_stale']
+        if total.get('comment_count'):
+            EngagementAggregate.objects.create(scope=GLOBAL_SCOPE, maxima_stale=stale, **total)
+
+
+def reset_aggregates():
+    """全コメント削除時: 集計をすべて削除する"""
+    EngagementAggregate.objects.all().delete()
@@ -0,0 +1,352 @@
+"""
+ダッシュボードの分析処理（グラフ・統計・アドバイス・3Dクラスタリング）
+
+NumPy / SciPy / scikit-learn / Janome を使うため、このモジュールは起動時には読み込まない。
+views・URLconf・管理画面・管理コマンドからは直接 import せず、
+分析結果が必要になった時点（snapshots.build_snapshot）で初めて読み込まれる。
+起動時間の確認: python manage.py check_import_time
+"""
+import math
+import re
+from collections import Counter
+from datetime import timezone as dt_timezone
+
+import numpy as np
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer
+
+from .aggregates import get_engagement_stats, rebuild_aggregates
+from .clustering import cluster_comments, clustering_quality
+from .instrumentation import timed
+from .models import YouTubeComment
+from .tokenization import extract_words_bulk
+
+
+def clean_text(text):
+    """Basic text cleaning: URLs, mentions, excessive symbols."""
+    if text is None or (isinstance(text, float) and math.isnan(text)):
+        return ""
+    
+    text = str(text)
+    # Remove URLs
+    text = re.sub(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', '', text)
+    # Remove mentions (e.g., @username)
+    text = re.sub(r'@\w+', '', text)
+    # Remove excessive whitespace
+    text = re.sub(r'\s+', ' ', text)
+    # Remove excessive symbols (keep basic punctuation)
+    text = re.sub(r'[^\w\s.,!?;:()\-]', '', text)
+    return text.strip()
+
+
+def top_term_indices(weights, k):
+    """Indices of the k largest positive weights, highest first (argpartition, no full sort)."""
+    k = min(k, len(weights))
+    if k == 0:
+        return np.array([], dtype=int)
+    top = np.argpartition(-weights, k - 1)[:k]
+    top = top[np.argsort(-weights[top], kind='stable')]
+    return top[weights[top] > 0]
+
+
+def cluster_term_weights(comments, labels, vectorizer, n_clusters):
+    """
+    TF-IDF weight of every term for each cluster, as an (n_clusters x terms) array.
+
+    Equivalent (up to each row's L2 norm, which does not change the ranking) to
+    transforming each cluster's comments joined into one document: raw term
+    counts are summed per cluster with a single sparse indicator-matrix product
+    and scaled by the vectorizer's idf. Summing the normalized TF-IDF rows instead
+    would down-weight the terms of long comments. Bigrams spanning two comments,
+    which the joined document produced, are not counted.
+    """
+    labels = np.asarray(labels, dtype=int)
+    # Raw term counts from the fitted vocabulary (TfidfVectorizer.transform without the idf/norm step)
+    counts = CountVectorizer.transform(vectorizer, comments)
+    # (n_clusters x N) indicator matrix: row i selects the comments of cluster i
+    indicator = sparse.csr_matrix(
+        (np.ones(len(labels), dtype=counts.dtype), (labels, np.arange(len(labels)))),
+        shape=(n_clusters, len(labels)),
+    )
+    return (indicator @ counts).toarray() * vectorizer.idf_
+
+
+@timed('analyze_cluster_features')
+def analyze_cluster_features(comments, cluster_labels, vectorizer, n_clusters):
+    """
+    Analyze features of each cluster and generate summary.
+
+    Term weights for all clusters come from cluster_term_weights (one pass over
+    the comments); sizes, lengths, word counts and members from one pass over the labels.
+    """
+    cluster_analyses = []
+    if len(comments) == 0:
+        return cluster_analyses
+    
+    # Get feature names from vectorizer
+    feature_names = vectorizer.get_feature_names_out()
+    
+    labels = np.asarray(cluster_labels, dtype=int)
+    cluster_weights = cluster_term_weights(comments, labels, vectorizer, n_clusters)
+    cluster_sizes = np.bincount(labels, minlength=n_clusters)
+    length_sums = np.bincount(labels, weights=[len(c) for c in comments], minlength=n_clusters)
+    
+    # Extract meaningful words from comments using morphological analysis
+    # (cached per comment text, so unchanged comments are not tokenized again)
+    comment_words = extract_words_bulk(comments)
+    word_freqs = [Counter() for _ in range(n_clusters)]
+    members = [[] for _ in range(n_clusters)]
+    for j, label in enumerate(labels):
+        word_freqs[label].update(comment_words[j])
+        members[label].append(j)
+    
+    for i in range(n_clusters):
+        if cluster_sizes[i] == 0:
+            continue
+        
+        # Get top keywords: combine TF-IDF and frequency-based approach
+        # First, get TF-IDF top keywords
+        tfidf_keywords = [feature_names[idx] for idx in top_term_indices(cluster_weights[i], 15)]
+        
+        # Get top frequent words (at least 2 occurrences)
+        frequent_words = [word for word, count in word_freqs[i].most_common(20) if count >= 2]
+        
+        # Combine and deduplicate, prioritize frequent words
+        combined_keywords = []
+        seen = set()
+        
+        # Add frequent words first (they are more reliable)
+        for word in frequent_words[:5]:
+            if word not in seen and len(word) >= 2:
+                combined_keywords.append(word)
+                seen.add(word)
+        
+        # Add TF-IDF keywords that aren't already included
+        for keyword in tfidf_keywords:
+            if keyword not in seen and len(keyword) >= 2:
+                combined_keywords.append(keyword)
+                seen.add(keyword)
+        
+        # Get top 3 keywords
+        top_keywords = combined_keywords[:3]
+        
+        # Generate summary
+        avg_length = length_sums[i] / cluster_sizes[i]
+        sample_comments = [comments[j] for j in members[i][:3]]  # Sample comments
+        
+        cluster_analyses.append({
+            'cluster_id': i,
+            'comment_count': int(cluster_sizes[i]),
+            'top_keywords': top_keywords,  # Top 3 keywords (unified)
+            'avg_comment_length': round(float(avg_length), 1),
+            'sample_comments': sample_comments
+        })
+    
+    return cluster_analyses
+
+
+@timed('perform_clustering')
+def perform_clustering(comment_texts, n_clusters=6, refit=False):
+    """
+    Perform 3D clustering on a list of comment texts.
+    The stored clustering model is reused unless drift is detected or refit=True.
+    """
+    if not comment_texts:
+        return None
+    
+    try:
+        # Extract and clean comments
+        comments = [clean_text(text) for text in comment_texts]
+        comments = [c for c in comments if c and len(c.strip()) > 0]  # Remove empty comments
+        
+        # Limit max clusters to 6
+        max_clusters = min(6, n_clusters)
+        if len(comments) < max_clusters:
+            max_clusters = max(2, len(comments) // 2)
+        
+        if len(comments) < 2:
+            return None
+        
+        # Vectorize, reduce to 3D and cluster (reusing the fitted model when possible)
+        model, _, vectors_3d, cluster_labels, refitted = cluster_comments(
+            comments, max_clusters, refit=refit
+        )
+        vectorizer = model.vectorizer
+        quality = clustering_quality(model, vectors_3d, cluster_labels)
+        
+        # Analyze cluster features
+        cluster_analyses = analyze_cluster_features(comments, cluster_labels, vectorizer, max_clusters)
+        
+        # Calculate cluster centers and radii for sphere visualization
+        cluster_centers = []
+        cluster_radii = []
+        for i in range(max_clusters):
+            mask = cluster_labels == i
+            if np.sum(mask) > 0:
+                cluster_points = vectors_3d[mask]
+                center = np.mean(cluster_points, axis=0)
+                # Calculate radius as max distance from center to points in cluster
+                distances = np.linalg.norm(cluster_points - center, axis=1)
+                radius = np.max(distances) if len(distances) > 0 else 0.1
+                cluster_centers.append(center.tolist())
+                cluster_radii.append(float(radius))
+            else:
+                cluster_centers.append([0, 0, 0])
+                cluster_radii.append(0.1)
+        
+        # Add jitter to points to prevent overlapping
+        # Calculate the overall scale of the data
+        data_range = np.max(vectors_3d, axis=0) - np.min(vectors_3d, axis=0)
+        jitter_scale = np.mean(data_range) * 0.02  # 2% of average range
+        
+        # Add small random offset to each point
+        np.random.seed(42)  # For reproducibility
+        jitter = np.random.normal(0, jitter_scale, vectors_3d.shape)
+        vectors_3d_jittered = vectors_3d + jitter
+        
+        # Prepare data for visualization
+        cluster_data = {
+            'x': vectors_3d_jittered[:, 0].tolist(),
+            'y': vectors_3d_jittered[:, 1].tolist(),
+            'z': vectors_3d_jittered[:, 2].tolist(),
+            'cluster_labels': cluster_labels.tolist(),
+            'comments': comments,
+            'explained_variance': model.explained_variance,
+            'n_clusters': max_clusters,
+            'cluster_centers': cluster_centers,
+            'cluster_radii': cluster_radii,
+            'cluster_analyses': cluster_analyses,
+            'model_refitted': refitted,
+            'reducer': model.reducer_method,
+            'engine': quality['engine'],
+            'inertia': quality['inertia'],
+            'silhouette': quality['silhouette'],
+        }
+        
+        return cluster_data
+    except Exception as e:
+        import traceback
+        print(f"Clustering error: {e}")
+        print(traceback.format_exc())
+        return None
+
+
+def epoch_seconds(value):
+    """日時をUNIX秒に変換する（タイムゾーンなしの日時はUTCとして扱う、None はそのまま）"""
+    if value is None:
+        return None
+    if timezone.is_naive(value):
+        value = value.replace(tzinfo=dt_timezone.utc)
+    return int(value.timestamp())
+
+
+def build_dashboard_data(refit=False):
+    """
+    ダッシュボード用のグラフ・統計・分析・アドバイス・クラスタリング結果を計算する
+    indexビュー（同期モード）と分析ワーカー（run_analysis_worker）の両方から呼ばれる
+    refit=True の場合はクラスタリングモデルを再学習する
+    """
+    graph_data = None
+    stats = None
+    analysis = None
+    advice = None
+    cluster_data = None
+
+    # グラフ・クラスタリング用には最新の最大300件を使用
+    rows = list(YouTubeComment.objects.values_list(
+        "like_count",
+        "reply_count",
+        "created_at",
+        "author",
+        "comment_text",
+    )[:300])
+    
+    if rows:
+        likes, replies, created_ats, authors, texts = zip(*rows)
+
+        # タイムスタンプを数値（UNIX秒）に変換
+        timestamps = [epoch_seconds(created_at) for created_at in created_ats]
+        
+        # グラフ用のデータをリスト形式に変換
+        graph_data = {
+            "x": list(likes),
+            "y": list(replies),
+            "z": timestamps,
+            "text": [
+                f"Author: {author}<br>Likes: {like}<br>Replies: {reply}<br>Comment: {text[:50]}..."
+                for author, like, reply, text in zip(authors, likes, replies, texts)
+            ],
+            "colors": timestamps,  # 色分け用
+        }
+
+        # 統計情報は集計テーブルから取得（全コメント分、コメントの変更時に差分で更新済み）
+        stats = get_engagement_stats()
+        if stats is None:
+            # 集計テーブルが未作成の場合のみ、コメントテーブルから作り直す
+            rebuild_aggregates()
+            stats = get_engagement_stats()
+        
+        # 分析結果とアドバイスを生成（有料プラン・無料プラン両方で生成）
+        if stats is not None:
+            # 高/低エンゲージメントの件数は全コメントを対象に1回の集計クエリで数える
+            counts = YouTubeComment.objects.aggregate(
+                high=Count('id', filter=Q(like_count__gt=stats["avg_likes"], reply_count__gt=stats["avg_replies"])),
+                low=Count('id', filter=Q(like_count__lt=stats["avg_likes"], reply_count__lt=stats["avg_replies"])),
+            )
+            
+            engagement_ratio = counts["high"] / stats["total_comments"] * 100
+            
+            analysis = {
+                "high_engagement_count": counts["high"],
+                "low_engagement_count": counts["low"],
+                "engagement_ratio": round(engagement_ratio, 1),
+                "top_comment_likes": stats["max_likes"],
+                "top_comment_replies": stats["max_replies"],
+            }
+            
+            # アドバイスを生成
+            advice_items = []
+            
+            if stats["avg_likes"] < 5:
+                advice_items.append("平均いいね数が低い傾向にあります。コメントの内容をより具体的で価値のあるものにすることで、エンゲージメントを向上させることができます。")
+            
+            if stats["avg_replies"] < 2:
+                advice_items.append("返信数が少ない傾向にあります。質問形式のコメントや議論を促す内容を増やすことで、コミュニティの活性化につながります。")
+            
+            if engagement_ratio < 20:
+                advice_items.append("高エンゲージメントコメントの割合が低いです。視聴者の興味を引く話題や、タイムリーな内容を意識することで改善できます。")
+            
+            if counts["high"] > 0:
+                top_likes, top_replies = (
+                    YouTubeComment.objects.order_by('-like_count', F('created_at').desc(nulls_last=True), '-id')
+                    .values_list('like_count', 'reply_count')
+                    .first()
+                )
+                advice_items.append(f"最もエンゲージメントが高いコメントは{top_likes}いいね、{top_replies}返信を獲得しています。このようなコメントの特徴を分析し、同様のアプローチを他のコメントにも適用することをお勧めします。")
+            
+            if stats["max_likes"] > stats["avg_likes"] * 3:
+                advice_items.append("一部のコメントが非常に高いエンゲージメントを獲得しています。これらの成功パターンを分析し、コンテンツ戦略に反映させることで、全体的なエンゲージメント向上が期待できます。")
+            
+            if not advice_items:
+                advice_items.append("現在のエンゲージメント状況は良好です。継続的な分析と改善により、さらなる成長が期待できます。")
+            
+            advice = advice_items
+        
+            # 3Dクラスタリング処理
+            try:
+                cluster_data = perform_clustering(list(texts), n_clusters=6, refit=refit)
+            except Exception as e:
+                import traceback
+                print(f"Clustering failed: {e}")
+                print(traceback.format_exc())
+                cluster_data = None
+
+    return {
+        "graph": graph_data,
+        "stats": stats,
+        "analysis": analysis,
+        "advice": advice,
+        "cluster": cluster_data,
+    }
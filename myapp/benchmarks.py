@@ -0,0 +1,428 @@
+"""
+分析・インポートなど重い処理のベンチマーク（python manage.py run_benchmarks）
+
+youtube_comments_200.csv を元に、日本語・英語の合成コメントを指定件数（1k / 10k / 100k / 1m）生成し、
+以下の処理時間・件数あたりのスループット・ピークメモリ（tracemalloc）を計測する。
+
+- import_csv / import_json: アップロード後と同じインポートジョブの処理（run_import_job）
+- perform_clustering / analyze_cluster_features / extract_japanese_words: ダッシュボードの分析処理
+- index_cold / index_warm: ダッシュボード（HTMLと分析結果のデータAPI。キャッシュ・スナップショットなし / あり）
+- export_report: 管理画面のレポート出力（CSV / Parquet）
+- portal_search: ポータルのコメント検索
+
+計測はテスト用データベースとプロセス内のキャッシュ（LocMemCache）で行い、結果は JSON で保存する（コミット間の比較用）。
+設定された共有キャッシュ（file / sqlite / redis）には読み書きしない。
+"""
+import csv
+import gc
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from . import snapshots
+from .aggregates import reset_aggregates
+from .exporters import FORMAT_CSV, FORMAT_PARQUET, PYARROW_AVAILABLE
+from .import_jobs import get_spool_dir, run_import_job
+from .models import DashboardSnapshot, ImportJob, Plan, UserPlan, YouTubeComment
+from .versioning import bump_data_version, suspend_version_signals
+from .views import DASHBOARD_SECTIONS
+
+SIZES = {'1k': 1000, '10k': 10000, '100k': 100000, '1m': 1000000}
+LANGUAGES = ('ja', 'en')
+
+BENCHMARKS = (
+    'import_csv', 'import_json',
+    'perform_clustering', 'analyze_cluster_features', 'extract_japanese_words',
+    'index_cold', 'index_warm', 'export_report', 'portal_search',
+)
+
+# 件数に比例して時間がかかる分析処理は、先頭からこの件数までで計測する
+ROW_LIMITS = {
+    'perform_clustering': 100000,
+    'analyze_cluster_features': 100000,
+    'extract_japanese_words': 20000,
+}
+
+SAMPLE_CSV = os.path.join(settings.BASE_DIR, 'youtube_comments_200.csv')
+BENCHMARK_USERNAME = 'benchmark'
+SEARCH_QUERIES = {'ja': ['編集', 'わかりやすい', '音質'], 'en': ['editing', 'tutorial', 'audio']}
+
+ENGLISH_PHRASES = [
+    "Great video, thanks for sharing!",
+    "The editing is really clean this time.",
+    "Could you make a follow-up tutorial on this?",
+    "The audio quality improved a lot.",
+    "I learned something new today.",
+    "A bit fast, but the content is solid.",
+    "Please keep this series going!",
+    "The thumbnail got me, the video kept me.",
+    "This explanation finally made it click for me.",
+    "Love the background music choice.",
+    "Watching this from Brazil, great stuff.",
+    "Can you share the settings you used?",
+    "The pacing felt just right.",
+    "This deserves way more views.",
+    "I tried it myself and it worked!",
+]
+ENGLISH_TOPICS = ['editing', 'tutorial', 'audio', 'camera', 'lighting', 'gameplay', 'music', 'recipe', 'travel', 'coding']
+JAPANESE_TOPICS = ['編集', '解説', '音質', 'カメラ', '照明', 'ゲーム', '音楽', '料理', '旅行', 'プログラミング']
+BASE_TIME = datetime(2025, 11, 7, 12, 0, 0)
+
+
+# ------------------------------------------------------------
+# 合成データ
+# ------------------------------------------------------------
+def load_sample_rows(path=SAMPLE_CSV):
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def generate_rows(n_rows, lang, seed=0, sample_rows=None):
+    """
+    サンプルCSVの本文・投稿者・動画ID・いいね数の分布を元に合成コメントを n_rows 件生成する
+    本文にはトピック語と番号を加え、語彙が件数とともに増えるようにする
+    """
+    sample_rows = sample_rows or load_sample_rows()
+    rng = random.Random(f"{seed}:{lang}")
+    texts = [row['comment_text'] for row in sample_rows] if lang == 'ja' else ENGLISH_PHRASES
+    topics = JAPANESE_TOPICS if lang == 'ja' else ENGLISH_TOPICS
+    authors = sorted({row['author'] for row in sample_rows})
+    video_ids = sorted({row['video_id'] for row in sample_rows})
+    likes = [int(row['like_count'] or 0) for row in sample_rows]
+    replies = [int(row['reply_count'] or 0) for row in sample_rows]
+
+    for i in range(n_rows):
+        topic = rng.choice(topics)
+        if lang == 'ja':
+            text = f"{rng.choice(texts)} {topic}の話{rng.randint(1, 50)}も{rng.choice(texts)}"
+        else:
+            text = f"{rng.choice(texts)} More {topic} #{rng.randint(1, 50)} please. {rng.choice(texts)}"
+        like = rng.choice(likes)
+        reply = rng.choice(replies)
+        yield {
+            'video_id': rng.choice(video_ids),
+            'comment_id': f"{lang}{i:08d}",
+            'comment_text': text,
+            'author': f"{rng.choice(authors)}{rng.randint(0, 999)}",
+            'like_count': like,
+            'reply_count': reply,
+            'reply_depth_potential': 0,
+            'engagement_score': round(like * 0.7 + reply * 1.5, 2),
+            'created_at': (BASE_TIME - timedelta(minutes=rng.randint(0, 90 * 24 * 60))).strftime('%Y-%m-%d %H:%M:%S'),
+        }
+
+
+def write_csv(rows, path):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = None
+        for row in rows:
+            if writer is None:
+                writer = csv.DictWriter(f, fieldnames=list(row))
+                writer.writeheader()
+            writer.writerow(row)
+
+
+def write_json(rows, path):
+    """JSON配列として書き出す（全件をメモリに持たないよう1件ずつ書く）"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('[')
+        for i, row in enumerate(rows):
+            f.write(',\n' if i else '\n')
+            f.write(json.dumps(row, ensure_ascii=False))
+        f.write('\n]\n')
+
+
+# ------------------------------------------------------------
+# 計測
+# ------------------------------------------------------------
+def measure(func, trace_memory=True):
+    """func() を1回実行して (戻り値, 秒, ピークメモリMB) を返す"""
+    gc.collect()
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        value = func()
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else 0
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    return value, elapsed, peak / 1024 / 1024
+
+
+def max_rss_mb():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KB、macOS はバイト
+    return usage / 1024 / 1024 if sys.platform == 'darwin' else usage / 1024
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def format_result(result):
+    label = result['benchmark'] + (f"[{result['format']}]" if result.get('format') else '')
+    line = f"  {label:30s} {result['rows']:>8d} 件 {result['seconds']:10.4f}秒"
+    if result['rows_per_sec'] is not None:
+        line += f" {result['rows_per_sec']:>12,.1f} 件/秒"
+    if result['peak_memory_mb'] is not None:
+        line += f" ピーク {result['peak_memory_mb']:8.2f} MB"
+    return line
+
+
+def clear_comments():
+    """ベンチマーク用データベースのコメントと関連する集計・キャッシュを削除する"""
+    with suspend_version_signals():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {connection.ops.quote_name(YouTubeComment._meta.db_table)}')
+        reset_aggregates()
+        bump_data_version(list(User.objects.values_list('pk', flat=True)) + [None])
+    clear_dashboard_caches()
+
+
+def clear_dashboard_caches():
+    # run_benchmarks はプロセス内のキャッシュに差し替えてから呼ぶ（共有キャッシュを消さないため）
+    cache.clear()
+    DashboardSnapshot.objects.all().delete()
+    snapshots._decoded.clear()
+    from .tokenization import clear_token_cache
+    clear_token_cache()
+
+
+def get_benchmark_user():
+    """ポータル検索・レポート出力用のユーザー（有料プラン・スタッフ）"""
+    user, _ = User.objects.get_or_create(
+        username=BENCHMARK_USERNAME, defaults={'is_staff': True, 'is_superuser': True},
+    )
+    plan, _ = Plan.objects.get_or_create(name='pro', defaults={'display_name': 'Proプラン', 'is_premium': True})
+    UserPlan.objects.update_or_create(user=user, defaults={'plan': plan, 'is_active': True})
+    return user
+
+
+class BenchmarkRunner:
+    """1つの (言語, 件数) のデータセットに対してベンチマークを順に実行する"""
+
+    def __init__(self, only=None, trace_memory=True, log=print):
+        self.only = set(only or BENCHMARKS)
+        self.trace_memory = trace_memory
+        self.log = log
+        self.results = []
+        self.user = get_benchmark_user()
+        self.sample_rows = load_sample_rows()
+
+    def _record(self, name, lang, rows, func, output_bytes=False, **extra):
+        """func() を計測して結果に追加する（output_bytes=True の場合、戻り値を出力サイズとして記録）"""
+        if name not in self.only:
+            return None
+        value, seconds, peak_mb = measure(func, self.trace_memory)
+        result = {
+            'benchmark': name,
+            'lang': lang,
+            'rows': rows,
+            'seconds': round(seconds, 4),
+            'rows_per_sec': round(rows / seconds, 1) if seconds > 0 else None,
+            'peak_memory_mb': round(peak_mb, 2) if self.trace_memory else None,
+            **extra,
+        }
+        if output_bytes:
+            result['bytes'] = value
+        self.results.append(result)
+        self.log(format_result(result))
+        return value
+
+    # --- インポート -------------------------------------------------
+    def _run_import(self, path, source_format):
+        # アップロードと同じくスプール用ディレクトリにコピーしてからジョブを実行する（コピーは計測外）
+        spooled = os.path.join(get_spool_dir(), f"benchmark-{os.getpid()}.{source_format}")
+        shutil.copyfile(path, spooled)
+        job = ImportJob.objects.create(
+            owner=self.user, source_format=source_format, file_name=os.path.basename(path),
+            file_path=spooled, file_size=os.path.getsize(spooled),
+        )
+
+        def run():
+            result = run_import_job(job)
+            if result.status != ImportJob.STATUS_DONE:
+                raise RuntimeError(f"import failed: {result.message} {result.error}")
+            return result
+
+        return run
+
+    # --- 分析 -------------------------------------------------------
+    def _texts(self, limit):
+        from .analytics import clean_text
+        texts = YouTubeComment.objects.order_by('-created_at', '-id').values_list('comment_text', flat=True)
+        return [text for text in (clean_text(t) for t in texts[:limit].iterator(chunk_size=2000)) if text]
+
+    def run_analysis(self, lang, n_rows):
+        from .analytics import analyze_cluster_features, perform_clustering
+        from .clustering import cluster_comments
+        from .tokenization import extract_japanese_words
+
+        if self.only & {'perform_clustering', 'analyze_cluster_features'}:
+            texts = self._texts(min(n_rows, ROW_LIMITS['perform_clustering']))
+            self._record(
+                'perform_clustering', lang, len(texts),
+                lambda: perform_clustering(texts, n_clusters=6, refit=True),
+            )
+            if 'analyze_cluster_features' in self.only:
+                model, _, _, labels, _ = cluster_comments(texts, 6)
+                self._record(
+                    'analyze_cluster_features', lang, len(texts),
+                    lambda: analyze_cluster_features(texts, labels, model.vectorizer, 6),
+                )
+
+        if 'extract_japanese_words' in self.only:
+            texts = self._texts(min(n_rows, ROW_LIMITS['extract_japanese_words']))
+            clear_dashboard_caches()
+            # 1件ずつ呼ぶ（キャッシュが空の状態）
+            self._record(
+                'extract_japanese_words', lang, len(texts),
+                lambda: [extract_japanese_words(text) for text in texts],
+            )
+
+    # --- ビュー -----------------------------------------------------
+    def _get(self, client, url, data=None):
+        response = client.get(url, data or {})
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {url} returned {response.status_code}")
+        if response.streaming:
+            return sum(len(chunk) for chunk in response.streaming_content)
+        return len(response.content)
+
+    def _get_dashboard(self, client):
+        """ブラウザと同じく、HTMLの後に分析結果のデータAPIを読み込む"""
+        size = self._get(client, reverse('index'))
+        for section in DASHBOARD_SECTIONS:
+            size += self._get(client, reverse('dashboard_section', args=[section]))
+        return size
+
+    def run_views(self, lang, n_rows):
+        client = Client()
+        if self.only & {'index_cold', 'index_warm'}:
+            clear_dashboard_caches()
+            self._record('index_cold', lang, n_rows, lambda: self._get_dashboard(client))
+            self._record('index_warm', lang, n_rows, lambda: self._get_dashboard(client))
+
+        client.force_login(self.user)
+        if 'export_report' in self.only:
+            url = reverse('admin:export_report')
+            formats = [FORMAT_CSV] + ([FORMAT_PARQUET] if PYARROW_AVAILABLE else [])
+            for export_format in formats:
+                self._record(
+                    'export_report', lang, n_rows,
+                    lambda: self._get(client, url, {'format': export_format}),
+                    output_bytes=True, format=export_format,
+                )
+
+        if 'portal_search' in self.only:
+            queries = SEARCH_QUERIES[lang]
+
+            def search():
+                cache.clear()
+                return [self._get(client, reverse('portal:comment_list'), {'search': q}) for q in queries]
+
+            self._record('portal_search', lang, n_rows, search, queries=len(queries))
+
+    # --- データセット -----------------------------------------------
+    def run_dataset(self, lang, n_rows, workdir):
+        self.log(f"== {lang} {n_rows} rows")
+        csv_path = os.path.join(workdir, f"{lang}-{n_rows}.csv")
+        json_path = os.path.join(workdir, f"{lang}-{n_rows}.json")
+        write_csv(generate_rows(n_rows, lang, sample_rows=self.sample_rows), csv_path)
+        write_json(generate_rows(n_rows, lang, sample_rows=self.sample_rows), json_path)
+
+        clear_comments()
+        if 'import_json' in self.only:
+            self._record('import_json', lang, n_rows, self._run_import(json_path, ImportJob.FORMAT_JSON))
+            clear_comments()
+        # 以降のベンチマークは CSV からインポートしたデータを使う
+        load = self._run_import(csv_path, ImportJob.FORMAT_CSV)
+        if 'import_csv' in self.only:
+            self._record('import_csv', lang, n_rows, load)
+        else:
+            load()
+
+        self.run_analysis(lang, n_rows)
+        self.run_views(lang, n_rows)
+        clear_comments()
+        os.remove(csv_path)
+        os.remove(json_path)
+
+
+def run_benchmarks(sizes, languages, only=None, trace_memory=True, log=print):
+    """ベンチマークを実行して結果（JSONに保存する辞書）を返す"""
+    workdir = tempfile.mkdtemp(prefix='benchmarks-')
+    started = time.perf_counter()
+    # DEBUG=True だと実行したSQLがすべて connection.queries に溜まるため無効にする
+    overrides = override_settings(DEBUG=False, ANALYSIS_ASYNC=False, IMPORT_ASYNC=False)
+    try:
+        with overrides:
+            runner = BenchmarkRunner(only=only, trace_memory=trace_memory, log=log)
+            for size in sizes:
+                for lang in languages:
+                    runner.run_dataset(lang, SIZES[size], workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'sizes': list(sizes),
+            'languages': list(languages),
+            'trace_memory': trace_memory,
+            'total_seconds': round(time.perf_counter() - started, 2),
+            'max_rss_mb': round(max_rss_mb(), 1),
+        },
+        'results': runner.results,
+    }
+
+
+def result_key(result):
+    return (result['benchmark'], result['lang'], result['rows'], result.get('format'))
+
+
+def compare_results(current, baseline):
+    """
+    前回の結果と比較して (ベンチマーク, 前回の秒, 今回の秒, 比率) のリストを返す
+    比率が 1 より大きいほど遅くなっている
+    """
+    previous = {result_key(result): result for result in baseline['results']}
+    rows = []
+    for result in current['results']:
+        before = previous.get(result_key(result))
+        if before is None or not before['seconds']:
+            continue
+        rows.append((result_key(result), before['seconds'], result['seconds'], result['seconds'] / before['seconds']))
+    return rows
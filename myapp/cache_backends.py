@@ -0,0 +1,169 @@
+"""
+外部サービスなしで複数プロセス（同じホストのワーカー）から共有できるキャッシュバックエンド
+
+LocMemCache はプロセスごとに別々のキャッシュを持つため、ワーカーが増えるほど
+同じ計算が重複し、single-flight のロック（myapp.caching）もプロセス内でしか効かない。
+settings.CACHE_BACKEND で 'file' / 'sqlite' を選ぶと以下のバックエンドが使われる。
+
+- FileCache: Django の FileBasedCache に、ロック取得に使う add() の排他制御を加えたもの
+- SQLiteCache: 1つの SQLite ファイル（WALモード）にキーと値を保存する
+"""
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+import zlib
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files import locks
+
+# set() のたびに期限切れの行を掃除する確率
+CULL_PROBABILITY = 0.01
+
+
+class FileCache(FileBasedCache):
+    """
+    FileBasedCache.add() は「存在確認 → 書き込み」の間に他のプロセスが割り込めるため、
+    ディレクトリ単位のロックファイルで add() を直列化する
+    """
+
+    lock_filename = 'add.lock'
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._createdir()
+        with open(os.path.join(self._dir, self.lock_filename), 'ab') as lock_file:
+            locks.lock(lock_file, locks.LOCK_EX)
+            try:
+                return super().add(key, value, timeout, version)
+            finally:
+                locks.unlock(lock_file)
+
+
+class SQLiteCache(BaseCache):
+    """
+    SQLite ファイルを使うキャッシュ（LOCATION にファイルのパスを指定）
+    接続はスレッドごとに作り、fork 後のプロセスでは作り直す（autocommit、add() のみ明示的なトランザクション）
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = os.path.abspath(location)
+        self._local = threading.local()
+
+    # ------------------------------------------------------------
+    # 接続
+    # ------------------------------------------------------------
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        conn = sqlite3.connect(self._path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache ('
+            ' key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)')
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _encode(self, value):
+        return zlib.compress(pickle.dumps(value, self.pickle_protocol))
+
+    def _decode(self, blob):
+        return pickle.loads(zlib.decompress(blob))
+
+    def _write(self, conn, key, value, timeout, replace):
+        expires = self.get_backend_timeout(timeout)
+        verb = 'INSERT OR REPLACE' if replace else 'INSERT OR IGNORE'
+        cursor = conn.execute(
+            f'{verb} INTO cache (key, value, expires) VALUES (?, ?, ?)',
+            (key, self._encode(value), expires),
+        )
+        return cursor.rowcount > 0
+
+    def _cull(self, conn):
+        conn.execute('DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?', (time.time(),))
+        if self._cull_frequency == 0:
+            return
+        count = conn.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count >= self._max_entries:
+            conn.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY expires IS NULL, expires LIMIT ?)',
+                (count // self._cull_frequency,),
+            )
+
+    # ------------------------------------------------------------
+    # BaseCache API
+    # ------------------------------------------------------------
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(
+            'SELECT value, expires FROM cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return default
+        return self._decode(row[0])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        conn = self._connection()
+        if timeout == 0:
+            conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+            return
+        if random.random() < CULL_PROBABILITY:
+            self._cull(conn)
+        self._write(conn, key, value, timeout, replace=True)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        conn = self._connection()
+        # BEGIN IMMEDIATE で書き込みロックを取り、期限切れの削除と追加を不可分に行う
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'DELETE FROM cache WHERE key = ? AND expires IS NOT NULL AND expires <= ?',
+                (key, time.time()),
+            )
+            added = timeout != 0 and self._write(conn, key, value, timeout, replace=False)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute(
+            'UPDATE cache SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), key, time.time()),
+        )
+        return cursor.rowcount > 0
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute('DELETE FROM cache WHERE key = ?', (key,))
+        return cursor.rowcount > 0
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(
+            'SELECT 1 FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # 接続はスレッドごとに使い回す（リクエストごとに閉じない）
+        pass
@@ -0,0 +1,127 @@
+"""
+重い計算結果のキャッシュ: single-flight と stale-while-revalidate
+
+キャッシュの期限が切れた瞬間に全ワーカーが同じ計算（クラスタリングなど）を始めないよう、
+再計算は cache.add() で取ったロックを持つ1プロセスだけが行う。
+- 古い値（期限切れ後 stale_timeout 秒以内）がある場合: ロックを取れなかったリクエストは古い値を返す
+- 値がない場合: ロックを取れなかったリクエストは計算が終わるまで待つ（lock_timeout まで）
+
+ロックは共有キャッシュ（settings.CACHE_BACKEND = 'file' / 'sqlite' / 'redis'）を使う場合に
+プロセス間で有効になる。LocMemCache ではプロセス内のスレッド間でのみ有効。
+"""
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+from .instrumentation import record_cache
+
+DEFAULT_STALE_TIMEOUT = 10 * 60
+DEFAULT_LOCK_TIMEOUT = 2 * 60
+# 他のプロセスの計算結果を待つ間の確認間隔（秒）
+WAIT_INTERVAL = 0.1
+
+
+def get_stale_timeout():
+    return getattr(settings, 'CACHE_STALE_TIMEOUT', DEFAULT_STALE_TIMEOUT)
+
+
+def get_lock_timeout():
+    return getattr(settings, 'CACHE_LOCK_TIMEOUT', DEFAULT_LOCK_TIMEOUT)
+
+
+@contextmanager
+def cache_lock(name, timeout=None):
+    """
+    キャッシュを使った排他ロック。with の値はロックを取得できたかどうか
+    計算中にプロセスが落ちてもロックは timeout 秒で自動的に外れる
+    """
+    key = f"lock:{name}"
+    token = uuid.uuid4().hex
+    acquired = cache.add(key, token, timeout or get_lock_timeout())
+    try:
+        yield acquired
+    finally:
+        # 期限切れ後に他のプロセスが取り直したロックは消さない
+        if acquired and cache.get(key) == token:
+            cache.delete(key)
+
+
+def wait_for(fetch, timeout=None, interval=WAIT_INTERVAL):
+    """fetch() が None 以外を返すまで待つ（timeout 秒を過ぎたら None）"""
+    deadline = time.monotonic() + (timeout or get_lock_timeout())
+    while True:
+        value = fetch()
+        if value is not None or time.monotonic() >= deadline:
+            return value
+        time.sleep(interval)
+
+
+def _store(key, value, timeout, stale_timeout):
+    if timeout is None:
+        # 期限なし: 古い値にならない
+        cache.set(key, (None, value), None)
+    else:
+        cache.set(key, (time.time() + timeout, value), timeout + stale_timeout)
+    return value
+
+
+def _fresh_value(key):
+    """期限内の値を (あるかどうか, 値) で返す"""
+    entry = cache.get(key)
+    if entry is None:
+        return False, None
+    fresh_until, value = entry
+    return fresh_until is None or fresh_until > time.time(), value
+
+
+def get_or_compute(key, compute, timeout=DEFAULT_TIMEOUT, stale_timeout=None, lock_timeout=None):
+    """
+    キャッシュから値を取得し、なければ compute() で計算して保存する
+
+    timeout 秒を過ぎた値は stale_timeout 秒の間「古い値」として保持され、
+    再計算中は他のリクエストに古い値を返す（compute() の結果に None は使えない）
+    timeout を省略した場合はキャッシュの TIMEOUT 設定を使い、None の場合は期限なしで保存する（古い値にはならない）
+    """
+    if timeout is DEFAULT_TIMEOUT:
+        timeout = cache.default_timeout
+    if stale_timeout is None:
+        stale_timeout = get_stale_timeout()
+    lock_timeout = lock_timeout or get_lock_timeout()
+
+    entry = cache.get(key)
+    if entry is not None:
+        fresh_until, value = entry
+        if fresh_until is None or fresh_until > time.time():
+            record_cache(True)
+            return value
+        # 古い値: 1プロセスだけが再計算し、それ以外は古い値をそのまま返す
+        with cache_lock(key, lock_timeout) as acquired:
+            if acquired:
+                # ロックを取る直前に他のプロセスが再計算を終えていればそれを使う
+                fresh, latest = _fresh_value(key)
+                if fresh:
+                    record_cache(True)
+                    return latest
+                record_cache(False)
+                return _store(key, compute(), timeout, stale_timeout)
+        # 古い値を返した場合もヒットとして数える
+        record_cache(True)
+        return value
+
+    record_cache(False)
+    with cache_lock(key, lock_timeout) as acquired:
+        if acquired:
+            # ロックを取る直前に他のプロセスが計算を終えていればそれを使う
+            fresh, latest = _fresh_value(key)
+            if fresh:
+                return latest
+            return _store(key, compute(), timeout, stale_timeout)
+    # 他のプロセスが計算中: 結果を待つ（時間内に終わらなければ自分で計算する）
+    entry = wait_for(lambda: cache.get(key), lock_timeout)
+    if entry is not None:
+        return entry[1]
+    return _store(key, compute(), timeout, stale_timeout)
@@ -0,0 +1,347 @@
+"""
+Reusable clustering model for the dashboard.
+
+The fitted TF-IDF vectorizer, 3D projection and KMeans centroids are stored in
+the ClusteringModel table. New comments are transformed and assigned with
+predict(); a full refit only happens when drift crosses a threshold or when
+it is requested explicitly (python manage.py refit_clustering).
+
+TF-IDF vectors stay sparse (float32) and are projected to 3D with TruncatedSVD
+directly on the sparse matrix (settings.CLUSTERING_REDUCER = 'svd'), so memory
+no longer grows with N x features. 'pca' keeps the previous dense PCA path;
+compare_reducers() reports how close the two projections are.
+
+KMeans runs n_init full Lloyd restarts over every point, so above
+settings.CLUSTERING_MINIBATCH_THRESHOLD comments MiniBatchKMeans is used
+instead (settings.CLUSTERING_ENGINE = 'auto' | 'kmeans' | 'minibatch').
+fit_clustering_stream() fits the minibatch engine chunk by chunk with
+partial_fit, and clustering_quality() reports inertia and silhouette so the
+two engines can be compared.
+"""
+import itertools
+import logging
+import pickle
+
+import numpy as np
+from django.conf import settings
+from scipy.linalg import subspace_angles
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.decomposition import PCA, TruncatedSVD
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics import adjusted_rand_score, silhouette_score
+
+from .models import ClusteringModel
+
+logger = logging.getLogger(__name__)
+
+# Refit when the mean distance to the nearest centroid grows by this factor
+DEFAULT_DRIFT_THRESHOLD = 1.5
+# Refit when this share of comments has no known vocabulary (all-zero TF-IDF rows)
+DEFAULT_UNSEEN_THRESHOLD = 0.2
+
+REDUCER_SVD = 'svd'
+REDUCER_PCA = 'pca'
+REDUCERS = (REDUCER_SVD, REDUCER_PCA)
+
+ENGINE_AUTO = 'auto'
+ENGINE_KMEANS = 'kmeans'
+ENGINE_MINIBATCH = 'minibatch'
+ENGINES = (ENGINE_AUTO, ENGINE_KMEANS, ENGINE_MINIBATCH)
+
+# 'auto' switches to MiniBatchKMeans at this many comments
+DEFAULT_MINIBATCH_THRESHOLD = 5000
+DEFAULT_MINIBATCH_SIZE = 1024
+# Silhouette is O(n^2); score a random sample of at most this many points
+SILHOUETTE_SAMPLE_SIZE = 2000
+
+# In-process cache of the unpickled model: {model id: fitted objects}
+_loaded = {}
+
+
+class FittedClustering:
+    """Fitted vectorizer / projection / KMeans bundle."""
+
+    def __init__(self, vectorizer, reducer, kmeans, mean_distance=0.0, n_samples=0, pk=None):
+        self.vectorizer = vectorizer
+        self.reducer = reducer
+        self.kmeans = kmeans
+        self.mean_distance = mean_distance
+        self.n_samples = n_samples
+        self.pk = pk
+
+    @property
+    def n_clusters(self):
+        return self.kmeans.n_clusters
+
+    @property
+    def explained_variance(self):
+        return float(self.reducer.explained_variance_ratio_.sum())
+
+    @property
+    def reducer_method(self):
+        return REDUCER_PCA if isinstance(self.reducer, PCA) else REDUCER_SVD
+
+    @property
+    def engine(self):
+        return ENGINE_MINIBATCH if isinstance(self.kmeans, MiniBatchKMeans) else ENGINE_KMEANS
+
+    def transform(self, comments):
+        """Vectorize and project comments with the fitted objects."""
+        vectors = self.vectorizer.transform(comments)
+        vectors_3d = project(self.reducer, vectors)
+        return vectors, vectors_3d
+
+    def assign(self, vectors_3d):
+        """Return (labels, distance to the assigned centroid) for projected points."""
+        distances = self.kmeans.transform(vectors_3d)
+        labels = distances.argmin(axis=1)
+        return labels, distances[np.arange(len(labels)), labels]
+
+
+def get_reducer_method(method=None):
+    """Reducer name from the argument or settings.CLUSTERING_REDUCER."""
+    method = method or getattr(settings, 'CLUSTERING_REDUCER', REDUCER_SVD)
+    if method not in REDUCERS:
+        raise ValueError(f"unknown reducer: {method}")
+    return method
+
+
+def get_engine(n_samples, engine=None):
+    """Resolve the clustering engine; 'auto' picks MiniBatchKMeans for large inputs."""
+    engine = engine or getattr(settings, 'CLUSTERING_ENGINE', ENGINE_AUTO)
+    if engine not in ENGINES:
+        raise ValueError(f"unknown clustering engine: {engine}")
+    if engine != ENGINE_AUTO:
+        return engine
+    threshold = getattr(settings, 'CLUSTERING_MINIBATCH_THRESHOLD', DEFAULT_MINIBATCH_THRESHOLD)
+    return ENGINE_MINIBATCH if n_samples >= threshold else ENGINE_KMEANS
+
+
+def make_kmeans(n_clusters, engine):
+    if engine == ENGINE_MINIBATCH:
+        return MiniBatchKMeans(
+            n_clusters=n_clusters,
+            batch_size=getattr(settings, 'CLUSTERING_MINIBATCH_SIZE', DEFAULT_MINIBATCH_SIZE),
+            n_init=3,
+            random_state=42,
+        )
+    return KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
+
+
+def make_vectorizer():
+    return TfidfVectorizer(
+        max_features=1000,
+        stop_words=None,
+        ngram_range=(1, 2),
+        min_df=1,
+        max_df=0.95,
+        dtype=np.float32,
+    )
+
+
+def make_reducer(method):
+    if method == REDUCER_PCA:
+        return PCA(n_components=3, random_state=42)
+    return TruncatedSVD(n_components=3, algorithm='randomized', random_state=42)
+
+
+def project(reducer, vectors):
+    """Project TF-IDF vectors to 3D. Only PCA needs a dense copy of the matrix."""
+    if isinstance(reducer, PCA):
+        return reducer.transform(vectors.toarray())
+    return reducer.transform(vectors)
+
+
+def fit_reducer(method, vectors):
+    """Fit the 3D projection. Returns (reducer, vectors_3d)."""
+    reducer = make_reducer(method)
+    if method == REDUCER_PCA:
+        return reducer, reducer.fit_transform(vectors.toarray())
+    return reducer, reducer.fit_transform(vectors)
+
+
+def fit_clustering(comments, n_clusters, reducer_method=None, engine=None):
+    """Fit a new clustering model. Returns (model, vectors, vectors_3d, labels)."""
+    vectorizer = make_vectorizer()
+    vectors = vectorizer.fit_transform(comments)
+
+    reducer, vectors_3d = fit_reducer(get_reducer_method(reducer_method), vectors)
+
+    kmeans = make_kmeans(n_clusters, get_engine(len(comments), engine))
+    kmeans.fit(vectors_3d)
+
+    model = FittedClustering(vectorizer, reducer, kmeans, n_samples=len(comments))
+    labels, distances = model.assign(vectors_3d)
+    model.mean_distance = float(distances.mean()) if len(distances) else 0.0
+    return model, vectors, vectors_3d, labels
+
+
+def fit_clustering_stream(chunks, n_clusters, reducer_method=None, sample_size=None):
+    """
+    Fit a MiniBatchKMeans model over an iterable of comment chunks (lists of
+    cleaned texts), e.g. a queryset read with .iterator().
+
+    The vectorizer and the 3D projection are fitted on the first sample_size
+    comments; every chunk is then transformed and fed to partial_fit, so only
+    one chunk is held in memory at a time. Returns (model, sample_3d, sample_labels)
+    where the sample is what mean_distance and clustering_quality() are measured on.
+    """
+    if sample_size is None:
+        sample_size = getattr(settings, 'CLUSTERING_MINIBATCH_THRESHOLD', DEFAULT_MINIBATCH_THRESHOLD)
+    chunks = iter(chunks)
+    sample = []
+    pending = []
+    for chunk in chunks:
+        take = sample_size - len(sample)
+        sample.extend(chunk[:take])
+        if chunk[take:]:
+            pending.append(chunk[take:])
+        if len(sample) >= sample_size:
+            break
+    if len(sample) < n_clusters:
+        raise ValueError(f"need at least {n_clusters} comments, got {len(sample)}")
+
+    vectorizer = make_vectorizer()
+    sample_vectors = vectorizer.fit_transform(sample)
+    reducer, sample_3d = fit_reducer(get_reducer_method(reducer_method), sample_vectors)
+
+    kmeans = make_kmeans(n_clusters, ENGINE_MINIBATCH)
+    kmeans.partial_fit(sample_3d)
+    n_samples = len(sample)
+    for chunk in itertools.chain(pending, chunks):
+        if not chunk:
+            continue
+        kmeans.partial_fit(project(reducer, vectorizer.transform(chunk)))
+        n_samples += len(chunk)
+
+    model = FittedClustering(vectorizer, reducer, kmeans, n_samples=n_samples)
+    labels, distances = model.assign(sample_3d)
+    model.mean_distance = float(distances.mean()) if len(distances) else 0.0
+    return model, sample_3d, labels
+
+
+def clustering_quality(model, vectors_3d, labels):
+    """
+    Inertia (sum of squared distances to the assigned centroid) and a sampled
+    silhouette score (None when it is undefined, i.e. a single cluster).
+    """
+    _, distances = model.assign(vectors_3d)
+    quality = {
+        'engine': model.engine,
+        'inertia': float(np.square(distances).sum()),
+        'silhouette': None,
+    }
+    n_labels = len(np.unique(labels))
+    if 2 <= n_labels < len(labels):
+        quality['silhouette'] = float(silhouette_score(
+            vectors_3d, labels,
+            sample_size=min(len(labels), SILHOUETTE_SAMPLE_SIZE),
+            random_state=42,
+        ))
+    return quality
+
+
+def compare_reducers(comments, n_clusters, sample_size=5000):
+    """
+    Compare the sparse TruncatedSVD projection against the dense PCA projection.
+
+    Returns explained variance for both, the largest principal angle (degrees)
+    between the two 3D subspaces, and the adjusted Rand index of the KMeans
+    labels obtained on each projection (1.0 = identical clustering).
+    PCA needs a dense matrix, so at most sample_size comments are compared.
+    """
+    if len(comments) > sample_size:
+        rng = np.random.RandomState(42)
+        comments = [comments[i] for i in rng.choice(len(comments), sample_size, replace=False)]
+    vectors = make_vectorizer().fit_transform(comments)
+    results = {}
+    labels = {}
+    components = {}
+    for method in REDUCERS:
+        reducer, vectors_3d = fit_reducer(method, vectors)
+        labels[method] = KMeans(n_clusters=n_clusters, random_state=42, n_init=10).fit_predict(vectors_3d)
+        components[method] = reducer.components_.T
+        results[method] = {
+            'explained_variance': float(reducer.explained_variance_ratio_.sum()),
+        }
+    angles = subspace_angles(components[REDUCER_SVD], components[REDUCER_PCA])
+    results['max_subspace_angle'] = float(np.degrees(angles.max()))
+    results['cluster_agreement_ari'] = float(adjusted_rand_score(labels[REDUCER_SVD], labels[REDUCER_PCA]))
+    results['n_samples'] = vectors.shape[0]
+    results['n_features'] = vectors.shape[1]
+    return results
+
+
+def measure_drift(model, vectors, distances):
+    """
+    Compare new data against the fitted model.
+    Returns (distance ratio, unseen ratio).
+    """
+    if model.mean_distance > 0 and len(distances):
+        distance_ratio = float(distances.mean()) / model.mean_distance
+    else:
+        distance_ratio = 1.0
+    unseen_ratio = float((vectors.getnnz(axis=1) == 0).mean()) if vectors.shape[0] else 0.0
+    return distance_ratio, unseen_ratio
+
+
+def load_clustering_model():
+    """Load the latest stored model (None if nothing has been fitted yet)."""
+    row = ClusteringModel.objects.order_by('-created_at').values_list('pk', flat=True).first()
+    if row is None:
+        return None
+    if row not in _loaded:
+        stored = ClusteringModel.objects.get(pk=row)
+        vectorizer, reducer, kmeans = pickle.loads(bytes(stored.model_data))
+        _loaded.clear()
+        _loaded[row] = FittedClustering(
+            vectorizer, reducer, kmeans,
+            mean_distance=stored.mean_distance,
+            n_samples=stored.n_samples,
+            pk=stored.pk,
+        )
+    return _loaded[row]
+
+
+def save_clustering_model(model):
+    """Store a fitted model and drop older ones."""
+    stored = ClusteringModel.objects.create(
+        model_data=pickle.dumps((model.vectorizer, model.reducer, model.kmeans), protocol=pickle.HIGHEST_PROTOCOL),
+        n_clusters=model.n_clusters,
+        n_samples=model.n_samples,
+        mean_distance=model.mean_distance,
+    )
+    ClusteringModel.objects.exclude(pk=stored.pk).delete()
+    model.pk = stored.pk
+    _loaded.clear()
+    _loaded[stored.pk] = model
+    return model
+
+
+def cluster_comments(comments, n_clusters, refit=False):
+    """
+    Assign comments to clusters, reusing the stored model when possible.
+    Returns (model, vectors, vectors_3d, labels, refitted).
+    """
+    model = None if refit else load_clustering_model()
+
+    if (
+        model is not None
+        and model.n_clusters == n_clusters
+        and model.reducer_method == get_reducer_method()
+    ):
+        vectors, vectors_3d = model.transform(comments)
+        labels, distances = model.assign(vectors_3d)
+        distance_ratio, unseen_ratio = measure_drift(model, vectors, distances)
+        drift_threshold = getattr(settings, 'CLUSTERING_DRIFT_THRESHOLD', DEFAULT_DRIFT_THRESHOLD)
+        unseen_threshold = getattr(settings, 'CLUSTERING_UNSEEN_THRESHOLD', DEFAULT_UNSEEN_THRESHOLD)
+        if distance_ratio <= drift_threshold and unseen_ratio <= unseen_threshold:
+            return model, vectors, vectors_3d, labels, False
+        logger.info(
+            "clustering drift detected (distance ratio %.2f, unseen ratio %.2f); refitting",
+            distance_ratio, unseen_ratio,
+        )
+
+    model, vectors, vectors_3d, labels = fit_clustering(comments, n_clusters)
+    save_clustering_model(model)
+    return model, vectors, vectors_3d, labels, True
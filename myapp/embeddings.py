@@ -0,0 +1,100 @@
+"""
+コメントの埋め込みベクトルのバイナリ保存
+
+YouTubeComment.embedding にはベクトルをリトルエンディアンのfloat32のバイト列のまま、
+embedding_dim には次元数を保存する。テキストの解析や行ごとの配列の生成をせずに、
+クエリセット全体を1つの (N, d) のNumPy行列として読み込める。
+"""
+import json
+import re
+
+import numpy as np
+from django.db.models import Count
+
+EMBEDDING_DTYPE = np.dtype('<f4')
+
+_SEPARATORS = re.compile(r'[\s,]+')
+
+
+def parse_embedding(value):
+    """
+    インポートされた埋め込みを1次元のfloat32配列に変換する（空の場合はNone）
+
+    数値のリスト・タプル、JSON配列の文字列（"[0.1, 0.2]"）、カンマ・空白区切りの数値に対応する。
+    それ以外の値は ValueError
+    """
+    if value is None:
+        return None
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return decode_embedding(value)
+    if isinstance(value, str):
+        text = value.strip()
+        if not text or text == 'null':
+            return None
+        if text.startswith('['):
+            try:
+                value = json.loads(text)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"invalid embedding: {e}") from e
+        else:
+            value = _SEPARATORS.split(text)
+    try:
+        vector = np.asarray(value, dtype=EMBEDDING_DTYPE)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"invalid embedding: {e}") from e
+    if vector.ndim != 1:
+        raise ValueError("embedding must be a flat list of numbers")
+    if vector.size == 0:
+        return None
+    if not np.isfinite(vector).all():
+        raise ValueError("embedding contains NaN or infinity")
+    return vector
+
+
+def encode_embedding(value):
+    """embedding・embedding_dim に保存する (バイト列, 次元数) を返す（空の場合は (None, None)）"""
+    vector = parse_embedding(value)
+    if vector is None:
+        return None, None
+    return vector.astype(EMBEDDING_DTYPE, copy=False).tobytes(), int(vector.size)
+
+
+def decode_embedding(data):
+    """保存されたバイト列を1次元のfloat32配列に変換する（バイト列の読み取り専用ビュー）"""
+    if data is None:
+        return None
+    data = bytes(data)
+    if len(data) % EMBEDDING_DTYPE.itemsize:
+        raise ValueError("embedding byte length is not a multiple of 4")
+    return np.frombuffer(data, dtype=EMBEDDING_DTYPE)
+
+
+def load_embedding_matrix(queryset, dim=None):
+    """
+    YouTubeCommentのクエリセットの埋め込みを1回のクエリで読み込む
+
+    戻り値は (ids, matrix)。matrix は (N, d) のfloat32の行列。
+    embedding_dim が dim と一致する行のみを含む（dim が None の場合はクエリセットで最も多い次元数）
+    """
+    queryset = queryset.filter(embedding__isnull=False, embedding_dim__isnull=False)
+    if dim is None:
+        dim = (
+            queryset.order_by()
+            .values('embedding_dim')
+            .annotate(n=Count('id'))
+            .order_by('-n')
+            .values_list('embedding_dim', flat=True)
+            .first()
+        )
+    if not dim:
+        return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=EMBEDDING_DTYPE)
+
+    rows = queryset.filter(embedding_dim=dim).values_list('id', 'embedding')
+    ids = []
+    blobs = []
+    for pk, data in rows.iterator(chunk_size=2000):
+        ids.append(pk)
+        blobs.append(data)
+    # 1つのバッファに連結し、コピーせずに行列として参照する
+    matrix = np.frombuffer(b''.join(blobs), dtype=EMBEDDING_DTYPE).reshape(len(ids), dim)
+    return np.asarray(ids, dtype=np.int64), matrix
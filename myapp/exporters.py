@@ -0,0 +1,284 @@
+"""
+コメントのエクスポート処理
+
+必要な列だけを values_list で取得し、.iterator(chunk_size=...) でサーバーサイドカーソルから
+少しずつ読み出して StreamingHttpResponse で送信する。件数に関係なくメモリ使用量は一定。
+
+形式は CSV / JSONL / Parquet / Arrow IPC（Feather v2）。Parquet と Arrow は列ごとに型が付き
+圧縮されるため、pandas などでそのまま（文字列のパースなしで）読み込める。
+Parquet / Arrow には pyarrow が必要（未インストールの場合は CSV / JSONL のみ利用可能）。
+"""
+import csv
+import importlib.util
+import json
+import zlib
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+# pyarrow は読み込みに時間がかかるため、Parquet / Arrow の出力時に初めて読み込む
+PYARROW_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+FORMAT_CSV = 'csv'
+FORMAT_JSONL = 'jsonl'
+FORMAT_PARQUET = 'parquet'
+FORMAT_ARROW = 'arrow'
+
+# 形式ごとの (拡張子, Content-Type, pyarrowが必要か)
+EXPORT_FORMATS = {
+    FORMAT_CSV: ('csv', 'text/csv; charset=utf-8', False),
+    FORMAT_JSONL: ('jsonl', 'application/x-ndjson; charset=utf-8', False),
+    FORMAT_PARQUET: ('parquet', 'application/vnd.apache.parquet', True),
+    FORMAT_ARROW: ('arrow', 'application/vnd.apache.arrow.file', True),
+}
+# Parquet / Arrow はファイル内で圧縮済みのため gzip は CSV / JSONL のみ
+GZIP_FORMATS = (FORMAT_CSV, FORMAT_JSONL)
+
+DEFAULT_EXPORT_CHUNK_SIZE = 2000
+DEFAULT_PARQUET_COMPRESSION = 'zstd'
+# この大きさまで溜めてからまとめて送信する
+FLUSH_BYTES = 64 * 1024
+
+# (ヘッダー, フィールド名)
+REPORT_COLUMNS = [
+    ('ID', 'id'),
+    ('Video ID', 'video_id'),
+    ('Comment ID', 'comment_id'),
+    ('Author', 'author'),
+    ('Comment Text', 'comment_text'),
+    ('Like Count', 'like_count'),
+    ('Reply Count', 'reply_count'),
+    ('Engagement Score', 'engagement_score'),
+    ('Reply Depth Potential', 'reply_depth_potential'),
+    ('Created At', 'created_at'),
+    ('AI Reply', 'ai_reply'),
+]
+
+
+class _Echo:
+    """csv.writer の書き込み先（書かれた文字列をそのまま返す）"""
+
+    def write(self, value):
+        return value
+
+
+def get_export_format(name):
+    """形式名を確認して返す（未対応・pyarrow未インストールの場合は ValueError）"""
+    name = (name or FORMAT_CSV).lower()
+    if name not in EXPORT_FORMATS:
+        raise ValueError(f"unknown export format: {name}")
+    if EXPORT_FORMATS[name][2] and not PYARROW_AVAILABLE:
+        raise ValueError(f"{name} export requires pyarrow")
+    return name
+
+
+def get_export_chunk_size(chunk_size=None):
+    if chunk_size is None:
+        chunk_size = getattr(settings, 'EXPORT_CHUNK_SIZE', DEFAULT_EXPORT_CHUNK_SIZE)
+    return max(1, int(chunk_size))
+
+
+def _iter_report_rows(queryset, chunk_size=None):
+    rows = queryset.values_list(*[field for _, field in REPORT_COLUMNS])
+    return rows.iterator(chunk_size=get_export_chunk_size(chunk_size))
+
+
+def _format_report_row(row):
+    row = list(row)
+    created_at = row[9]
+    row[9] = created_at.strftime('%Y-%m-%d %H:%M:%S') if created_at else ''
+    row[10] = row[10] or ''
+    return row
+
+
+def iter_report_csv(queryset, chunk_size=None):
+    """レポートCSVをバイト列の塊で返すジェネレータ（先頭にExcel用のBOMを付ける）"""
+    writer = csv.writer(_Echo())
+    buffer = ['\ufeff', writer.writerow([header for header, _ in REPORT_COLUMNS])]
+    size = 0
+    for row in _iter_report_rows(queryset, chunk_size):
+        line = writer.writerow(_format_report_row(row))
+        buffer.append(line)
+        size += len(line)
+        if size >= FLUSH_BYTES:
+            yield ''.join(buffer).encode('utf-8')
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
+
+def _iter_report_batches(queryset, chunk_size=None):
+    """values_list の行を chunk_size 件ずつのリストにまとめて返す"""
+    batch_size = get_export_chunk_size(chunk_size)
+    batch = []
+    for row in _iter_report_rows(queryset, batch_size):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_report_jsonl(queryset, chunk_size=None):
+    """1行1コメントのJSON（JSON Lines）をバイト列の塊で返すジェネレータ"""
+    fields = [field for _, field in REPORT_COLUMNS]
+    for batch in _iter_report_batches(queryset, chunk_size):
+        lines = []
+        for row in batch:
+            record = dict(zip(fields, row))
+            if record['created_at'] is not None:
+                record['created_at'] = record['created_at'].isoformat()
+            lines.append(json.dumps(record, ensure_ascii=False))
+        lines.append('')
+        yield '\n'.join(lines).encode('utf-8')
+
+
+def report_arrow_schema():
+    """エクスポートする列の Arrow スキーマ"""
+    import pyarrow as pa
+
+    timestamp = pa.timestamp('us', tz='UTC' if settings.USE_TZ else None)
+    return pa.schema([
+        ('id', pa.int64()),
+        ('video_id', pa.string()),
+        ('comment_id', pa.string()),
+        ('author', pa.string()),
+        ('comment_text', pa.string()),
+        ('like_count', pa.int32()),
+        ('reply_count', pa.int32()),
+        ('engagement_score', pa.float64()),
+        ('reply_depth_potential', pa.int32()),
+        ('created_at', timestamp),
+        ('ai_reply', pa.string()),
+    ])
+
+
+def _record_batch(rows, schema):
+    import pyarrow as pa
+
+    columns = list(zip(*rows))
+    return pa.RecordBatch.from_arrays(
+        [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+        schema=schema,
+    )
+
+
+class _BytesSink:
+    """pyarrow の書き込み先。書かれたバイト列を溜めて drain() で取り出す"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _iter_arrow_output(queryset, open_writer, chunk_size=None):
+    """chunk_size 件ごとに RecordBatch を書き込み、書き出されたバイト列を返す"""
+    schema = report_arrow_schema()
+    sink = _BytesSink()
+    writer = open_writer(sink, schema)
+    try:
+        for rows in _iter_report_batches(queryset, chunk_size):
+            writer.write_batch(_record_batch(rows, schema))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def get_parquet_compression():
+    return getattr(settings, 'EXPORT_PARQUET_COMPRESSION', DEFAULT_PARQUET_COMPRESSION)
+
+
+def iter_report_parquet(queryset, chunk_size=None):
+    """Parquet をバイト列の塊で返すジェネレータ（chunk_size 件ごとに1つの row group）"""
+    def open_writer(sink, schema):
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(sink, schema, compression=get_parquet_compression())
+
+    return _iter_arrow_output(queryset, open_writer, chunk_size)
+
+
+def iter_report_arrow(queryset, chunk_size=None):
+    """Arrow IPC ファイル形式（Feather v2, zstd圧縮）をバイト列の塊で返すジェネレータ"""
+    def open_writer(sink, schema):
+        import pyarrow as pa
+        options = pa.ipc.IpcWriteOptions(compression='zstd')
+        return pa.ipc.new_file(sink, schema, options=options)
+
+    return _iter_arrow_output(queryset, open_writer, chunk_size)
+
+
+EXPORT_WRITERS = {
+    FORMAT_CSV: iter_report_csv,
+    FORMAT_JSONL: iter_report_jsonl,
+    FORMAT_PARQUET: iter_report_parquet,
+    FORMAT_ARROW: iter_report_arrow,
+}
+
+
+def gzip_stream(chunks):
+    """バイト列の塊をgzip形式で圧縮しながら返す"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_report(queryset, export_format=FORMAT_CSV, compress=False, chunk_size=None):
+    """指定形式のレポートをバイト列の塊で返す（compress=True は CSV / JSONL のみ gzip 圧縮）"""
+    export_format = get_export_format(export_format)
+    chunks = EXPORT_WRITERS[export_format](queryset, chunk_size=chunk_size)
+    if compress and export_format in GZIP_FORMATS:
+        chunks = gzip_stream(chunks)
+    return chunks
+
+
+def report_filename(basename, export_format=FORMAT_CSV, compress=False):
+    filename = f"{basename}.{EXPORT_FORMATS[export_format][0]}"
+    if compress and export_format in GZIP_FORMATS:
+        filename += '.gz'
+    return filename
+
+
+def report_response(queryset, basename, export_format=FORMAT_CSV, compress=False, chunk_size=None):
+    """
+    レポートのストリーミングレスポンスを作る
+    basename は拡張子なしのファイル名。compress=True の場合 CSV / JSONL は gzip 圧縮して送信する
+    """
+    export_format = get_export_format(export_format)
+    chunks = iter_report(queryset, export_format, compress=compress, chunk_size=chunk_size)
+    if compress and export_format in GZIP_FORMATS:
+        content_type = 'application/gzip'
+    else:
+        content_type = EXPORT_FORMATS[export_format][1]
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    filename = report_filename(basename, export_format, compress)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
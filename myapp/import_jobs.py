@@ -0,0 +1,265 @@
+"""
+コメントインポートのバックグラウンドジョブ
+
+アップロードされたファイルはリクエスト内では解析せず、IMPORT_SPOOL_DIR にチャンク単位で
+コピーして ImportJob を登録する。run_import_worker コマンドがジョブを取得し、
+ディスク上のファイルから行をストリームで読み込んで import_comments() に渡す。
+進捗（読み込み済みバイト数・件数）はチャンクごとに ImportJob に記録され、
+import_job_status エンドポイントから取得できる。不正な行はCSVのエラーレポートに書き出す。
+
+IMPORT_ASYNC=False（デフォルト）の場合はワーカーを使わず、保存後にリクエスト内で同じ処理を行う。
+"""
+import csv
+import json
+import logging
+import os
+import time
+import traceback
+import uuid
+from datetime import timedelta
+from io import TextIOWrapper
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .importers import IMPORT_MODES, MODE_UPSERT, import_comments
+from .json_stream import iter_json_items
+from .models import ImportJob
+
+logger = logging.getLogger(__name__)
+
+# 進捗をDBに書き込む最短間隔（秒）
+PROGRESS_INTERVAL = 1.0
+# 実行中のままこの秒数を過ぎたジョブは、ワーカーが停止した（強制終了・メモリ不足など）とみなす
+DEFAULT_JOB_TIMEOUT = 2 * 60 * 60
+
+PROGRESS_FIELDS = [
+    'bytes_read', 'total_rows', 'processed_rows',
+    'created_count', 'updated_count', 'unchanged_count', 'skipped_count',
+]
+
+
+def get_job_timeout():
+    return getattr(settings, 'IMPORT_JOB_TIMEOUT', DEFAULT_JOB_TIMEOUT)
+
+
+def get_spool_dir():
+    path = os.fspath(settings.IMPORT_SPOOL_DIR)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def spool_upload(upload, suffix):
+    """アップロードファイルをチャンクごとにスプール用ディレクトリへ書き出し、(パス, サイズ) を返す"""
+    path = os.path.join(get_spool_dir(), f"{uuid.uuid4().hex}.{suffix}")
+    size = 0
+    with open(path, 'wb') as f:
+        for chunk in upload.chunks():
+            f.write(chunk)
+            size += len(chunk)
+    return path, size
+
+
+def enqueue_import(upload, source_format, owner=None, mode=MODE_UPSERT, run_inline=False):
+    """
+    アップロードファイルを保存してインポートジョブを登録する
+    run_inline=True の場合（リクエスト内で処理する場合）は、ワーカーに取得されないよう実行中として登録する
+    """
+    if mode not in IMPORT_MODES:
+        raise ValueError(f"unknown import mode: {mode}")
+    path, size = spool_upload(upload, source_format)
+    return ImportJob.objects.create(
+        owner=owner,
+        source_format=source_format,
+        mode=mode,
+        file_name=os.path.basename(upload.name or '')[:255],
+        file_path=path,
+        file_size=size,
+        status=ImportJob.STATUS_RUNNING if run_inline else ImportJob.STATUS_QUEUED,
+        started_at=timezone.now() if run_inline else None,
+    )
+
+
+def fail_stale_import_jobs(queryset=None):
+    """
+    実行中のまま止まったジョブを失敗にしてアップロードファイルを削除する（失敗にした件数を返す）
+    途中まで取り込まれた行は残るため、再実行はせずにユーザーに再アップロードしてもらう
+    """
+    if queryset is None:
+        queryset = ImportJob.objects.all()
+    cutoff = timezone.now() - timedelta(seconds=get_job_timeout())
+    failed = 0
+    for job in queryset.filter(status=ImportJob.STATUS_RUNNING, started_at__lt=cutoff):
+        message = "インポートが中断されました（処理中にワーカーが停止した可能性があります）。"
+        if job.processed_rows:
+            message += f" {job.processed_rows} 件目までは取り込まれています。"
+        message += " もう一度アップロードしてください。"
+        updated = ImportJob.objects.filter(pk=job.pk, status=ImportJob.STATUS_RUNNING).update(
+            status=ImportJob.STATUS_FAILED,
+            message=message,
+            error=f"still running {get_job_timeout()} seconds after start; worker presumed dead",
+            finished_at=timezone.now(),
+        )
+        if updated:
+            logger.warning("import job %s: marked as failed (stale)", job.pk)
+            _remove_file(job.file_path)
+            failed += 1
+    return failed
+
+
+def claim_next_import_job():
+    """待機中のジョブを1件取得して実行中にする（他のワーカーがロック中の行はスキップ）"""
+    fail_stale_import_jobs()
+    with transaction.atomic():
+        queryset = ImportJob.objects.filter(status=ImportJob.STATUS_QUEUED).order_by('created_at')
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        else:
+            queryset = queryset.select_for_update()
+        job = queryset.first()
+        if job is None:
+            return None
+        job.status = ImportJob.STATUS_RUNNING
+        job.started_at = timezone.now()
+        job.save(update_fields=['status', 'started_at'])
+    return job
+
+
+class ErrorReport:
+    """不正な行をCSV（行番号, エラー内容, 元の行のJSON）に書き出す。最初のエラーでファイルを作る"""
+
+    HEADER = ['row', 'error', 'data']
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = None
+        self._writer = None
+
+    def __call__(self, line_no, row, message):
+        if self._writer is None:
+            self._file = open(self.path, 'w', encoding='utf-8-sig', newline='')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(self.HEADER)
+        self._writer.writerow([line_no, message, json.dumps(row, ensure_ascii=False, default=str)])
+        self.count += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def _iter_csv_rows(binary_file):
+    return csv.DictReader(TextIOWrapper(binary_file, encoding='utf-8-sig', newline=''))
+
+
+def _iter_json_rows(binary_file):
+    # 配列 / {"comments": [...]} / JSON Lines を1件ずつ読み込む（ファイル全体は読み込まない）
+    items = iter_json_items(TextIOWrapper(binary_file, encoding='utf-8-sig'))
+    return (item for item in items if isinstance(item, dict))
+
+
+ROW_READERS = {
+    ImportJob.FORMAT_CSV: _iter_csv_rows,
+    ImportJob.FORMAT_JSON: _iter_json_rows,
+}
+
+
+def _record_progress(job, result, bytes_read):
+    job.bytes_read = bytes_read
+    job.processed_rows = result.total
+    job.created_count = result.created
+    job.updated_count = result.updated
+    job.unchanged_count = result.unchanged
+    job.skipped_count = result.skipped
+
+
+def _remove_file(path):
+    if path:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def run_import_job(job):
+    """ジョブのファイルを読み込んでインポートし、結果を記録する（処理後にアップロードファイルは削除）"""
+    if job.started_at is None:
+        job.started_at = timezone.now()
+    report = ErrorReport(os.path.join(get_spool_dir(), f"import-{job.pk}-errors.csv"))
+    last_saved = [time.monotonic()]
+
+    try:
+        with open(job.file_path, 'rb') as binary_file:
+            def on_batch(result):
+                _record_progress(job, result, binary_file.tell())
+                now = time.monotonic()
+                if now - last_saved[0] >= PROGRESS_INTERVAL:
+                    last_saved[0] = now
+                    job.save(update_fields=PROGRESS_FIELDS)
+
+            rows = ROW_READERS[job.source_format](binary_file)
+            result = import_comments(rows, owner=job.owner, mode=job.mode, on_batch=on_batch, on_error=report)
+            # 読み込みが終わるとテキストラッパーと一緒にファイルが閉じられる場合があるため tell() は使わない
+            _record_progress(job, result, job.file_size)
+        job.status = ImportJob.STATUS_DONE
+        job.message = result.message()
+        if report.count:
+            job.message += " 不正な行はエラーレポートで確認できます。"
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        # ファイル自体が読めない場合（JSONの構文エラー・文字コード違いなど）
+        logger.warning("import job %s: invalid file: %s", job.pk, e)
+        job.status = ImportJob.STATUS_FAILED
+        job.message = "ファイルの形式が正しくありません。"
+        if job.processed_rows:
+            # 行はストリームで取り込むため、エラー箇所より前のチャンクは保存済み
+            job.message += f" {job.processed_rows} 件目までは取り込まれています。"
+        job.error = str(e)
+    except Exception:
+        logger.exception("import job %s failed", job.pk)
+        job.status = ImportJob.STATUS_FAILED
+        job.message = "インポート中にエラーが発生しました。"
+        job.error = traceback.format_exc()
+    finally:
+        report.close()
+
+    if report.count:
+        job.error_report_path = report.path
+    job.finished_at = timezone.now()
+    job.save()
+    _remove_file(job.file_path)
+    return job
+
+
+def delete_import_job(job):
+    """ジョブと関連ファイル（アップロード・エラーレポート）を削除する"""
+    _remove_file(job.file_path)
+    _remove_file(job.error_report_path)
+    job.delete()
+
+
+def job_status(job, now=None):
+    """進捗表示用の辞書（import_job_status エンドポイントが返すJSON）"""
+    elapsed = job.elapsed_seconds(now)
+    eta = job.eta_seconds(now)
+    return {
+        'id': job.pk,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'file_name': job.file_name,
+        'progress': round(job.progress, 4),
+        'bytes_read': job.bytes_read,
+        'file_size': job.file_size,
+        'processed_rows': job.processed_rows,
+        'total_rows': job.total_rows,
+        'created': job.created_count,
+        'updated': job.updated_count,
+        'unchanged': job.unchanged_count,
+        'skipped': job.skipped_count,
+        'elapsed_seconds': round(elapsed, 1),
+        'eta_seconds': None if eta is None else round(eta, 1),
+        'rows_per_sec': round(job.processed_rows / elapsed, 1) if elapsed > 0 else None,
+        'message': job.message,
+        'has_error_report': bool(job.error_report_path),
+    }
@@ -0,0 +1,281 @@
+"""
+コメントの一括インポート処理
+
+CSV/JSON/管理画面のインポートから共通で利用する取り込みエンジン。
+行をストリームで読み込み、検証した上で一定件数ごとに bulk_create でまとめて書き込む。
+
+インポートモード:
+- upsert: (owner, video_id, comment_id) が既存のコメントは統計値のみ更新し、新規分だけ追加する
+- append: 既存コメントとの突き合わせをせずに追加する（キーが重複する行は無視される）
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from .aggregates import aggregate_row, apply_aggregate_changes, rebuild_aggregates
+from .models import YouTubeComment
+from .search import comment_search_text
+from .versioning import bump_data_version
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+
+MODE_UPSERT = 'upsert'
+MODE_APPEND = 'append'
+IMPORT_MODES = (MODE_UPSERT, MODE_APPEND)
+
+# upsert時に既存コメントへ反映するフィールド（集計テーブルの差分計算でもこの順に使う）
+UPSERT_FIELDS = ('like_count', 'reply_count', 'engagement_score')
+# 同時に実行中の他のインポートと新規コメントのキーが衝突した場合の試行回数
+UPSERT_ATTEMPTS = 3
+
+
+class ImportResult:
+    """インポート結果（件数・スキップ数・処理速度）"""
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.skipped = 0
+        self.errors = []
+        self.elapsed = 0.0
+
+    @property
+    def total(self):
+        return self.created + self.updated + self.unchanged + self.skipped
+
+    @property
+    def rows_per_sec(self):
+        if self.elapsed <= 0:
+            return float(self.total)
+        return self.total / self.elapsed
+
+    def message(self):
+        """管理画面・ダッシュボード向けの完了メッセージ"""
+        text = f"{self.created} 件のコメントをインポートしました。"
+        if self.updated or self.unchanged:
+            text += f" {self.updated} 件を更新、{self.unchanged} 件は変更なしでした。"
+        text += f"（{self.rows_per_sec:,.0f} 件/秒）"
+        if self.skipped:
+            text += f" {self.skipped} 件は不正な行のためスキップしました。"
+        return text
+
+
+def get_import_mode(request):
+    """POSTパラメータからインポートモードを取得（不正な値はupsert扱い）"""
+    mode = request.POST.get('import_mode', MODE_UPSERT)
+    return mode if mode in IMPORT_MODES else MODE_UPSERT
+
+
+def get_batch_size(batch_size=None):
+    """チャンクサイズを取得（引数 > settings.COMMENT_IMPORT_BATCH_SIZE > デフォルト）"""
+    if batch_size is None:
+        batch_size = getattr(settings, 'COMMENT_IMPORT_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    return max(1, int(batch_size))
+
+
+def _to_int(value):
+    if value in (None, ''):
+        return 0
+    return int(float(value))
+
+
+def _to_float(value):
+    if value in (None, ''):
+        return 0.0
+    return float(value)
+
+
+def _to_optional_text(value):
+    if value in (None, '', 'null'):
+        return None
+    return value
+
+
+_created_at_field = YouTubeComment._meta.get_field('created_at')
+
+
+def build_comment(row, owner=None):
+    """
+    1行分の辞書から YouTubeComment インスタンスを生成する（保存はしない）
+    値が不正な場合は ValueError を送出する
+    """
+    # NumPy を使うため、埋め込みベクトルの処理は最初のインポート時に読み込む
+    from .embeddings import encode_embedding
+
+    try:
+        created_at = row.get('created_at') or None
+        if created_at is not None:
+            created_at = _created_at_field.to_python(created_at)
+        embedding, embedding_dim = encode_embedding(row.get('embedding'))
+        comment = YouTubeComment(
+            video_id=row.get('video_id') or '',
+            comment_id=row.get('comment_id') or '',
+            comment_text=row.get('comment_text') or '',
+            author=row.get('author') or '',
+            like_count=_to_int(row.get('like_count')),
+            reply_count=_to_int(row.get('reply_count')),
+            reply_depth_potential=_to_int(row.get('reply_depth_potential')),
+            engagement_score=_to_float(row.get('engagement_score')),
+            created_at=created_at,
+            ai_reply=_to_optional_text(row.get('ai_reply')),
+            embedding=embedding,
+            embedding_dim=embedding_dim,
+            owner=owner,
+        )
+    except (TypeError, ValueError, ValidationError) as e:
+        raise ValueError(str(e)) from e
+    # bulk_create は save() を通らないため、検索用テキストをここで設定する
+    comment.search_text = comment_search_text(comment)
+    return comment
+
+
+def iter_batches(rows, owner, batch_size, result, on_error=None):
+    """
+    行を検証しながら batch_size 件ずつのリストにまとめて返すジェネレータ
+    不正な行は on_error(行番号, 行, エラー内容) に渡す（省略時は result.errors に溜める）
+    """
+    batch = []
+    for line_no, row in enumerate(rows, start=1):
+        try:
+            batch.append(build_comment(row, owner=owner))
+        except ValueError as e:
+            result.skipped += 1
+            if on_error is not None:
+                on_error(line_no, row, str(e))
+            else:
+                result.errors.append((line_no, str(e)))
+            continue
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _comment_key(comment):
+    return (comment.video_id, comment.comment_id)
+
+
+def _upsert_batch(batch, owner, batch_size, result):
+    """
+    1チャンク分をupsertする
+    既存コメントは変更があった場合のみ bulk_update し、新規コメントは bulk_create する
+    既存コメントの確認から書き込みまでの間に他のインポートが同じキーを登録した場合は、
+    チャンクの書き込みを取り消して確認からやり直す
+    """
+    keyed = {}
+    unkeyed = []
+    for comment in batch:
+        if comment.comment_id:
+            key = _comment_key(comment)
+            if key in keyed:
+                # 同じチャンク内で重複している場合は後の行を優先
+                result.skipped += 1
+            keyed[key] = comment
+        else:
+            unkeyed.append(comment)
+
+    for attempt in range(1, UPSERT_ATTEMPTS + 1):
+        try:
+            updated, created, unchanged = _write_upsert_batch(keyed, unkeyed, owner, batch_size)
+            break
+        except IntegrityError:
+            if attempt == UPSERT_ATTEMPTS:
+                raise
+            logger.info("comment import: key conflict with a concurrent import, retrying chunk (%d/%d)", attempt, UPSERT_ATTEMPTS)
+            for comment in batch:
+                comment.pk = None
+    result.updated += updated
+    result.created += created
+    result.unchanged += unchanged
+
+
+def _write_upsert_batch(keyed, unkeyed, owner, batch_size):
+    """既存コメントを確認して1トランザクションで書き込む。戻り値は (更新数, 追加数, 変更なしの数)"""
+    existing = {}
+    if keyed:
+        rows = (
+            YouTubeComment.objects
+            .filter(owner=owner, comment_id__in={key[1] for key in keyed})
+            .exclude(comment_id='')
+            .values_list('id', 'video_id', 'comment_id', *UPSERT_FIELDS)
+        )
+        for pk, video_id, comment_id, *values in rows:
+            existing[(video_id, comment_id)] = (pk, values)
+
+    new_comments = list(unkeyed)
+    to_update = []
+    unchanged = 0
+    for key, comment in keyed.items():
+        if key not in existing:
+            new_comments.append(comment)
+            continue
+        pk, values = existing[key]
+        if [getattr(comment, field) for field in UPSERT_FIELDS] == values:
+            unchanged += 1
+            continue
+        comment.pk = pk
+        to_update.append(comment)
+
+    with transaction.atomic():
+        if to_update:
+            YouTubeComment.objects.bulk_update(to_update, UPSERT_FIELDS, batch_size=batch_size)
+        if new_comments:
+            YouTubeComment.objects.bulk_create(new_comments, batch_size=batch_size)
+        if to_update or new_comments:
+            # bulk_create/bulk_updateはシグナルを送らないため、チャンクごとに1回更新
+            bump_data_version([owner.pk if owner else None])
+            owner_id = owner.pk if owner else None
+            apply_aggregate_changes(
+                added=[aggregate_row(comment) for comment in to_update + new_comments],
+                removed=[(owner_id, comment.video_id, *existing[_comment_key(comment)][1]) for comment in to_update],
+            )
+    return len(to_update), len(new_comments), unchanged
+
+
+def import_comments(rows, owner=None, batch_size=None, mode=MODE_UPSERT, on_batch=None, on_error=None):
+    """
+    行（辞書）のイテラブルを一括インポートする
+
+    rows はストリームのまま受け取り、batch_size 件ごとに1トランザクションで書き込む。
+    mode が upsert の場合は (owner, video_id, comment_id) をキーに既存コメントを更新する。
+    append の場合、キー重複で無視された行も created に含まれる点に注意。
+    on_batch(result) は各チャンクの書き込み後に呼ばれる（インポートジョブの進捗更新用）。
+    on_error は iter_batches() を参照。
+    """
+    if mode not in IMPORT_MODES:
+        raise ValueError(f"unknown import mode: {mode}")
+    batch_size = get_batch_size(batch_size)
+    result = ImportResult()
+    started = time.perf_counter()
+
+    try:
+        for batch in iter_batches(rows, owner, batch_size, result, on_error=on_error):
+            if mode == MODE_UPSERT:
+                _upsert_batch(batch, owner, batch_size, result)
+            else:
+                with transaction.atomic():
+                    YouTubeComment.objects.bulk_create(batch, batch_size=batch_size, ignore_conflicts=True)
+                    bump_data_version([owner.pk if owner else None])
+                result.created += len(batch)
+            if on_batch is not None:
+                result.elapsed = time.perf_counter() - started
+                on_batch(result)
+    finally:
+        if mode == MODE_APPEND and result.created:
+            # append では重複で無視された行が分からないため、集計テーブルはユーザー単位で作り直す
+            rebuild_aggregates([owner.pk if owner else None])
+
+    result.elapsed = time.perf_counter() - started
+    logger.info(
+        "comment import (%s): created=%d updated=%d unchanged=%d skipped=%d elapsed=%.2fs (%.0f rows/sec, batch_size=%d)",
+        mode, result.created, result.updated, result.unchanged, result.skipped,
+        result.elapsed, result.rows_per_sec, batch_size,
+    )
+    return result
@@ -0,0 +1,184 @@
+"""
+リクエストごとの計測（SQLの件数・DB時間・キャッシュのヒット/ミス・処理ごとの時間）
+
+RequestMetricsMiddleware（settings.REQUEST_METRICS_ENABLED=True の場合のみ有効）が
+リクエストの開始時に RequestMetrics を作り、処理中のコードは以下で値を記録する。
+- DBクエリ: connection.execute_wrapper() で自動的に記録
+- キャッシュ: record_cache(hit)（myapp.caching・スナップショット・ページキャッシュ）
+- 処理時間: with timed('名前'): / @timed('名前')
+
+計測結果は Server-Timing ヘッダーで返し、ビューごとに直近 REQUEST_METRICS_WINDOW 件を
+プロセス内に保持する（スタッフ用の request_metrics エンドポイントで確認できる）。
+計測が無効な場合、timed() と record_cache() は何もしない。
+"""
+import threading
+import time
+from collections import deque
+from contextlib import ContextDecorator
+from contextvars import ContextVar
+
+DEFAULT_WINDOW = 1000
+# 合計時間のヒストグラムの区切り（ミリ秒、最後は上限なし）
+HISTOGRAM_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_current = ContextVar('request_metrics', default=None)
+
+_history = {}
+_history_lock = threading.Lock()
+
+
+class RequestMetrics:
+    """1リクエスト分の計測値"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total_ms = 0.0
+        self.queries = 0
+        self.db_ms = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # 名前 -> 合計ミリ秒（同じ名前の処理が複数回あれば合算する）
+        self.spans = {}
+
+    def add_span(self, name, elapsed_ms):
+        self.spans[name] = self.spans.get(name, 0.0) + elapsed_ms
+
+    def finish(self):
+        self.total_ms = (time.perf_counter() - self.started) * 1000
+        return self
+
+    def record_query(self, execute, sql, params, many, context):
+        """connection.execute_wrapper() に渡すラッパー"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_ms += (time.perf_counter() - started) * 1000
+
+    def server_timing(self):
+        """Server-Timing ヘッダーの値"""
+        entries = [
+            f'db;dur={self.db_ms:.1f};desc="{self.queries} queries"',
+            f'cache;desc="hits={self.cache_hits} misses={self.cache_misses}"',
+        ]
+        entries.extend(f'{name};dur={elapsed:.1f}' for name, elapsed in self.spans.items())
+        entries.append(f'total;dur={self.total_ms:.1f}')
+        return ', '.join(entries)
+
+
+def start_request_metrics():
+    """計測を開始する（戻り値のトークンを stop_request_metrics に渡す）"""
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def stop_request_metrics(token):
+    _current.reset(token)
+
+
+def current_metrics():
+    return _current.get()
+
+
+def record_cache(hit):
+    """キャッシュのヒット/ミスを記録する（計測中でなければ何もしない）"""
+    metrics = _current.get()
+    if metrics is None:
+        return
+    if hit:
+        metrics.cache_hits += 1
+    else:
+        metrics.cache_misses += 1
+
+
+class timed(ContextDecorator):
+    """処理時間を記録する（with timed('name'): または @timed('name')）"""
+
+    def __init__(self, name):
+        self.name = name
+        self._starts = threading.local()
+
+    def __enter__(self):
+        stack = getattr(self._starts, 'stack', None)
+        if stack is None:
+            stack = self._starts.stack = []
+        stack.append(time.perf_counter() if _current.get() is not None else None)
+        return self
+
+    def __exit__(self, *exc):
+        started = self._starts.stack.pop()
+        metrics = _current.get()
+        if started is not None and metrics is not None:
+            metrics.add_span(self.name, (time.perf_counter() - started) * 1000)
+        return False
+
+
+# ------------------------------------------------------------
+# 直近のリクエストの集計（プロセス内）
+# ------------------------------------------------------------
+def record_request(view_name, metrics, window=DEFAULT_WINDOW):
+    with _history_lock:
+        samples = _history.get(view_name)
+        if samples is None or samples.maxlen != window:
+            samples = _history[view_name] = deque(samples or (), maxlen=window)
+        samples.append(metrics)
+
+
+def reset_request_history():
+    with _history_lock:
+        _history.clear()
+
+
+def _percentiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+
+    def at(q):
+        return round(values[min(len(values) - 1, int(q * len(values)))], 2)
+
+    return {
+        'mean': round(sum(values) / len(values), 2),
+        'p50': at(0.50),
+        'p90': at(0.90),
+        'p99': at(0.99),
+        'max': round(values[-1], 2),
+    }
+
+
+def _histogram(values):
+    counts = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+    for value in values:
+        for i, bound in enumerate(HISTOGRAM_BUCKETS_MS):
+            if value <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+    labels = [f'<={bound}ms' for bound in HISTOGRAM_BUCKETS_MS] + [f'>{HISTOGRAM_BUCKETS_MS[-1]}ms']
+    return dict(zip(labels, counts))
+
+
+def request_summary():
+    """ビューごとの直近のリクエストの集計（request_metrics エンドポイントが返すJSON）"""
+    with _history_lock:
+        history = {name: list(samples) for name, samples in _history.items()}
+
+    summary = {}
+    for name, samples in sorted(history.items()):
+        span_names = sorted({span for metrics in samples for span in metrics.spans})
+        summary[name] = {
+            'count': len(samples),
+            'total_ms': _percentiles([m.total_ms for m in samples]),
+            'db_ms': _percentiles([m.db_ms for m in samples]),
+            'queries': _percentiles([m.queries for m in samples]),
+            'cache_hits': sum(m.cache_hits for m in samples),
+            'cache_misses': sum(m.cache_misses for m in samples),
+            'spans_ms': {
+                span: _percentiles([m.spans[span] for m in samples if span in m.spans])
+                for span in span_names
+            },
+            'histogram': _histogram([m.total_ms for m in samples]),
+        }
+    return summary
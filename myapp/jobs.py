@@ -0,0 +1,150 @@
+"""
+ダッシュボード分析のバックグラウンドジョブ
+
+外部ブローカーを使わず、AnalysisJobテーブルをキューとして利用する。
+indexビューがジョブを登録し、run_analysis_workerコマンドが
+select_for_update(skip_locked=True) でジョブを取得して処理する。
+計算結果は DashboardSnapshot に保存される（snapshots.py）。
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from .models import AnalysisJob
+from .snapshots import build_snapshot, get_latest_snapshot_data, get_snapshot_data, get_snapshot_info
+
+logger = logging.getLogger(__name__)
+
+# 実行中のままこの秒数を過ぎたジョブは、ワーカーが停止した（強制終了・メモリ不足など）とみなす
+DEFAULT_JOB_TIMEOUT = 30 * 60
+# 失敗したデータキーは、この秒数が過ぎるまで再登録しない（失敗し続ける計算を繰り返さないため）
+DEFAULT_RETRY_DELAY = 10 * 60
+# 失敗したジョブ（エラー内容の確認用）を残す期間
+FAILED_JOB_RETENTION = timedelta(days=7)
+
+
+def get_job_timeout():
+    return getattr(settings, 'ANALYSIS_JOB_TIMEOUT', DEFAULT_JOB_TIMEOUT)
+
+
+def get_retry_delay():
+    return getattr(settings, 'ANALYSIS_RETRY_DELAY', DEFAULT_RETRY_DELAY)
+
+
+def requeue_stale_jobs(data_key=None):
+    """
+    実行中のまま止まったジョブを待機中に戻す（戻した件数を返す）
+    data_key を指定した場合はそのキーのジョブのみ
+    """
+    cutoff = timezone.now() - timedelta(seconds=get_job_timeout())
+    queryset = AnalysisJob.objects.filter(status=AnalysisJob.STATUS_RUNNING, started_at__lt=cutoff)
+    if data_key is not None:
+        queryset = queryset.filter(data_key=data_key)
+    requeued = queryset.update(status=AnalysisJob.STATUS_QUEUED, started_at=None)
+    if requeued:
+        logger.warning("requeued %d stale analysis job(s)", requeued)
+    return requeued
+
+
+def enqueue_analysis(data_key):
+    """
+    指定したデータキーの分析ジョブを登録する
+    同じキーのジョブが待機中・実行中であれば新たには登録しない
+    （実行中のまま止まったジョブは待機中に戻し、そのジョブを再実行させる）
+    同じキーのジョブが ANALYSIS_RETRY_DELAY 秒以内に失敗していれば、その失敗したジョブを返す
+    """
+    requeue_stale_jobs(data_key)
+    pending = _get_pending_job(data_key)
+    if pending is not None:
+        return pending
+    recent_failure = AnalysisJob.objects.filter(
+        data_key=data_key,
+        status=AnalysisJob.STATUS_FAILED,
+        finished_at__gte=timezone.now() - timedelta(seconds=get_retry_delay()),
+    ).order_by('-finished_at').first()
+    if recent_failure is not None:
+        return recent_failure
+    try:
+        with transaction.atomic():
+            return AnalysisJob.objects.create(data_key=data_key)
+    except IntegrityError:
+        # 同時に届いた別のリクエスト（ダッシュボードの各セクション）が先に登録した
+        pending = _get_pending_job(data_key)
+        if pending is None:
+            raise
+        return pending
+
+
+def _get_pending_job(data_key):
+    return AnalysisJob.objects.filter(
+        data_key=data_key,
+        status__in=[AnalysisJob.STATUS_QUEUED, AnalysisJob.STATUS_RUNNING],
+    ).first()
+
+
+def get_dashboard_result(data_key):
+    """
+    indexビュー用: 分析結果を取得する
+
+    戻り値は (結果, 計算中かどうか)。
+    data_keyのスナップショットがあればそれを返し、
+    なければジョブを登録して直近のスナップショット（古い結果）を返す。
+    """
+    data = get_snapshot_data(data_key)
+    if data is not None:
+        return data, False
+
+    enqueue_analysis(data_key)
+    return get_latest_snapshot_data(), True
+
+
+def claim_next_job():
+    """待機中のジョブを1件取得して実行中にする（他のワーカーがロック中の行はスキップ）"""
+    requeue_stale_jobs()
+    with transaction.atomic():
+        queryset = AnalysisJob.objects.filter(status=AnalysisJob.STATUS_QUEUED).order_by('created_at')
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        else:
+            queryset = queryset.select_for_update()
+        job = queryset.first()
+        if job is None:
+            return None
+        job.status = AnalysisJob.STATUS_RUNNING
+        job.started_at = timezone.now()
+        job.save(update_fields=['status', 'started_at'])
+    return job
+
+
+def run_job(job):
+    """
+    ジョブを実行して結果をスナップショットとして保存する
+    そのデータキーのスナップショットが既にあれば（同期計算などで先に保存された）、再計算せずに完了にする
+    """
+    try:
+        if get_snapshot_info(job.data_key) is None:
+            build_snapshot(job.data_key)
+        job.status = AnalysisJob.STATUS_DONE
+    except Exception:
+        logger.exception("analysis job %s failed", job.pk)
+        job.status = AnalysisJob.STATUS_FAILED
+        job.error = traceback.format_exc()
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished_at'])
+
+    if job.status == AnalysisJob.STATUS_DONE:
+        # 結果はスナップショットに保存済みなので、古い完了済みジョブは削除
+        AnalysisJob.objects.filter(
+            status=AnalysisJob.STATUS_DONE,
+            finished_at__lt=job.finished_at,
+        ).delete()
+    # 失敗したジョブは一定期間だけ残す
+    AnalysisJob.objects.filter(
+        status=AnalysisJob.STATUS_FAILED,
+        finished_at__lt=job.finished_at - FAILED_JOB_RETENTION,
+    ).delete()
+    return job
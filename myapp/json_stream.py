@@ -0,0 +1,167 @@
+"""
+JSONインポート用のストリーミングパーサー
+
+json.load() はファイル全体と全要素の辞書を同時にメモリに持つため、大きなファイルでは
+ファイルサイズの数倍のメモリを使う。ここではファイルを少しずつ読み込み、
+json.JSONDecoder.raw_decode() で要素を1件ずつ取り出すため、メモリ使用量は1要素分で済む。
+
+対応する形式:
+- 配列: [{...}, {...}]
+- オブジェクト: {"comments": [{...}, {...}]}（comments 以外のキーは無視）
+- JSON Lines: 1行に1つのオブジェクト（comments キーを持たないオブジェクトが並ぶ場合）
+"""
+import json
+from json.decoder import WHITESPACE
+
+DEFAULT_READ_SIZE = 64 * 1024
+# 数値の途中で途切れた場合に読み残しうる最大の文字数（"1e+" の "e+" など）+ 1
+NUMBER_LOOKAHEAD = 3
+
+_decoder = json.JSONDecoder()
+
+
+class _Reader:
+    """テキストストリームを読み込みながら先頭から値を取り出すバッファ"""
+
+    def __init__(self, fp, read_size):
+        self.fp = fp
+        self.read_size = read_size
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, size=None):
+        """続きを読み込む（読み込み済みの部分は捨てる）。ファイルの終端なら False"""
+        if self.eof:
+            return False
+        chunk = self.fp.read(size or self.read_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.text = self.text[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """空白を読み飛ばして次の1文字を返す（終端の場合は空文字）"""
+        while True:
+            self.pos = WHITESPACE.match(self.text, self.pos).end()
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self._fill():
+                return ''
+
+    def consume(self, char):
+        if self.peek() != char:
+            self.error(f"Expecting '{char}'")
+        self.pos += 1
+
+    def delimiter(self, closing):
+        """要素の後ろの ',' または閉じ括弧を読み込む（',' なら True、閉じ括弧なら False）"""
+        char = self.peek()
+        if char == ',':
+            self.pos += 1
+            return True
+        if char == closing:
+            self.pos += 1
+            return False
+        self.error("Expecting ',' delimiter")
+
+    def decode(self):
+        """次の値を1つ取り出す（バッファ内で値が完結していなければ読み足して再試行する）"""
+        self.peek()
+        read_size = self.read_size
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill(read_size):
+                    raise
+                read_size *= 2
+                continue
+            # 数値は "12" や "1." "1e" のようにバッファの終端で途切れていても途中までで
+            # 解析できてしまうため、値の直後が終端に近い場合は読み足して確認する
+            if len(self.text) - end < NUMBER_LOOKAHEAD and self._fill(read_size):
+                continue
+            self.pos = end
+            return value
+
+    def decode_buffered(self):
+        """読み込み済みのバッファ内で完結する値を取り出す（完結しない場合は None）"""
+        try:
+            value, end = _decoder.raw_decode(self.text, self.pos)
+        except json.JSONDecodeError:
+            return None
+        if len(self.text) - end < NUMBER_LOOKAHEAD and not self.eof:
+            return None
+        self.pos = end
+        return value
+
+    def error(self, message):
+        raise json.JSONDecodeError(message, self.text, self.pos)
+
+
+def _iter_array(reader):
+    reader.consume('[')
+    if reader.peek() == ']':
+        reader.pos += 1
+        return
+    while True:
+        yield reader.decode()
+        if not reader.delimiter(']'):
+            return
+
+
+def _iter_object(reader):
+    """
+    オブジェクトを1つ読み込む。comments キーの配列は要素ごとに返し、
+    それ以外のキーはまとめて最後に (comments があったか, 辞書) として返す
+    """
+    reader.consume('{')
+    values = {}
+    streamed = False
+    if reader.peek() == '}':
+        reader.pos += 1
+        return streamed, values
+    while True:
+        key = reader.decode()
+        if not isinstance(key, str):
+            reader.error("Expecting property name enclosed in double quotes")
+        reader.consume(':')
+        if key == 'comments' and reader.peek() == '[':
+            yield from _iter_array(reader)
+            streamed = True
+        else:
+            values[key] = reader.decode()
+        if not reader.delimiter('}'):
+            return streamed, values
+
+
+def iter_json_items(fp, read_size=DEFAULT_READ_SIZE):
+    """
+    JSON（配列 / {"comments": [...]} / JSON Lines）の要素を1件ずつ返すジェネレータ
+    fp はテキストストリーム。形式が不正な場合は json.JSONDecodeError（ValueError）を送出する
+    """
+    reader = _Reader(fp, read_size)
+    if reader.peek() == '[':
+        yield from _iter_array(reader)
+        if reader.peek():
+            reader.error("Extra data")
+        return
+
+    while reader.peek():
+        if reader.peek() != '{':
+            yield reader.decode()
+            continue
+        # バッファ内で完結するオブジェクト（JSON Lines の1行など）はまとめて解析する
+        value = reader.decode_buffered()
+        if value is None:
+            # 大きなオブジェクトはキーごとに読み込み、comments の配列を1件ずつ返す
+            streamed, value = yield from _iter_object(reader)
+            if streamed:
+                continue
+        elif isinstance(value.get('comments'), list):
+            yield from value['comments']
+            continue
+        # comments キーのないオブジェクトは JSON Lines の1行（コメント1件）として扱う
+        yield value
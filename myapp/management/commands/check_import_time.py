@@ -0,0 +1,94 @@
+import json
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULT_BUDGET_MS = 1000
+
+# 起動時に読み込まれてはいけない（分析・エクスポート時にだけ読み込む）パッケージ
+HEAVY_MODULES = ('numpy', 'scipy', 'sklearn', 'pandas', 'janome', 'pyarrow', 'hnswlib', 'matplotlib', 'stripe')
+
+# 子プロセスで実行する起動処理（gunicorn の起動と同じく、設定・アプリ・URLconf・管理画面を読み込む）
+STARTUP_SCRIPT = f"""
+import json, sys
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+print('@@' + json.dumps([name for name in {HEAVY_MODULES!r} if name in sys.modules]))
+"""
+
+_IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+class Command(BaseCommand):
+    help = 'コールドスタート（新しいプロセスでの Django 起動と URLconf の読み込み）の時間を計測し、上限を超えたら失敗します'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--budget-ms', type=float,
+            help=f'許容する起動時間（ミリ秒、デフォルト: settings.IMPORT_TIME_BUDGET_MS または {DEFAULT_BUDGET_MS}）',
+        )
+        parser.add_argument('--runs', type=int, default=5, help='計測回数（中央値で判定、デフォルト: 5）')
+        parser.add_argument('--top', type=int, default=10, help='読み込みに時間がかかったモジュールの表示数（デフォルト: 10）')
+
+    def _run(self, *python_args):
+        # manage.py が設定した DJANGO_SETTINGS_MODULE は環境変数として子プロセスに引き継がれる
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, *python_args, '-c', STARTUP_SCRIPT],
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if result.returncode != 0:
+            raise CommandError(f'起動に失敗しました:\n{result.stderr}')
+        heavy = []
+        for line in result.stdout.splitlines():
+            if line.startswith('@@'):
+                heavy = json.loads(line[2:])
+        return elapsed_ms, heavy, result.stderr
+
+    def _slowest_modules(self, importtime_output, top):
+        """-X importtime の出力から、最上位で読み込まれたモジュールを累計時間の順に返す"""
+        modules = []
+        for line in importtime_output.splitlines():
+            match = _IMPORTTIME_LINE.match(line)
+            if match and len(match.group(3)) == 1:
+                modules.append((int(match.group(2)) / 1000, match.group(4)))
+        return sorted(modules, reverse=True)[:top]
+
+    def handle(self, *args, **options):
+        budget = options['budget_ms']
+        if budget is None:
+            budget = getattr(settings, 'IMPORT_TIME_BUDGET_MS', DEFAULT_BUDGET_MS)
+        runs = max(1, options['runs'])
+
+        timings = []
+        heavy = []
+        for _ in range(runs):
+            elapsed_ms, heavy, _ = self._run()
+            timings.append(elapsed_ms)
+        median = statistics.median(timings)
+
+        _, _, importtime_output = self._run('-X', 'importtime')
+        self.stdout.write('読み込みに時間がかかったモジュール（累計）:')
+        for ms, name in self._slowest_modules(importtime_output, options['top']):
+            self.stdout.write(f'  {ms:8.1f} ms  {name}')
+        self.stdout.write(
+            f'起動時間: 中央値 {median:.0f} ms（最小 {min(timings):.0f} ms / 最大 {max(timings):.0f} ms, {runs}回）'
+            f' / 上限 {budget:.0f} ms'
+        )
+
+        errors = []
+        if heavy:
+            errors.append(f'起動時に重いパッケージが読み込まれています: {", ".join(heavy)}')
+        if median > budget:
+            errors.append(f'起動時間が上限を超えています（{median:.0f} ms > {budget:.0f} ms）')
+        if errors:
+            raise CommandError('\n'.join(errors))
+        self.stdout.write(self.style.SUCCESS('起動時間は上限内です。'))
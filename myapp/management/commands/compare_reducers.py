@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from myapp.analytics import clean_text
+from myapp.clustering import REDUCER_PCA, REDUCER_SVD, compare_reducers
+from myapp.models import YouTubeComment
+
+
+class Command(BaseCommand):
+    help = 'クラスタリングの次元削減（疎行列TruncatedSVD と 密行列PCA）の精度を比較します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clusters', type=int, default=6, help='クラスタ数（デフォルト: 6）')
+        parser.add_argument('--sample-size', type=int, default=5000, help='比較に使う最大件数（デフォルト: 5000）')
+
+    def handle(self, *args, **options):
+        texts = YouTubeComment.objects.values_list('comment_text', flat=True).iterator(chunk_size=2000)
+        comments = [c for c in (clean_text(t) for t in texts) if c]
+        if len(comments) < options['clusters']:
+            self.stdout.write(self.style.WARNING('比較に必要なコメント数が不足しています。'))
+            return
+
+        result = compare_reducers(comments, options['clusters'], sample_size=options['sample_size'])
+        self.stdout.write(f'対象: {result["n_samples"]} 件 / 特徴量: {result["n_features"]}')
+        self.stdout.write(f'説明分散比 SVD: {result[REDUCER_SVD]["explained_variance"]:.3f}')
+        self.stdout.write(f'説明分散比 PCA: {result[REDUCER_PCA]["explained_variance"]:.3f}')
+        self.stdout.write(f'部分空間の最大角度: {result["max_subspace_angle"]:.1f}度')
+        self.stdout.write(self.style.SUCCESS(
+            f'クラスタ一致度（ARI, 1.0で完全一致）: {result["cluster_agreement_ari"]:.3f}'
+        ))
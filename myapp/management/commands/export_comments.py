@@ -0,0 +1,55 @@
+import sys
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from myapp.exporters import EXPORT_FORMATS, FORMAT_PARQUET, get_export_format, iter_report
+from myapp.models import YouTubeComment
+
+
+class Command(BaseCommand):
+    help = 'コメントを CSV / JSONL / Parquet / Arrow 形式でファイルに出力します（データベースからチャンクごとに読み込みます）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="出力先ファイル（'-' の場合は標準出力）")
+        parser.add_argument(
+            '--format', default=FORMAT_PARQUET, choices=sorted(EXPORT_FORMATS),
+            help='出力形式（デフォルト: parquet）',
+        )
+        parser.add_argument('--owner', help='指定したユーザー名のコメントのみ出力します')
+        parser.add_argument('--chunk-size', type=int, help='1回に読み込む件数（デフォルト: settings.EXPORT_CHUNK_SIZE）')
+        parser.add_argument('--gzip', action='store_true', help='CSV / JSONL を gzip 圧縮して出力します')
+
+    def handle(self, *args, **options):
+        try:
+            export_format = get_export_format(options['format'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        comments = YouTubeComment.objects.order_by('-created_at', '-id')
+        if options['owner']:
+            try:
+                owner = User.objects.get(username=options['owner'])
+            except User.DoesNotExist:
+                raise CommandError(f"ユーザー '{options['owner']}' が見つかりません。")
+            comments = comments.filter(owner=owner)
+
+        started = time.monotonic()
+        chunks = iter_report(comments, export_format, compress=options['gzip'], chunk_size=options['chunk_size'])
+        output = options['output']
+        size = 0
+        if output == '-':
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+                size += len(chunk)
+            sys.stdout.buffer.flush()
+            return
+
+        with open(output, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                size += len(chunk)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{output} に出力しました（{export_format}, {size / 1024 / 1024:.1f} MB, {elapsed:.2f}秒）。'
+        ))
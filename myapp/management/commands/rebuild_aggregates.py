@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+from myapp.aggregates import get_engagement_stats, rebuild_aggregates
+
+
+class Command(BaseCommand):
+    help = 'いいね数・返信数の集計テーブル（全体・ユーザー別・動画別）をコメントテーブルから作り直します'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        rebuild_aggregates()
+        elapsed = time.monotonic() - started
+
+        stats = get_engagement_stats()
+        total = stats["total_comments"] if stats else 0
+        self.stdout.write(self.style.SUCCESS(f'集計テーブルを作り直しました（{total} 件, {elapsed:.2f}秒）。'))
@@ -0,0 +1,76 @@
+import time
+
+from django.core.management.base import BaseCommand
+from myapp.analytics import clean_text
+from myapp.clustering import clustering_quality, fit_clustering_stream, save_clustering_model
+from myapp.models import YouTubeComment
+from myapp.snapshots import build_snapshot, current_data_key
+
+
+def iter_comment_chunks(chunk_size):
+    """全コメントを chunk_size 件ずつ（前処理済みテキストのリストで）返す"""
+    texts = YouTubeComment.objects.order_by('pk').values_list('comment_text', flat=True)
+    chunk = []
+    for text in texts.iterator(chunk_size=chunk_size):
+        text = clean_text(text)
+        if text:
+            chunk.append(text)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = 'クラスタリングモデルを現在のデータで再学習し、ダッシュボードの分析結果を再計算します'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='全コメントをチャンクごとに読み込み、MiniBatchKMeans（partial_fit）で学習します',
+        )
+        parser.add_argument('--chunk-size', type=int, default=5000, help='--all 時の1チャンクの件数（デフォルト: 5000）')
+        parser.add_argument('--clusters', type=int, default=6, help='--all 時のクラスタ数（デフォルト: 6）')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            self.fit_all(options['chunk_size'], options['clusters'])
+            return
+
+        data_key = current_data_key()
+        started = time.monotonic()
+        data = build_snapshot(data_key, refit=True)
+        elapsed = time.monotonic() - started
+
+        cluster = data.get('cluster')
+        if not cluster:
+            self.stdout.write(self.style.WARNING('クラスタリング対象のコメントがありません。'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'{cluster["n_clusters"]} クラスタで再学習しました（{len(cluster["comments"])} 件, {elapsed:.2f}秒）。'
+        ))
+        self.write_quality(cluster)
+
+    def fit_all(self, chunk_size, n_clusters):
+        started = time.monotonic()
+        try:
+            model, sample_3d, labels = fit_clustering_stream(iter_comment_chunks(chunk_size), n_clusters)
+        except ValueError:
+            self.stdout.write(self.style.WARNING('クラスタリング対象のコメントが不足しています。'))
+            return
+        save_clustering_model(model)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{n_clusters} クラスタで再学習しました（{model.n_samples} 件, {elapsed:.2f}秒）。'
+        ))
+        self.write_quality(clustering_quality(model, sample_3d, labels))
+
+        # 学習済みモデルでダッシュボードの分析結果を作り直す
+        build_snapshot(current_data_key(), replace=True)
+
+    def write_quality(self, quality):
+        silhouette = quality['silhouette']
+        self.stdout.write(f'エンジン: {quality["engine"]}')
+        self.stdout.write(f'inertia: {quality["inertia"]:.4f}')
+        self.stdout.write(f'silhouette: {"-" if silhouette is None else f"{silhouette:.3f}"}')
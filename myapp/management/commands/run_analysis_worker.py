@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from myapp.jobs import claim_next_job, run_job
+from myapp.models import AnalysisJob
+
+
+class Command(BaseCommand):
+    help = 'ダッシュボード分析ジョブを処理するワーカーを起動します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='待機中のジョブを処理したら終了する')
+        parser.add_argument('--interval', type=float, default=2.0, help='ジョブがない場合の待機秒数（デフォルト: 2秒）')
+
+    def handle(self, *args, **options):
+        once = options['once']
+        interval = options['interval']
+
+        self.stdout.write(self.style.SUCCESS('分析ワーカーを起動しました。'))
+        while True:
+            job = claim_next_job()
+            if job is None:
+                if once:
+                    break
+                time.sleep(interval)
+                continue
+
+            started = time.monotonic()
+            job = run_job(job)
+            elapsed = time.monotonic() - started
+            if job.status == AnalysisJob.STATUS_DONE:
+                self.stdout.write(self.style.SUCCESS(
+                    f'ジョブ #{job.pk} ({job.data_key}) を処理しました（{elapsed:.2f}秒）。'
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(
+                    f'ジョブ #{job.pk} ({job.data_key}) が失敗しました: {job.error.splitlines()[-1] if job.error else ""}'
+                ))
@@ -0,0 +1,100 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from django.test.utils import override_settings, setup_databases, teardown_databases
+from myapp.benchmarks import BENCHMARKS, LANGUAGES, SIZES, compare_results, run_benchmarks
+
+
+# 共有キャッシュ（file / sqlite / redis）の実データ・ロックを消さないよう、計測中はプロセス内のキャッシュを使う
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'run-benchmarks',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    }
+}
+
+
+def _split(value):
+    return [item.strip().lower() for item in value.split(',') if item.strip()]
+
+
+class Command(BaseCommand):
+    help = (
+        '合成コメント（日本語・英語）でインポート・分析・ダッシュボード・エクスポート・検索の処理時間と'
+        'ピークメモリを計測し、結果をJSONで保存します（テスト用データベースとプロセス内キャッシュを使用）'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1k,10k', help=f"件数（{', '.join(SIZES)} をカンマ区切り、デフォルト: 1k,10k）")
+        parser.add_argument('--langs', default=','.join(LANGUAGES), help='言語（ja,en、デフォルト: 両方）')
+        parser.add_argument('--only', help=f"実行するベンチマーク（カンマ区切り: {', '.join(BENCHMARKS)}）")
+        parser.add_argument('--no-trace-memory', action='store_true', help='tracemalloc によるピークメモリの計測を行いません（計測のオーバーヘッドを除く場合）')
+        parser.add_argument('--output', help='結果の保存先（デフォルト: var/benchmarks/<日時>-<コミット>.json）')
+        parser.add_argument('--compare', help='比較する前回の結果（JSONファイル）')
+        parser.add_argument(
+            '--max-regression', type=float,
+            help='--compare で、この割合（%%）以上遅くなったベンチマークがあれば失敗します',
+        )
+        parser.add_argument('--keepdb', action='store_true', help='テスト用データベースを削除せずに再利用します')
+
+    def handle(self, *args, **options):
+        sizes = _split(options['sizes'])
+        languages = _split(options['langs'])
+        only = _split(options['only']) if options['only'] else None
+        for name, values, allowed in (('sizes', sizes, SIZES), ('langs', languages, LANGUAGES), ('only', only or [], BENCHMARKS)):
+            unknown = [value for value in values if value not in allowed]
+            if unknown:
+                raise CommandError(f"--{name} に不明な値があります: {', '.join(unknown)}")
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                baseline = json.load(f)
+
+        verbosity = options['verbosity']
+        # 実際のデータを消さないよう、テスト用データベースとプロセス内のキャッシュを使って計測する
+        # （テスト用データベースのデータバージョン・ユーザーIDは実データと重なるため、共有キャッシュに書き込まない）
+        with override_settings(CACHES=BENCHMARK_CACHES):
+            old_config = setup_databases(
+                verbosity, interactive=False, keepdb=options['keepdb'],
+                aliases={DEFAULT_DB_ALIAS}, serialized_aliases=set(),
+            )
+            try:
+                log = (lambda message: self.stdout.write(str(message))) if verbosity >= 1 else (lambda message: None)
+                report = run_benchmarks(sizes, languages, only=only, trace_memory=not options['no_trace_memory'], log=log)
+            finally:
+                teardown_databases(old_config, verbosity, keepdb=options['keepdb'])
+
+        output = options['output']
+        if not output:
+            directory = os.path.join(settings.BASE_DIR, 'var', 'benchmarks')
+            os.makedirs(directory, exist_ok=True)
+            stamp = report['meta']['created_at'].replace(':', '').replace('-', '')
+            output = os.path.join(directory, f"{stamp}-{report['meta']['commit'] or 'nogit'}.json")
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(report['results'])} 件の結果を {output} に保存しました（{report['meta']['total_seconds']}秒）。"
+        ))
+
+        if baseline is not None:
+            self._compare(report, baseline, options['max_regression'])
+
+    def _compare(self, report, baseline, max_regression):
+        self.stdout.write(f"比較対象: {baseline['meta'].get('commit')}（{baseline['meta'].get('created_at')}）")
+        regressions = []
+        for (name, lang, rows, export_format), before, after, ratio in compare_results(report, baseline):
+            label = f"{name}{f'[{export_format}]' if export_format else ''} {lang} {rows}"
+            change = (ratio - 1) * 100
+            line = f"  {label:45s} {before:10.4f}s -> {after:10.4f}s  {change:+7.1f}%"
+            if max_regression is not None and change >= max_regression:
+                regressions.append(label)
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+        if regressions:
+            raise CommandError(f"{len(regressions)} 件のベンチマークが {max_regression}% 以上遅くなりました。")
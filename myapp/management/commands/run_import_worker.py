@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+from myapp.import_jobs import claim_next_import_job, run_import_job
+from myapp.models import ImportJob
+
+
+class Command(BaseCommand):
+    help = 'コメントのインポートジョブを処理するワーカーを起動します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='待機中のジョブを処理したら終了する')
+        parser.add_argument('--interval', type=float, default=2.0, help='ジョブがない場合の待機秒数（デフォルト: 2秒）')
+
+    def handle(self, *args, **options):
+        once = options['once']
+        interval = options['interval']
+
+        self.stdout.write(self.style.SUCCESS('インポートワーカーを起動しました。'))
+        while True:
+            job = claim_next_import_job()
+            if job is None:
+                if once:
+                    break
+                time.sleep(interval)
+                continue
+
+            job = run_import_job(job)
+            if job.status == ImportJob.STATUS_DONE:
+                self.stdout.write(self.style.SUCCESS(
+                    f'ジョブ #{job.pk} ({job.file_name}) を処理しました（{job.elapsed_seconds():.2f}秒）。{job.message}'
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(
+                    f'ジョブ #{job.pk} ({job.file_name}) が失敗しました: {job.error.splitlines()[-1] if job.error else job.message}'
+                ))
@@ -0,0 +1,62 @@
+"""
+リクエストの計測用ミドルウェア（settings.REQUEST_METRICS_ENABLED=True の場合のみ有効）
+"""
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .instrumentation import DEFAULT_WINDOW, record_request, start_request_metrics, stop_request_metrics, timed
+
+# キャッシュ済みのページを返したリクエスト（ビューは実行されない）の集計名
+PAGE_CACHE_VIEW_NAME = 'page_cache'
+
+
+class RequestMetricsMiddleware:
+    """
+    SQLの件数・DB時間・キャッシュのヒット/ミス・処理時間を計測して Server-Timing ヘッダーで返す
+    ページキャッシュのヒットも計測するため、MIDDLEWARE の先頭（UpdateCacheMiddleware より前）に置く
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.window = getattr(settings, 'REQUEST_METRICS_WINDOW', DEFAULT_WINDOW)
+
+    def __call__(self, request):
+        metrics, token = start_request_metrics()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics.record_query))
+                response = self.get_response(request)
+        finally:
+            stop_request_metrics(token)
+        metrics.finish()
+
+        # ページキャッシュ: FetchFromCacheMiddleware はキャッシュがない場合に _cache_update_cache を True にする
+        update_cache = getattr(request, '_cache_update_cache', None)
+        page_cache_hit = request.method in ('GET', 'HEAD') and update_cache is False
+        if request.method in ('GET', 'HEAD') and update_cache is not None:
+            if page_cache_hit:
+                metrics.cache_hits += 1
+            else:
+                metrics.cache_misses += 1
+
+        response['Server-Timing'] = metrics.server_timing()
+        match = getattr(request, 'resolver_match', None)
+        if match is not None:
+            view_name = match.view_name or match._func_path
+        else:
+            view_name = PAGE_CACHE_VIEW_NAME if page_cache_hit else 'unresolved'
+        record_request(view_name, metrics, self.window)
+        return response
+
+    def process_template_response(self, request, response):
+        # TemplateResponse（クラスベースビュー）はビューの後で描画されるため、ここで描画して時間を計測する
+        # （このミドルウェアは先頭にあるため、process_template_response は最後に呼ばれる）
+        with timed('template'):
+            response.render()
+        return response
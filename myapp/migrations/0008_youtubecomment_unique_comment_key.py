@@ -0,0 +1,40 @@
+# Generated by Django 4.2.11 on 2026-10-18 09:57
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_comments(apps, schema_editor):
+    """制約追加前に (owner, video_id, comment_id) の重複行を削除する（最も古い行を残す）"""
+    YouTubeComment = apps.get_model("myapp", "YouTubeComment")
+    duplicates = (
+        YouTubeComment.objects.exclude(comment_id="")
+        .values("owner_id", "video_id", "comment_id")
+        .annotate(keep_id=Min("id"), n=Count("id"))
+        .filter(n__gt=1)
+    )
+    for dup in duplicates.iterator():
+        YouTubeComment.objects.filter(
+            owner_id=dup["owner_id"],
+            video_id=dup["video_id"],
+            comment_id=dup["comment_id"],
+        ).exclude(id=dup["keep_id"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myapp", "0007_youtubecomment_owner_alter_plan_stripe_price_id"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_comments, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="youtubecomment",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("comment_id", ""), _negated=True),
+                fields=("owner", "video_id", "comment_id"),
+                name="uniq_youtubecomment_owner_video_comment",
+            ),
+        ),
+    ]
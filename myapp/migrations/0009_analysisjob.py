@@ -0,0 +1,74 @@
+# Generated by Django 4.2.11 on 2026-10-18 09:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myapp", "0008_youtubecomment_unique_comment_key"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AnalysisJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "data_key",
+                    models.CharField(
+                        db_index=True, max_length=200, verbose_name="データキー"
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "待機中"),
+                            ("running", "実行中"),
+                            ("done", "完了"),
+                            ("failed", "失敗"),
+                        ],
+                        db_index=True,
+                        default="queued",
+                        max_length=20,
+                        verbose_name="ステータス",
+                    ),
+                ),
+                (
+                    "result",
+                    models.JSONField(blank=True, null=True, verbose_name="分析結果"),
+                ),
+                ("error", models.TextField(blank=True, verbose_name="エラー内容")),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="登録日時"),
+                ),
+                (
+                    "started_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="開始日時"
+                    ),
+                ),
+                (
+                    "finished_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="完了日時"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "分析ジョブ",
+                "verbose_name_plural": "分析ジョブ",
+                "ordering": ["-created_at"],
+            },
+        ),
+    ]
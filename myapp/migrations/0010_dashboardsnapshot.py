@@ -0,0 +1,59 @@
+# Generated by Django 4.2.11 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myapp", "0009_analysisjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DashboardSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "data_key",
+                    models.CharField(
+                        max_length=200, unique=True, verbose_name="データキー"
+                    ),
+                ),
+                ("payload", models.BinaryField(verbose_name="分析結果（圧縮JSON）")),
+                (
+                    "payload_size",
+                    models.IntegerField(
+                        default=0, verbose_name="展開後サイズ（バイト）"
+                    ),
+                ),
+                (
+                    "build_seconds",
+                    models.FloatField(default=0, verbose_name="計算時間（秒）"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, db_index=True, verbose_name="作成日時"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "ダッシュボードスナップショット",
+                "verbose_name_plural": "ダッシュボードスナップショット",
+                "ordering": ["-created_at"],
+            },
+        ),
+        migrations.RemoveField(
+            model_name="analysisjob",
+            name="result",
+        ),
+    ]
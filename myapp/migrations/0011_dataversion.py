@@ -0,0 +1,45 @@
+# Generated by Django 4.2.11 on 2026-10-18 10:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myapp", "0010_dashboardsnapshot"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DataVersion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "scope",
+                    models.CharField(
+                        max_length=50, unique=True, verbose_name="スコープ"
+                    ),
+                ),
+                (
+                    "version",
+                    models.BigIntegerField(default=0, verbose_name="バージョン"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="更新日時"),
+                ),
+            ],
+            options={
+                "verbose_name": "データバージョン",
+                "verbose_name_plural": "データバージョン",
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.11 on 2026-10-18 10:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myapp", "0011_dataversion"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ClusteringModel",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("model_data", models.BinaryField(verbose_name="モデルデータ")),
+                ("n_clusters", models.IntegerField(verbose_name="クラスタ数")),
+                ("n_samples", models.IntegerField(verbose_name="学習件数")),
+                (
+                    "mean_distance",
+                    models.FloatField(default=0, verbose_name="平均重心距離"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, db_index=True, verbose_name="学習日時"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "クラスタリングモデル",
+                "verbose_name_plural": "クラスタリングモデル",
+                "ordering": ["-created_at"],
+            },
+        ),
+    ]
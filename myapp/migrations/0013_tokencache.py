@@ -0,0 +1,42 @@
+# Generated by Django 4.2.11 on 2026-10-18 10:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myapp", "0012_clusteringmodel"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TokenCache",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "text_hash",
+                    models.CharField(
+                        max_length=40, unique=True, verbose_name="本文ハッシュ"
+                    ),
+                ),
+                ("words", models.TextField(verbose_name="単語")),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="作成日時"),
+                ),
+            ],
+            options={
+                "verbose_name": "形態素解析キャッシュ",
+                "verbose_name_plural": "形態素解析キャッシュ",
+            },
+        ),
+    ]
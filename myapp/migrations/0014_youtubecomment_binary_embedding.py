@@ -0,0 +1,112 @@
+# Generated by Django 4.2.11 on 2026-10-18 10:30
+
+import json
+import logging
+import re
+
+import numpy as np
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+# ログに出力する破棄した行のIDの最大数
+REPORTED_IDS = 20
+
+logger = logging.getLogger(__name__)
+
+
+def _converted(queryset, convert, source, fields):
+    """source の値を convert で変換しながら BATCH_SIZE 件ずつ bulk_update する"""
+    batch = []
+    for comment in queryset.only("id", source).iterator(chunk_size=BATCH_SIZE):
+        convert(comment)
+        batch.append(comment)
+        if len(batch) >= BATCH_SIZE:
+            queryset.model.objects.bulk_update(batch, fields)
+            batch = []
+    if batch:
+        queryset.model.objects.bulk_update(batch, fields)
+
+
+def _parse(text):
+    text = text.strip()
+    if text.startswith("["):
+        values = json.loads(text)
+    else:
+        values = re.split(r"[\s,]+", text)
+    vector = np.asarray(values, dtype="<f4")
+    if vector.ndim != 1 or vector.size == 0 or not np.isfinite(vector).all():
+        raise ValueError(text[:40])
+    return vector
+
+
+def text_to_binary(apps, schema_editor):
+    """テキストの埋め込み（JSON配列またはカンマ・空白区切り）をfloat32のバイト列に変換する"""
+    YouTubeComment = apps.get_model("myapp", "YouTubeComment")
+    dropped = []
+
+    def convert(comment):
+        try:
+            vector = _parse(comment.embedding_text)
+        except (TypeError, ValueError):
+            # 数値として解釈できない値は変換せずに破棄する（件数とIDは最後にログに出力する）
+            comment.embedding, comment.embedding_dim = None, None
+            dropped.append(comment.id)
+            return
+        comment.embedding, comment.embedding_dim = vector.tobytes(), int(vector.size)
+
+    queryset = YouTubeComment.objects.exclude(embedding_text__isnull=True).exclude(
+        embedding_text=""
+    )
+    _converted(queryset, convert, "embedding_text", ["embedding", "embedding_dim"])
+
+    if dropped:
+        logger.warning(
+            "dropped %d embedding(s) that could not be parsed as numbers "
+            "(comment ids: %s%s); the text is removed with the embedding_text column",
+            len(dropped),
+            ", ".join(str(pk) for pk in dropped[:REPORTED_IDS]),
+            ", ..." if len(dropped) > REPORTED_IDS else "",
+        )
+
+
+def binary_to_text(apps, schema_editor):
+    YouTubeComment = apps.get_model("myapp", "YouTubeComment")
+
+    def convert(comment):
+        vector = np.frombuffer(bytes(comment.embedding), dtype="<f4")
+        comment.embedding_text = json.dumps(vector.tolist())
+
+    queryset = YouTubeComment.objects.exclude(embedding__isnull=True)
+    _converted(queryset, convert, "embedding", ["embedding_text"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myapp", "0013_tokencache"),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name="youtubecomment",
+            old_name="embedding",
+            new_name="embedding_text",
+        ),
+        migrations.AddField(
+            model_name="youtubecomment",
+            name="embedding",
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="youtubecomment",
+            name="embedding_dim",
+            field=models.PositiveIntegerField(
+                blank=True, null=True, verbose_name="埋め込み次元数"
+            ),
+        ),
+        migrations.RunPython(text_to_binary, binary_to_text),
+        migrations.RemoveField(
+            model_name="youtubecomment",
+            name="embedding_text",
+        ),
+    ]
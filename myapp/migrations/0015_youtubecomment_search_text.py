@@ -0,0 +1,51 @@
+# Generated by Django 4.2.11 on 2026-10-18 10:16
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def populate_search_text(apps, schema_editor):
+    """既存コメントの検索用テキストを生成する"""
+    from myapp.search import build_search_text
+
+    YouTubeComment = apps.get_model("myapp", "YouTubeComment")
+    queryset = YouTubeComment.objects.only("id", "comment_text", "author", "video_id")
+    batch = []
+    for comment in queryset.iterator(chunk_size=BATCH_SIZE):
+        comment.search_text = build_search_text(
+            comment.comment_text, comment.author, comment.video_id
+        )
+        batch.append(comment)
+        if len(batch) >= BATCH_SIZE:
+            YouTubeComment.objects.bulk_update(batch, ["search_text"])
+            batch = []
+    if batch:
+        YouTubeComment.objects.bulk_update(batch, ["search_text"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myapp", "0014_youtubecomment_binary_embedding"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="youtubecomment",
+            name="search_text",
+            field=models.TextField(blank=True, default="", editable=False),
+        ),
+        migrations.RunPython(populate_search_text, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="youtubecomment",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.search.SearchVector(
+                    "search_text", config="simple"
+                ),
+                name="youtubecomment_search_gin",
+            ),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.11 on 2026-10-18 10:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myapp", "0015_youtubecomment_search_text"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="youtubecomment",
+            index=models.Index(
+                models.OrderBy(
+                    models.F("created_at"), descending=True, nulls_last=True
+                ),
+                models.OrderBy(models.F("id"), descending=True),
+                name="youtubecomment_created_id_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="youtubecomment",
+            index=models.Index(
+                models.F("owner"),
+                models.OrderBy(
+                    models.F("created_at"), descending=True, nulls_last=True
+                ),
+                models.OrderBy(models.F("id"), descending=True),
+                name="ytcomment_owner_created_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,139 @@
+# Generated by Django 4.2.11 on 2026-10-18 10:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("myapp", "0016_youtubecomment_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImportJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "source_format",
+                    models.CharField(
+                        choices=[("csv", "CSV"), ("json", "JSON")],
+                        max_length=10,
+                        verbose_name="形式",
+                    ),
+                ),
+                (
+                    "mode",
+                    models.CharField(
+                        default="upsert", max_length=10, verbose_name="インポートモード"
+                    ),
+                ),
+                (
+                    "file_name",
+                    models.CharField(
+                        blank=True, max_length=255, verbose_name="ファイル名"
+                    ),
+                ),
+                (
+                    "file_path",
+                    models.CharField(blank=True, max_length=500, verbose_name="保存先"),
+                ),
+                (
+                    "file_size",
+                    models.BigIntegerField(
+                        default=0, verbose_name="ファイルサイズ（バイト）"
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "待機中"),
+                            ("running", "実行中"),
+                            ("done", "完了"),
+                            ("failed", "失敗"),
+                        ],
+                        db_index=True,
+                        default="queued",
+                        max_length=20,
+                        verbose_name="ステータス",
+                    ),
+                ),
+                (
+                    "bytes_read",
+                    models.BigIntegerField(
+                        default=0, verbose_name="読み込み済み（バイト）"
+                    ),
+                ),
+                (
+                    "total_rows",
+                    models.IntegerField(blank=True, null=True, verbose_name="総件数"),
+                ),
+                (
+                    "processed_rows",
+                    models.IntegerField(default=0, verbose_name="処理済み件数"),
+                ),
+                ("created_count", models.IntegerField(default=0, verbose_name="追加")),
+                ("updated_count", models.IntegerField(default=0, verbose_name="更新")),
+                (
+                    "unchanged_count",
+                    models.IntegerField(default=0, verbose_name="変更なし"),
+                ),
+                (
+                    "skipped_count",
+                    models.IntegerField(default=0, verbose_name="スキップ"),
+                ),
+                (
+                    "error_report_path",
+                    models.CharField(
+                        blank=True, max_length=500, verbose_name="エラーレポート"
+                    ),
+                ),
+                ("message", models.TextField(blank=True, verbose_name="結果")),
+                ("error", models.TextField(blank=True, verbose_name="エラー内容")),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="登録日時"),
+                ),
+                (
+                    "started_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="開始日時"
+                    ),
+                ),
+                (
+                    "finished_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="完了日時"
+                    ),
+                ),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="import_jobs",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="所有者",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "インポートジョブ",
+                "verbose_name_plural": "インポートジョブ",
+                "ordering": ["-created_at"],
+            },
+        ),
+    ]
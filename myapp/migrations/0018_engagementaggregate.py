@@ -0,0 +1,155 @@
+# Generated by Django 4.2.11 on 2026-10-18 10:32
+
+from django.db import migrations, models
+from django.db.models import Count, FloatField, Max, Sum
+from django.db.models.functions import Cast
+
+SUM_FIELDS = (
+    "comment_count",
+    "like_sum",
+    "like_sq_sum",
+    "reply_sum",
+    "reply_sq_sum",
+    "engagement_sum",
+)
+MAX_FIELDS = ("like_max", "reply_max")
+
+
+def _owner_scope(owner_id):
+    return f"owner:{owner_id if owner_id is not None else 'none'}"
+
+
+def _merge(target, values):
+    for field in SUM_FIELDS:
+        target[field] = target.get(field, 0) + (values[field] or 0)
+    for field in MAX_FIELDS:
+        target[field] = max(target.get(field, 0), values[field] or 0)
+
+
+def populate_aggregates(apps, schema_editor):
+    """既存のコメントから全体・ユーザー別・動画別の集計行を作成する"""
+    YouTubeComment = apps.get_model("myapp", "YouTubeComment")
+    EngagementAggregate = apps.get_model("myapp", "EngagementAggregate")
+
+    groups = (
+        YouTubeComment.objects.order_by()
+        .values("owner_id", "video_id")
+        .annotate(
+            comment_count=Count("id"),
+            like_sum=Sum("like_count"),
+            like_sq_sum=Sum(
+                Cast("like_count", FloatField()) * Cast("like_count", FloatField())
+            ),
+            like_max=Max("like_count"),
+            reply_sum=Sum("reply_count"),
+            reply_sq_sum=Sum(
+                Cast("reply_count", FloatField()) * Cast("reply_count", FloatField())
+            ),
+            reply_max=Max("reply_count"),
+            engagement_sum=Sum("engagement_score"),
+        )
+    )
+    rows = []
+    per_owner = {}
+    total = {}
+    for values in groups.iterator():
+        owner_id, video_id = values["owner_id"], values["video_id"]
+        _merge(per_owner.setdefault(owner_id, {}), values)
+        _merge(total, values)
+        rows.append(
+            EngagementAggregate(
+                scope=f"{_owner_scope(owner_id)}:video:{video_id}",
+                video_id=video_id,
+                **{field: values[field] or 0 for field in SUM_FIELDS + MAX_FIELDS},
+            )
+        )
+    rows.extend(
+        EngagementAggregate(scope=_owner_scope(owner_id), **values)
+        for owner_id, values in per_owner.items()
+    )
+    if total:
+        rows.append(EngagementAggregate(scope="global", **total))
+    EngagementAggregate.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myapp", "0017_importjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EngagementAggregate",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "scope",
+                    models.CharField(
+                        max_length=120, unique=True, verbose_name="スコープ"
+                    ),
+                ),
+                (
+                    "video_id",
+                    models.CharField(blank=True, max_length=50, verbose_name="動画ID"),
+                ),
+                (
+                    "comment_count",
+                    models.BigIntegerField(default=0, verbose_name="コメント数"),
+                ),
+                (
+                    "like_sum",
+                    models.BigIntegerField(default=0, verbose_name="いいね数合計"),
+                ),
+                (
+                    "like_sq_sum",
+                    models.FloatField(default=0, verbose_name="いいね数二乗和"),
+                ),
+                (
+                    "like_max",
+                    models.IntegerField(default=0, verbose_name="最大いいね数"),
+                ),
+                (
+                    "reply_sum",
+                    models.BigIntegerField(default=0, verbose_name="返信数合計"),
+                ),
+                (
+                    "reply_sq_sum",
+                    models.FloatField(default=0, verbose_name="返信数二乗和"),
+                ),
+                (
+                    "reply_max",
+                    models.IntegerField(default=0, verbose_name="最大返信数"),
+                ),
+                (
+                    "engagement_sum",
+                    models.FloatField(
+                        default=0, verbose_name="エンゲージメントスコア合計"
+                    ),
+                ),
+                (
+                    "maxima_stale",
+                    models.BooleanField(
+                        default=False, verbose_name="最大値の再計算が必要"
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="更新日時"),
+                ),
+            ],
+            options={
+                "verbose_name": "エンゲージメント集計",
+                "verbose_name_plural": "エンゲージメント集計",
+            },
+        ),
+        migrations.RunPython(populate_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.2.11 on 2026-10-18 10:58
+
+import importlib
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min
+
+
+def remove_duplicate_ownerless_comments(apps, schema_editor):
+    """
+    制約追加前に所有者なしの (video_id, comment_id) の重複行を削除する（最も古い行を残す）
+    0008 の制約は owner IS NULL の行には効かないため、0008 以降に重複が入っている可能性がある
+    """
+    YouTubeComment = apps.get_model("myapp", "YouTubeComment")
+    EngagementAggregate = apps.get_model("myapp", "EngagementAggregate")
+    DataVersion = apps.get_model("myapp", "DataVersion")
+
+    duplicates = (
+        YouTubeComment.objects.filter(owner__isnull=True)
+        .exclude(comment_id="")
+        .values("video_id", "comment_id")
+        .annotate(keep_id=Min("id"), n=Count("id"))
+        .filter(n__gt=1)
+    )
+    removed = 0
+    for dup in duplicates.iterator():
+        removed += (
+            YouTubeComment.objects.filter(
+                owner__isnull=True,
+                video_id=dup["video_id"],
+                comment_id=dup["comment_id"],
+            )
+            .exclude(id=dup["keep_id"])
+            .delete()[0]
+        )
+    if not removed:
+        return
+
+    # 削除した行の分、集計テーブルを作り直し、キャッシュ・スナップショットを無効にする
+    EngagementAggregate.objects.all().delete()
+    importlib.import_module(
+        "myapp.migrations.0018_engagementaggregate"
+    ).populate_aggregates(apps, schema_editor)
+    DataVersion.objects.filter(scope__in=["global", "owner:none"]).update(
+        version=F("version") + 1
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myapp", "0018_engagementaggregate"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_duplicate_ownerless_comments, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name="youtubecomment",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(
+                    ("owner__isnull", True),
+                    models.Q(("comment_id", ""), _negated=True),
+                ),
+                fields=("video_id", "comment_id"),
+                name="uniq_youtubecomment_video_comment_no_owner",
+            ),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.11 on 2026-10-18 11:10
+
+from django.db import migrations, models
+
+
+def remove_duplicate_pending_jobs(apps, schema_editor):
+    """
+    制約追加前に同じデータキーの待機中・実行中ジョブの重複を削除する
+    実行中のジョブがあればそれを、なければ最も古い待機中のジョブを残す
+    """
+    AnalysisJob = apps.get_model("myapp", "AnalysisJob")
+
+    pending = AnalysisJob.objects.filter(status__in=["queued", "running"])
+    kept = set()
+    duplicate_ids = []
+    # 実行中 → 待機中、古い順に並べ、データキーごとに最初の1件を残す
+    for job_id, data_key in pending.order_by("-status", "created_at", "id").values_list(
+        "id", "data_key"
+    ):
+        if data_key in kept:
+            duplicate_ids.append(job_id)
+        else:
+            kept.add(data_key)
+    if duplicate_ids:
+        AnalysisJob.objects.filter(id__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myapp", "0019_youtubecomment_unique_comment_key_no_owner"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_pending_jobs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="analysisjob",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("status__in", ["queued", "running"])),
+                fields=("data_key",),
+                name="uniq_analysisjob_pending_data_key",
+            ),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.11 on 2026-10-18 11:40
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myapp", "0020_analysisjob_unique_pending_data_key"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="youtubecomment",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True,
+                default=django.utils.timezone.now,
+                verbose_name="更新日時",
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name="youtubecomment",
+            index=models.Index(
+                fields=["owner", "updated_at"], name="ytcomment_owner_updated_idx"
+            ),
+        ),
+    ]
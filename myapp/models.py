@@ -1,5 +1,13 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
+from django.utils import timezone
+
+from .search import comment_search_text
+
+# search_text の元になるフィールド
+SEARCH_SOURCE_FIELDS = {'comment_text', 'author', 'video_id'}
 
 class YouTubeComment(models.Model):
     video_id = models.CharField(max_length=50)
@@ -12,18 +20,64 @@ class YouTubeComment(models.Model):
     reply_depth_potential = models.IntegerField(default=0)
     engagement_score = models.FloatField(default=0)
     ai_reply = models.TextField(null=True, blank=True)
-    embedding = models.TextField(null=True, blank=True)
+    # float32のバイト列（myapp.embeddings で読み書きする）と次元数
+    embedding = models.BinaryField(null=True, blank=True)
+    embedding_dim = models.PositiveIntegerField(null=True, blank=True, verbose_name="埋め込み次元数")
     # ポータル用: コメントの所有者（ユーザーが自分のデータのみ操作可能にするため）
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='youtube_comments', null=True, blank=True, verbose_name="所有者")
+    # 全文検索用の正規化済みトークン（コメント内容・投稿者・動画ID、日本語はbigram）。myapp.search で生成する
+    search_text = models.TextField(blank=True, default='', editable=False)
+    # 類似検索インデックスの差分反映用（myapp.vector_index が前回以降に保存された行を取得する）
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新日時")
 
     class Meta:
         ordering = ['-created_at']
         verbose_name = "YouTube Comment"
         verbose_name_plural = "YouTube Comments"
+        constraints = [
+            # 再インポート時のupsertキー（comment_idが空の行は対象外）
+            models.UniqueConstraint(
+                fields=['owner', 'video_id', 'comment_id'],
+                condition=~models.Q(comment_id=''),
+                name='uniq_youtubecomment_owner_video_comment',
+            ),
+            # PostgreSQLではNULL同士は重複とみなされないため、所有者なしのコメントは別の制約で一意にする
+            models.UniqueConstraint(
+                fields=['video_id', 'comment_id'],
+                condition=models.Q(owner__isnull=True) & ~models.Q(comment_id=''),
+                name='uniq_youtubecomment_video_comment_no_owner',
+            ),
+        ]
+        indexes = [
+            # 一覧のキーセットページネーション用（myapp.pagination の並び順 created_at DESC NULLS LAST, id DESC と一致させる）
+            models.Index(
+                models.F('created_at').desc(nulls_last=True), models.F('id').desc(),
+                name='youtubecomment_created_id_idx',
+            ),
+            models.Index(
+                models.F('owner'), models.F('created_at').desc(nulls_last=True), models.F('id').desc(),
+                name='ytcomment_owner_created_idx',
+            ),
+            # 類似検索インデックスの差分反映用
+            models.Index(fields=['owner', 'updated_at'], name='ytcomment_owner_updated_idx'),
+            # ポータルの全文検索用（PostgreSQL: to_tsvector('simple', search_text) のGINインデックス）
+            GinIndex(SearchVector('search_text', config='simple'), name='youtubecomment_search_gin'),
+        ]
 
     def __str__(self):
         return f"{self.author}: {self.comment_text[:40]}..."
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or SEARCH_SOURCE_FIELDS.intersection(update_fields):
+            self.search_text = comment_search_text(self)
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'search_text'}
+        if update_fields is not None:
+            # 一部のフィールドのみの保存でも更新日時は書き込む（類似検索インデックスの差分反映のため）
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {'updated_at'}
+        super().save(*args, **kwargs)
+
 
 class Plan(models.Model):
     """プランモデル - プランの種類を定義"""
@@ -88,3 +142,230 @@ class UserProfile(models.Model):
 
     def __str__(self):
         return f"{self.user.username} - {'有料' if self.is_premium else '無料'}"
+
+
+class AnalysisJob(models.Model):
+    """ダッシュボード分析ジョブ - run_analysis_workerコマンドがバックグラウンドで処理する"""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, '待機中'),
+        (STATUS_RUNNING, '実行中'),
+        (STATUS_DONE, '完了'),
+        (STATUS_FAILED, '失敗'),
+    ]
+
+    data_key = models.CharField(max_length=200, db_index=True, verbose_name="データキー")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED, db_index=True, verbose_name="ステータス")
+    error = models.TextField(blank=True, verbose_name="エラー内容")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="登録日時")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="開始日時")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="完了日時")
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            # 同じデータキーの待機中・実行中のジョブは1件のみ（同時リクエストによる重複登録を防ぐ）
+            models.UniqueConstraint(
+                fields=['data_key'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='uniq_analysisjob_pending_data_key',
+            ),
+        ]
+        verbose_name = "分析ジョブ"
+        verbose_name_plural = "分析ジョブ"
+
+    def __str__(self):
+        return f"{self.data_key} ({self.get_status_display()})"
+
+
+class ImportJob(models.Model):
+    """
+    コメントのインポートジョブ - アップロードされたファイルをディスクに保存し、
+    run_import_workerコマンド（または IMPORT_ASYNC=False の場合はリクエスト内）で処理する
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, '待機中'),
+        (STATUS_RUNNING, '実行中'),
+        (STATUS_DONE, '完了'),
+        (STATUS_FAILED, '失敗'),
+    ]
+
+    FORMAT_CSV = 'csv'
+    FORMAT_JSON = 'json'
+    FORMAT_CHOICES = [
+        (FORMAT_CSV, 'CSV'),
+        (FORMAT_JSON, 'JSON'),
+    ]
+
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='import_jobs', null=True, blank=True, verbose_name="所有者")
+    source_format = models.CharField(max_length=10, choices=FORMAT_CHOICES, verbose_name="形式")
+    mode = models.CharField(max_length=10, default='upsert', verbose_name="インポートモード")
+    file_name = models.CharField(max_length=255, blank=True, verbose_name="ファイル名")
+    file_path = models.CharField(max_length=500, blank=True, verbose_name="保存先")
+    file_size = models.BigIntegerField(default=0, verbose_name="ファイルサイズ（バイト）")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED, db_index=True, verbose_name="ステータス")
+    # 進捗（ファイルの読み込み済みバイト数、件数が事前に分かる場合は total_rows）
+    bytes_read = models.BigIntegerField(default=0, verbose_name="読み込み済み（バイト）")
+    total_rows = models.IntegerField(null=True, blank=True, verbose_name="総件数")
+    processed_rows = models.IntegerField(default=0, verbose_name="処理済み件数")
+    created_count = models.IntegerField(default=0, verbose_name="追加")
+    updated_count = models.IntegerField(default=0, verbose_name="更新")
+    unchanged_count = models.IntegerField(default=0, verbose_name="変更なし")
+    skipped_count = models.IntegerField(default=0, verbose_name="スキップ")
+    error_report_path = models.CharField(max_length=500, blank=True, verbose_name="エラーレポート")
+    message = models.TextField(blank=True, verbose_name="結果")
+    error = models.TextField(blank=True, verbose_name="エラー内容")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="登録日時")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="開始日時")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="完了日時")
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "インポートジョブ"
+        verbose_name_plural = "インポートジョブ"
+
+    def __str__(self):
+        return f"{self.file_name} ({self.get_status_display()})"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+    @property
+    def progress(self):
+        """進捗率（0〜1）"""
+        if self.status == self.STATUS_DONE:
+            return 1.0
+        if self.total_rows:
+            return min(1.0, self.processed_rows / self.total_rows)
+        if self.file_size:
+            return min(1.0, self.bytes_read / self.file_size)
+        return 0.0
+
+    def elapsed_seconds(self, now=None):
+        if self.started_at is None:
+            return 0.0
+        end = self.finished_at or now or timezone.now()
+        return max(0.0, (end - self.started_at).total_seconds())
+
+    def eta_seconds(self, now=None):
+        """残り時間の目安（秒）。開始前・進捗がない場合は None"""
+        if self.is_finished:
+            return 0.0
+        progress = self.progress
+        if progress <= 0:
+            return None
+        return self.elapsed_seconds(now) * (1 - progress) / progress
+
+
+class DashboardSnapshot(models.Model):
+    """
+    ダッシュボード分析結果のスナップショット
+    データバージョン（data_key）ごとに1件保存し、全ワーカー・再起動後も共有する
+    """
+    data_key = models.CharField(max_length=200, unique=True, verbose_name="データキー")
+    # zlib圧縮したJSON（グラフ・統計・分析・アドバイス・クラスタ）
+    payload = models.BinaryField(verbose_name="分析結果（圧縮JSON）")
+    payload_size = models.IntegerField(default=0, verbose_name="展開後サイズ（バイト）")
+    build_seconds = models.FloatField(default=0, verbose_name="計算時間（秒）")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="作成日時")
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "ダッシュボードスナップショット"
+        verbose_name_plural = "ダッシュボードスナップショット"
+
+    def __str__(self):
+        return self.data_key
+
+
+class DataVersion(models.Model):
+    """
+    コメントデータのバージョンカウンタ
+    コメントの保存・削除・一括インポートのたびに増加する（全体用 'global' とユーザー別 'owner:<id>'）
+    """
+    scope = models.CharField(max_length=50, unique=True, verbose_name="スコープ")
+    version = models.BigIntegerField(default=0, verbose_name="バージョン")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新日時")
+
+    class Meta:
+        verbose_name = "データバージョン"
+        verbose_name_plural = "データバージョン"
+
+    def __str__(self):
+        return f"{self.scope}: {self.version}"
+
+
+class EngagementAggregate(models.Model):
+    """
+    いいね数・返信数の集計（件数・合計・二乗和・最大値）
+    全体（'global'）・ユーザー別（'owner:<id>'）・ユーザーの動画別（'owner:<id>:video:<video_id>'）に1行ずつ持ち、
+    コメントの追加・更新・削除・一括インポートのたびに差分で更新する（myapp.aggregates）
+    """
+    scope = models.CharField(max_length=120, unique=True, verbose_name="スコープ")
+    video_id = models.CharField(max_length=50, blank=True, verbose_name="動画ID")
+    comment_count = models.BigIntegerField(default=0, verbose_name="コメント数")
+    like_sum = models.BigIntegerField(default=0, verbose_name="いいね数合計")
+    like_sq_sum = models.FloatField(default=0, verbose_name="いいね数二乗和")
+    like_max = models.IntegerField(default=0, verbose_name="最大いいね数")
+    reply_sum = models.BigIntegerField(default=0, verbose_name="返信数合計")
+    reply_sq_sum = models.FloatField(default=0, verbose_name="返信数二乗和")
+    reply_max = models.IntegerField(default=0, verbose_name="最大返信数")
+    engagement_sum = models.FloatField(default=0, verbose_name="エンゲージメントスコア合計")
+    # 最大値のコメントが削除・更新された場合に True（次に読む時に再計算する）
+    maxima_stale = models.BooleanField(default=False, verbose_name="最大値の再計算が必要")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新日時")
+
+    class Meta:
+        verbose_name = "エンゲージメント集計"
+        verbose_name_plural = "エンゲージメント集計"
+
+    def __str__(self):
+        return f"{self.scope}: {self.comment_count}"
+
+
+class ClusteringModel(models.Model):
+    """
+    学習済みクラスタリングモデル（TF-IDF・次元削減・KMeansの重心）
+    新しいコメントは再学習せずにこのモデルで変換・割り当てを行う
+    """
+    # pickle化した学習済みオブジェクト
+    model_data = models.BinaryField(verbose_name="モデルデータ")
+    n_clusters = models.IntegerField(verbose_name="クラスタ数")
+    n_samples = models.IntegerField(verbose_name="学習件数")
+    # 学習時の各点から最寄りの重心までの平均距離（ドリフト判定の基準値）
+    mean_distance = models.FloatField(default=0, verbose_name="平均重心距離")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="学習日時")
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "クラスタリングモデル"
+        verbose_name_plural = "クラスタリングモデル"
+
+    def __str__(self):
+        return f"{self.n_clusters} clusters / {self.n_samples} samples ({self.created_at:%Y-%m-%d %H:%M})"
+
+
+class TokenCache(models.Model):
+    """
+    コメント本文ごとの形態素解析結果（抽出済み単語）のキャッシュ
+    本文のハッシュをキーにし、内容が変わらないコメントは再解析しない（settings.TOKEN_CACHE_PERSIST が有効な場合のみ使用）
+    """
+    text_hash = models.CharField(max_length=40, unique=True, verbose_name="本文ハッシュ")
+    # 抽出済み単語のJSON配列
+    words = models.TextField(verbose_name="単語")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="作成日時")
+
+    class Meta:
+        verbose_name = "形態素解析キャッシュ"
+        verbose_name_plural = "形態素解析キャッシュ"
+
+    def __str__(self):
+        return self.text_hash
@@ -0,0 +1,216 @@
+"""
+キーセット（カーソル）ページネーション
+
+Paginator は COUNT(*) と OFFSET を使うため、後ろのページほど遅くなる。
+ここでは並び順のキー（既定は created_at, id の降順）の値をカーソルとして渡し、
+「前のページの最後の行より後」を WHERE 条件で取得するため、何ページ目でも同じコストで表示できる。
+総件数はデータバージョン（DataVersion）ごとにキャッシュし、ページ移動のたびに数え直さない。
+"""
+import base64
+import binascii
+import hashlib
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Q
+from django.utils.http import urlencode
+
+from .caching import get_or_compute
+from .versioning import get_data_version
+
+# (フィールド名, 降順かどうか)。NULLは降順では最後、昇順では最初に並ぶ
+DEFAULT_ORDERING = (('created_at', True), ('id', True))
+
+DIRECTION_NEXT = 'n'
+DIRECTION_PREVIOUS = 'p'
+CURSOR_LAST = 'last'
+
+COUNT_CACHE_TIMEOUT = 60 * 60
+
+
+def order_expressions(ordering, reverse=False):
+    expressions = []
+    for name, descending in ordering:
+        if descending != reverse:
+            expressions.append(F(name).desc(nulls_last=True))
+        else:
+            expressions.append(F(name).asc(nulls_first=True))
+    return expressions
+
+
+def _after(name, value, descending):
+    """並び順で value より後ろにある行の条件（該当なしの場合は None）"""
+    if value is None:
+        # NULLは降順では最後、昇順では最初
+        return None if descending else Q(**{f'{name}__isnull': False})
+    if descending:
+        return Q(**{f'{name}__lt': value}) | Q(**{f'{name}__isnull': True})
+    return Q(**{f'{name}__gt': value})
+
+
+def _equal(name, value):
+    if value is None:
+        return Q(**{f'{name}__isnull': True})
+    return Q(**{name: value})
+
+
+def keyset_condition(ordering, values):
+    """並び順 ordering で values の行より後ろにある行の条件"""
+    condition = Q(pk__in=[])
+    prefix = Q()
+    for (name, descending), value in zip(ordering, values):
+        after = _after(name, value, descending)
+        if after is not None:
+            condition |= prefix & after
+        prefix &= _equal(name, value)
+    return condition
+
+
+def encode_cursor(direction, values):
+    data = json.dumps([direction, values], default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """カーソル文字列を (方向, 値のリスト) に変換する（不正な場合は None）"""
+    if not cursor:
+        return None
+    if cursor == CURSOR_LAST:
+        return CURSOR_LAST, None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError, binascii.Error):
+        return None
+    if direction not in (DIRECTION_NEXT, DIRECTION_PREVIOUS) or not isinstance(values, list):
+        return None
+    return direction, values
+
+
+def cached_count(queryset, scope_key, owner_id=None):
+    """
+    件数をデータバージョンごとにキャッシュして返す
+    scope_key には検索条件など、同じ件数になるクエリを識別する文字列を渡す
+    """
+    digest = hashlib.md5(scope_key.encode('utf-8')).hexdigest()
+    key = f"keyset_count:{owner_id}:{get_data_version(owner_id)}:{digest}"
+    # 同じ件数を複数のリクエストが同時に数えないよう、計算は1リクエストだけが行う
+    return get_or_compute(key, queryset.count, COUNT_CACHE_TIMEOUT)
+
+
+class KeysetPage:
+    """1ページ分の結果（テンプレートでは page_obj として使う）"""
+
+    def __init__(self, object_list, has_next, has_previous, next_cursor, previous_cursor, count=None):
+        self.object_list = object_list
+        self.has_next_page = has_next
+        self.has_previous_page = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count = count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.has_next_page
+
+    def has_previous(self):
+        return self.has_previous_page
+
+    def has_other_pages(self):
+        return self.has_next_page or self.has_previous_page
+
+
+class KeysetPaginator:
+    """
+    キーセットページネーション
+
+    ordering の最後のキーは一意（通常は id）である必要がある。
+    count は cached_count() などで求めた総件数（表示用、省略可）。
+    """
+
+    def __init__(self, queryset, per_page, ordering=DEFAULT_ORDERING, count=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.count = count
+
+    def _values(self, obj):
+        return [getattr(obj, name) for name, _ in self.ordering]
+
+    def _cursor_values(self, values):
+        """カーソルの値をフィールドの型に変換する"""
+        model = self.queryset.model
+        converted = []
+        for (name, _), value in zip(self.ordering, values):
+            try:
+                field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                # rank などの注釈はそのまま使う
+                converted.append(value)
+                continue
+            converted.append(None if value is None else field.to_python(value))
+        return converted
+
+    def page(self, cursor=None):
+        decoded = decode_cursor(cursor)
+        queryset = self.queryset
+        if decoded is None:
+            direction, values = DIRECTION_NEXT, None
+        else:
+            direction, values = decoded
+            if values is not None:
+                try:
+                    values = self._cursor_values(values)
+                except ValidationError:
+                    direction, values = DIRECTION_NEXT, None
+                if values is not None and len(values) != len(self.ordering):
+                    direction, values = DIRECTION_NEXT, None
+
+        backward = direction in (DIRECTION_PREVIOUS, CURSOR_LAST)
+        if values is not None:
+            condition = keyset_condition(
+                [(name, descending != backward) for name, descending in self.ordering],
+                values,
+            )
+            queryset = queryset.filter(condition)
+        rows = list(queryset.order_by(*order_expressions(self.ordering, reverse=backward))[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if backward:
+            rows.reverse()
+            has_previous = has_more
+            has_next = direction == DIRECTION_PREVIOUS
+        else:
+            has_next = has_more
+            has_previous = values is not None
+
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = encode_cursor(DIRECTION_NEXT, self._values(rows[-1]))
+        if rows and has_previous:
+            previous_cursor = encode_cursor(DIRECTION_PREVIOUS, self._values(rows[0]))
+        return KeysetPage(rows, has_next, has_previous, next_cursor, previous_cursor, count=self.count)
+
+
+def cursor_query(request, cursor, **extra):
+    """カーソルと現在のクエリパラメータ（page/cursor以外）からクエリ文字列を作る"""
+    params = {key: value for key, value in request.GET.items() if key not in ('cursor', 'page')}
+    params.update(extra)
+    if cursor:
+        params['cursor'] = cursor
+    return '?' + urlencode(params)
+
+
+def attach_links(page, request, **extra):
+    """テンプレート用に 最初/前へ/次へ/最後 のリンク（first_url など）を設定する"""
+    page.first_url = cursor_query(request, None, **extra) if page.has_previous_page else None
+    page.previous_url = cursor_query(request, page.previous_cursor, **extra) if page.previous_cursor else None
+    page.next_url = cursor_query(request, page.next_cursor, **extra) if page.next_cursor else None
+    page.last_url = cursor_query(request, CURSOR_LAST, **extra) if page.has_next_page else None
+    return page
@@ -0,0 +1,90 @@
+"""
+コメントの全文検索
+
+YouTubeComment.search_text には、コメント内容・投稿者・動画IDを正規化・分割したトークンを保存する:
+NFKC正規化・小文字化した上で、英数字の単語はそのまま、日本語（かな・漢字）の連続は
+1文字と2文字（bigram）に分割する（PostgreSQLのパーサーは日本語を分割しないため）。
+PostgreSQLでは to_tsvector('simple', search_text) のGINインデックスで検索し、ts_rank で順位付けする。
+その他のデータベースでは icontains で検索する。
+"""
+import re
+import unicodedata
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections
+from django.db.models import Q
+
+SEARCH_CONFIG = 'simple'
+
+_CJK = '\u3040-\u30ff\u3400-\u9fff\uf900-\ufaff'
+_TOKEN = re.compile(rf'(?P<cjk>[{_CJK}]+)|(?P<word>[^\W_{_CJK}]+)')
+
+
+def _normalize(text):
+    return unicodedata.normalize('NFKC', text or '').lower()
+
+
+def _cjk_grams(run):
+    """かな・漢字の連続の1文字と2文字（bigram）"""
+    grams = list(run)
+    grams.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return grams
+
+
+def build_search_text(*values):
+    """フィールドの値から検索用トークン（空白区切り）を生成する"""
+    tokens = []
+    for value in values:
+        for match in _TOKEN.finditer(_normalize(value)):
+            if match.group('cjk'):
+                tokens.extend(_cjk_grams(match.group('cjk')))
+            else:
+                tokens.append(match.group('word'))
+    return ' '.join(tokens)
+
+
+def comment_search_text(comment):
+    return build_search_text(comment.comment_text, comment.author, comment.video_id)
+
+
+def build_tsquery(query):
+    """
+    検索語から tsquery の文字列を生成する（検索できる語がない場合はNone）
+    すべての語に一致する必要がある: 英数字の単語は前方一致、日本語はbigram（1文字の場合はその文字）
+    """
+    terms = []
+    for match in _TOKEN.finditer(_normalize(query)):
+        run = match.group('cjk')
+        if run:
+            grams = [run] if len(run) == 1 else [run[i:i + 2] for i in range(len(run) - 1)]
+            terms.extend(f"'{gram}'" for gram in grams)
+        else:
+            terms.append(f"'{match.group('word')}':*")
+    return ' & '.join(dict.fromkeys(terms)) or None
+
+
+def search_comments(queryset, query):
+    """
+    YouTubeCommentのクエリセットを検索語で絞り込む
+    戻り値は (クエリセット, 順位付きかどうか)。順位付きの場合は rank（大きいほど関連度が高い）が付く
+    """
+    query = (query or '').strip()
+    if not query:
+        return queryset, False
+
+    tsquery = build_tsquery(query)
+    if tsquery is None or connections[queryset.db].vendor != 'postgresql':
+        return queryset.filter(
+            Q(comment_text__icontains=query) |
+            Q(author__icontains=query) |
+            Q(video_id__icontains=query)
+        ), False
+
+    vector = SearchVector('search_text', config=SEARCH_CONFIG)
+    search_query = SearchQuery(tsquery, config=SEARCH_CONFIG, search_type='raw')
+    queryset = (
+        queryset.annotate(search=vector)
+        .filter(search=search_query)
+        .annotate(rank=SearchRank(vector, search_query))
+    )
+    return queryset, True
@@ -0,0 +1,78 @@
+"""
+YouTubeCommentの変更時に実行されるシグナルハンドラ
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .aggregates import AGGREGATE_FIELDS, aggregate_row, apply_aggregate_changes
+from .models import YouTubeComment
+from .versioning import bump_data_version, signals_suspended
+
+
+@receiver(post_save, sender=YouTubeComment)
+@receiver(post_delete, sender=YouTubeComment)
+def bump_version_on_change(sender, instance, **kwargs):
+    """コメントの保存・削除時にデータバージョンを更新（所有者が変わった場合は変更前の所有者も）"""
+    if signals_suspended():
+        return
+    owner_ids = [instance.owner_id]
+    previous = getattr(instance, '_aggregate_previous', None)
+    if kwargs['signal'] is post_save and previous is not None:
+        owner_ids.append(previous[AGGREGATE_FIELDS.index('owner_id')])
+    bump_data_version(owner_ids)
+
+
+@receiver(pre_save, sender=YouTubeComment)
+def remember_aggregate_row(sender, instance, **kwargs):
+    """更新前の値を保持しておく（保存後に集計テーブルの差分を計算し、変更前の所有者のバージョンも更新するため）"""
+    instance._aggregate_previous = None
+    if signals_suspended() or instance.pk is None or instance._state.adding:
+        return
+    instance._aggregate_previous = (
+        YouTubeComment.objects.filter(pk=instance.pk).values_list(*AGGREGATE_FIELDS).first()
+    )
+
+
+@receiver(post_save, sender=YouTubeComment)
+def update_aggregates_on_save(sender, instance, created, **kwargs):
+    """集計テーブルに追加・更新を反映（コメントの保存と同じトランザクション内）"""
+    if signals_suspended():
+        return
+    previous = getattr(instance, '_aggregate_previous', None)
+    current = aggregate_row(instance)
+    if previous == current:
+        return
+    apply_aggregate_changes(added=[current], removed=[previous] if previous else [])
+
+
+@receiver(post_delete, sender=YouTubeComment)
+def update_aggregates_on_delete(sender, instance, **kwargs):
+    """集計テーブルから削除を反映"""
+    if signals_suspended():
+        return
+    apply_aggregate_changes(removed=[aggregate_row(instance)])
+
+
+def _update_vector_index(owner_id, pk, embedding=None, deleted=False):
+    # NumPy を読み込むため、インデックスのモジュールは最初の保存・削除時に読み込む
+    from .vector_index import update_index
+    update_index(owner_id, pk, embedding, deleted=deleted)
+
+
+@receiver(post_save, sender=YouTubeComment)
+def update_vector_index_on_save(sender, instance, **kwargs):
+    """読み込み済みの類似検索インデックスに保存内容を反映（コミット後に実行）"""
+    if signals_suspended():
+        return
+    owner_id, pk, embedding = instance.owner_id, instance.pk, instance.embedding
+    transaction.on_commit(lambda: _update_vector_index(owner_id, pk, embedding))
+
+
+@receiver(post_delete, sender=YouTubeComment)
+def update_vector_index_on_delete(sender, instance, **kwargs):
+    """読み込み済みの類似検索インデックスから削除（コミット後に実行）"""
+    if signals_suspended():
+        return
+    owner_id, pk = instance.owner_id, instance.pk
+    transaction.on_commit(lambda: _update_vector_index(owner_id, pk, deleted=True))
@@ -0,0 +1,143 @@
+"""
+ダッシュボード分析結果のスナップショット
+
+分析結果をデータキーごとに DashboardSnapshot テーブルへ圧縮JSONで保存する。
+データが変わらない限り再計算せず、全プロセスで同じ計算結果を共有する。
+データが変わった直後に複数のワーカーが同時に再計算しないよう、計算はロックを取った1プロセスが行う。
+"""
+import json
+import time
+import zlib
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .caching import cache_lock, wait_for
+from .instrumentation import record_cache, timed
+from .models import DashboardSnapshot
+from .versioning import get_data_version
+
+# 保持するスナップショット数のデフォルト値
+DEFAULT_SNAPSHOT_KEEP = 5
+
+# 展開済みスナップショットのプロセス内キャッシュ（直近1件のみ）
+_decoded = {}
+
+
+def current_data_key():
+    """現在のデータバージョンに対応するスナップショットのキー"""
+    return f"index_data_v{get_data_version()}"
+
+
+def encode_payload(data):
+    raw = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return zlib.compress(raw, 6), len(raw)
+
+
+def decode_payload(blob):
+    return json.loads(zlib.decompress(bytes(blob)).decode('utf-8'))
+
+
+def _load(snapshot):
+    """スナップショットを展開する（同じキーは再展開しない）"""
+    cached = _decoded.get(snapshot.data_key)
+    if cached is None:
+        cached = decode_payload(snapshot.payload)
+        _decoded.clear()
+        _decoded[snapshot.data_key] = cached
+    return cached
+
+
+def get_snapshot_data(data_key):
+    """data_keyのスナップショットを取得する（なければNone）"""
+    if data_key in _decoded:
+        record_cache(True)
+        return _decoded[data_key]
+    snapshot = DashboardSnapshot.objects.filter(data_key=data_key).first()
+    record_cache(snapshot is not None)
+    if snapshot is None:
+        return None
+    return _load(snapshot)
+
+
+def get_snapshot_info(data_key):
+    """data_keyのスナップショットの (id, 作成日時) を取得する（分析結果は読み込まない。なければNone）"""
+    return DashboardSnapshot.objects.filter(data_key=data_key).values_list('id', 'created_at').first()
+
+
+def get_latest_snapshot_data():
+    """直近のスナップショットを取得する（データキーが古くてもよい場合に使用）"""
+    snapshot = DashboardSnapshot.objects.order_by('-created_at').first()
+    if snapshot is None:
+        return None
+    return _load(snapshot)
+
+
+def save_snapshot(data_key, data, build_seconds=0):
+    """スナップショットを保存し、古いスナップショットを削除する"""
+    payload, size = encode_payload(data)
+    try:
+        with transaction.atomic():
+            snapshot = DashboardSnapshot.objects.create(
+                data_key=data_key,
+                payload=payload,
+                payload_size=size,
+                build_seconds=build_seconds,
+            )
+    except IntegrityError:
+        # 他のプロセスが同じキーで先に保存した場合はそちらを使う
+        snapshot = DashboardSnapshot.objects.get(data_key=data_key)
+
+    keep = getattr(settings, 'DASHBOARD_SNAPSHOT_KEEP', DEFAULT_SNAPSHOT_KEEP)
+    stale_ids = list(
+        DashboardSnapshot.objects.order_by('-created_at').values_list('id', flat=True)[keep:]
+    )
+    if stale_ids:
+        DashboardSnapshot.objects.filter(id__in=stale_ids).delete()
+    return snapshot
+
+
+def build_snapshot(data_key, refit=False, replace=False):
+    """
+    ダッシュボードデータを計算してスナップショットとして保存する
+    refit=True の場合はクラスタリングモデルを再学習し、同じキーの既存スナップショットを置き換える
+    replace=True の場合は再学習せずに既存スナップショットを置き換える（モデルを別途学習した後など）
+    """
+    from .analytics import build_dashboard_data
+
+    started = time.perf_counter()
+    with timed('build_dashboard_data'):
+        data = build_dashboard_data(refit=refit)
+    if refit or replace:
+        DashboardSnapshot.objects.filter(data_key=data_key).delete()
+        _decoded.pop(data_key, None)
+    save_snapshot(data_key, data, build_seconds=time.perf_counter() - started)
+    return data
+
+
+def get_or_build_snapshot_data(data_key):
+    """
+    同期モード用: スナップショットを取得し、なければその場で計算する
+    戻り値は (結果, 計算中かどうか)。計算は1プロセスだけが行い（single-flight）、
+    他のプロセスが計算中の場合は直近のスナップショット（古い結果）を返す
+    """
+    data = get_snapshot_data(data_key)
+    if data is not None:
+        return data, False
+
+    with cache_lock(f"snapshot:{data_key}") as acquired:
+        if acquired:
+            # ロックを待つ間に他のプロセスが保存した場合はそれを使う
+            data = get_snapshot_data(data_key)
+            if data is None:
+                data = build_snapshot(data_key)
+            return data, False
+
+    data = get_latest_snapshot_data()
+    if data is not None:
+        return data, True
+    # 初回で古い結果もない場合は計算が終わるのを待つ
+    data = wait_for(lambda: get_snapshot_data(data_key))
+    if data is None:
+        data = build_snapshot(data_key)
+    return data, False
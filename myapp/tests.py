@@ -1,3 +1,488 @@
-from django.test import TestCase
+import io
+import json
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from . import caching, jobs, versioning
+from .aggregates import get_engagement_stats, rebuild_aggregates
+from .import_jobs import claim_next_import_job, enqueue_import, run_import_job
+from .importers import MODE_APPEND, MODE_UPSERT, import_comments
+from .json_stream import iter_json_items
+from .models import AnalysisJob, DashboardSnapshot, DataVersion, EngagementAggregate, ImportJob, YouTubeComment
+from .pagination import CURSOR_LAST, KeysetPaginator
+from .versioning import bump_data_version, get_data_version, suspend_version_signals
+
+
+def _comment(owner, video_id, comment_id, like_count, reply_count=0, engagement_score=0.0):
+    return YouTubeComment.objects.create(
+        owner=owner,
+        video_id=video_id,
+        comment_id=comment_id,
+        comment_text=f"comment {comment_id}",
+        author="author",
+        like_count=like_count,
+        reply_count=reply_count,
+        engagement_score=engagement_score,
+        created_at=datetime(2024, 1, 1),
+    )
+
+
+def _import_row(video_id, comment_id, like_count, reply_count=0):
+    return {
+        'video_id': video_id,
+        'comment_id': comment_id,
+        'comment_text': f"imported {comment_id}",
+        'author': 'importer',
+        'like_count': str(like_count),
+        'reply_count': str(reply_count),
+        'engagement_score': str(like_count + reply_count),
+    }
+
+
+class EngagementAggregateTests(TestCase):
+    """差分で更新した集計テーブルが、コメントテーブルから作り直した結果と一致すること"""
+
+    def setUp(self):
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+
+    def snapshot(self):
+        """スコープごとの統計（最大値が古い場合は再計算される）。コメントのないスコープは除く"""
+        stats = {}
+        for scope in EngagementAggregate.objects.values_list('scope', flat=True):
+            values = get_engagement_stats(scope=scope)
+            if values is not None:
+                stats[scope] = values
+        return stats
+
+    def assertMatchesRebuild(self, owner_ids=None):
+        maintained = self.snapshot()
+        rebuild_aggregates(owner_ids)
+        rebuilt = self.snapshot()
+        self.assertEqual(sorted(maintained), sorted(rebuilt))
+        for scope, expected in rebuilt.items():
+            for field, value in expected.items():
+                self.assertAlmostEqual(maintained[scope][field], value, places=6, msg=f"{scope} {field}")
+
+    def apply_changes(self):
+        # 保存（シグナル）
+        top = _comment(self.alice, 'v1', 'a1', 50, 5, 1.5)
+        _comment(self.alice, 'v1', 'a2', 10, 1, 0.5)
+        _comment(self.alice, 'v2', 'a3', 7, 7, 2.0)
+        _comment(self.alice, 'v2', 'a5', 1, 0, 0.0)
+        _comment(self.bob, 'v1', 'b1', 3, 0, 0.1)
+        anonymous = _comment(None, 'v9', 'n1', 20, 2, 1.0)
+        # 更新: 最大値を下げる・上げる
+        top.like_count = 4
+        top.save()
+        anonymous.reply_count = 30
+        anonymous.save()
+        # 削除: 動画の最大値のコメント（同じ動画のコメントは残る）
+        YouTubeComment.objects.get(comment_id='a3').delete()
+        # upsert: 既存の更新（最大値を下げる）・変更なし・新規追加
+        import_comments([
+            _import_row('v1', 'a2', 9, 0),
+            _import_row('v1', 'a1', 4, 5),
+            _import_row('v3', 'a4', 1, 0),
+        ], owner=self.alice, mode=MODE_UPSERT)
+        # append: キーが重複する行は無視される
+        import_comments([
+            _import_row('v1', 'b1', 500, 0),
+            _import_row('v1', 'b2', 8, 2),
+        ], owner=self.bob, mode=MODE_APPEND)
+
+    def test_changes_match_full_rebuild(self):
+        self.apply_changes()
+        self.assertMatchesRebuild()
+
+    def test_changes_match_owner_rebuild(self):
+        self.apply_changes()
+        self.assertMatchesRebuild([self.alice.pk, None])
+
+    def test_partial_rebuild_recomputes_global_row(self):
+        self.apply_changes()
+        rebuild_aggregates([self.bob.pk])
+        self.assertMatchesRebuild()
+        self.assertEqual(get_engagement_stats()['total_comments'], YouTubeComment.objects.count())
+
+    def test_deleting_every_comment_of_a_scope(self):
+        only = _comment(self.bob, 'v5', 'b9', 12, 3)
+        only.delete()
+        self.assertIsNone(get_engagement_stats(owner_id=self.bob.pk))
+        self.assertIsNone(get_engagement_stats())
+        self.assertMatchesRebuild()
+
+
+class JsonStreamTests(SimpleTestCase):
+    """iter_json_items が、読み込み単位に関係なく json.load と同じ要素を返すこと"""
+
+    ITEMS = [
+        {'video_id': 'v1', 'comment_id': 'c1', 'comment_text': 'こんにちは、"世界" [1] {2}', 'like_count': 12},
+        {'video_id': 'v1', 'comment_id': 'c2', 'comment_text': 'escape \\ \n \u00e9', 'like_count': 1e+5},
+        {'video_id': 'v2', 'comment_id': 'c3', 'comment_text': '', 'engagement_score': -0.25, 'ai_reply': None},
+        {'nested': {'list': [1, 2.5, [3, {'a': True}]], 'flag': False}, 'like_count': 1234567890},
+    ]
+    READ_SIZES = (1, 2, 3, 5, 7, 16, 64 * 1024)
+
+    def parse(self, text, read_size):
+        return list(iter_json_items(io.StringIO(text), read_size=read_size))
+
+    def assertParses(self, text, expected):
+        for read_size in self.READ_SIZES:
+            with self.subTest(read_size=read_size):
+                self.assertEqual(self.parse(text, read_size), expected)
+
+    def test_array(self):
+        text = json.dumps(self.ITEMS, ensure_ascii=False, indent=2)
+        self.assertParses(text, json.loads(text))
+
+    def test_compact_array(self):
+        text = json.dumps(self.ITEMS, separators=(',', ':'))
+        self.assertParses(text, json.loads(text))
+
+    def test_comments_object(self):
+        text = json.dumps({'meta': {'comments': 'not a list'}, 'comments': self.ITEMS, 'total': 4}, ensure_ascii=False)
+        self.assertParses(text, json.loads(text)['comments'])
+
+    def test_json_lines(self):
+        text = '\n'.join(json.dumps(item, ensure_ascii=False) for item in self.ITEMS) + '\n'
+        self.assertParses(text, [json.loads(line) for line in text.splitlines()])
+
+    def test_empty_array(self):
+        self.assertParses(' [ ] ', [])
+
+    def test_invalid_json(self):
+        for text in ('[{"a": 1},', '[{"a": 1}] x', '{"comments": [1, 2'):
+            for read_size in (1, 4, 64 * 1024):
+                with self.subTest(text=text, read_size=read_size):
+                    with self.assertRaises(ValueError):
+                        self.parse(text, read_size)
+
+
+class KeysetPaginationTests(TestCase):
+    """created_at が NULL の行や同じ日時の行を含めて、全ページを辿ると全行が1回ずつ現れること"""
+
+    @classmethod
+    def setUpTestData(cls):
+        base = datetime(2024, 1, 1, 12, 0)
+        created = [
+            base, None, base + timedelta(hours=1), base, None, base - timedelta(days=3),
+            base + timedelta(hours=1), None, base, base - timedelta(days=3), None, base + timedelta(days=1), None,
+        ]
+        for i, created_at in enumerate(created):
+            YouTubeComment.objects.create(
+                video_id='v1', comment_id=f'c{i}', comment_text=f'comment {i}', author='author', created_at=created_at,
+            )
+        # 並び順: created_at の降順（NULLは最後）、同じ日時は id の降順
+        rows = list(YouTubeComment.objects.values_list('id', 'created_at'))
+        rows.sort(key=lambda row: row[0], reverse=True)
+        rows.sort(key=lambda row: (row[1] is None, -(row[1].timestamp() if row[1] else 0)))
+        cls.expected = [pk for pk, _ in rows]
+
+    def walk_forward(self, per_page):
+        paginator = KeysetPaginator(YouTubeComment.objects.all(), per_page)
+        ids = []
+        cursor = None
+        for _ in range(len(self.expected) + 1):
+            page = paginator.page(cursor)
+            ids.extend(comment.pk for comment in page)
+            cursor = page.next_cursor
+            if cursor is None:
+                return ids
+        self.fail("pagination did not terminate")
+
+    def walk_backward(self, per_page):
+        paginator = KeysetPaginator(YouTubeComment.objects.all(), per_page)
+        pages = []
+        cursor = CURSOR_LAST
+        for _ in range(len(self.expected) + 1):
+            page = paginator.page(cursor)
+            pages.insert(0, [comment.pk for comment in page])
+            cursor = page.previous_cursor
+            if cursor is None:
+                return [pk for ids in pages for pk in ids]
+        self.fail("pagination did not terminate")
+
+    def test_forward_visits_every_row_once(self):
+        for per_page in (1, 2, 3, 4, 5, 50):
+            with self.subTest(per_page=per_page):
+                self.assertEqual(self.walk_forward(per_page), self.expected)
+
+    def test_backward_visits_every_row_once(self):
+        for per_page in (1, 2, 3, 4, 5, 50):
+            with self.subTest(per_page=per_page):
+                self.assertEqual(self.walk_backward(per_page), self.expected)
+
+    def test_previous_page_after_null_rows(self):
+        paginator = KeysetPaginator(YouTubeComment.objects.all(), 4)
+        first = paginator.page()
+        second = paginator.page(first.next_cursor)
+        third = paginator.page(second.next_cursor)
+        self.assertEqual([c.pk for c in paginator.page(third.previous_cursor)], [c.pk for c in second])
+        self.assertEqual([c.pk for c in paginator.page(second.previous_cursor)], [c.pk for c in first])
+
+
+def _locmem_caches(timeout):
+    return {'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'myapp-tests',
+        'TIMEOUT': timeout,
+    }}
+
+
+@override_settings(CACHES=_locmem_caches(300))
+class GetOrComputeTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_computes_once_and_caches(self):
+        compute = mock.Mock(return_value=42)
+        self.assertEqual(caching.get_or_compute('answer', compute), 42)
+        self.assertEqual(caching.get_or_compute('answer', compute), 42)
+        compute.assert_called_once()
+
+    def test_uses_value_stored_while_acquiring_lock(self):
+        original_lock = caching.cache_lock
+
+        @contextmanager
+        def lock_after_other_process(name, timeout=None):
+            # ロックを取る直前に他のプロセスが計算を終えて保存した
+            caching._store('answer', 'other', 60, 60)
+            with original_lock(name, timeout) as acquired:
+                yield acquired
+
+        compute = mock.Mock(return_value='mine')
+        with mock.patch.object(caching, 'cache_lock', lock_after_other_process):
+            self.assertEqual(caching.get_or_compute('answer', compute), 'other')
+        compute.assert_not_called()
+
+    def test_stale_value_refreshed_by_other_process(self):
+        cache.set('answer', (0, 'stale'), 60)
+        original_lock = caching.cache_lock
+
+        @contextmanager
+        def lock_after_other_process(name, timeout=None):
+            caching._store('answer', 'fresh', 60, 60)
+            with original_lock(name, timeout) as acquired:
+                yield acquired
+
+        compute = mock.Mock(return_value='mine')
+        with mock.patch.object(caching, 'cache_lock', lock_after_other_process):
+            self.assertEqual(caching.get_or_compute('answer', compute), 'fresh')
+        compute.assert_not_called()
+
+    def test_stale_value_is_recomputed(self):
+        cache.set('answer', (0, 'stale'), 60)
+        self.assertEqual(caching.get_or_compute('answer', lambda: 'fresh'), 'fresh')
+
+    @override_settings(CACHES=_locmem_caches(None))
+    def test_cache_without_timeout(self):
+        cache.clear()
+        compute = mock.Mock(return_value=7)
+        self.assertEqual(caching.get_or_compute('answer', compute), 7)
+        self.assertEqual(caching.get_or_compute('answer', compute), 7)
+        compute.assert_called_once()
+
+    def test_explicit_no_timeout_never_goes_stale(self):
+        compute = mock.Mock(return_value=7)
+        caching.get_or_compute('answer', compute, timeout=None)
+        with mock.patch.object(caching.time, 'time', return_value=10 ** 12):
+            self.assertEqual(caching.get_or_compute('answer', compute, timeout=None), 7)
+        compute.assert_called_once()
+
+
+class AnalysisJobTests(TestCase):
+    """同じデータキーの分析ジョブが重複して登録・実行されないこと"""
+
+    def test_enqueue_returns_pending_job(self):
+        first = jobs.enqueue_analysis('key-1')
+        self.assertEqual(jobs.enqueue_analysis('key-1'), first)
+        self.assertEqual(AnalysisJob.objects.count(), 1)
+
+    def test_enqueue_race_returns_job_created_concurrently(self):
+        other = AnalysisJob.objects.create(data_key='key-1')
+        real_get_pending_job = jobs._get_pending_job
+        # 最初の確認の時点では、他のリクエストのジョブはまだ保存されていなかった
+        with mock.patch.object(jobs, '_get_pending_job', side_effect=[None, real_get_pending_job('key-1')]):
+            self.assertEqual(jobs.enqueue_analysis('key-1'), other)
+        self.assertEqual(AnalysisJob.objects.count(), 1)
+
+    def test_run_job_skips_existing_snapshot(self):
+        DashboardSnapshot.objects.create(data_key='key-1', payload=b'')
+        job = jobs.enqueue_analysis('key-1')
+        with mock.patch.object(jobs, 'build_snapshot') as build_snapshot:
+            jobs.run_job(job)
+        build_snapshot.assert_not_called()
+        job.refresh_from_db()
+        self.assertEqual(job.status, AnalysisJob.STATUS_DONE)
+
+
+class ImportJobTests(TestCase):
+    """リクエスト内で処理するインポートジョブをワーカーが取得しないこと"""
+
+    def setUp(self):
+        spool_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(spool_dir.cleanup)
+        spool_settings = override_settings(IMPORT_SPOOL_DIR=spool_dir.name)
+        spool_settings.enable()
+        self.addCleanup(spool_settings.disable)
+
+    def upload(self):
+        return SimpleUploadedFile('comments.csv', b'video_id,comment_id,comment_text\nv1,c1,hello\n')
+
+    def test_inline_job_is_not_claimed_by_worker(self):
+        job = enqueue_import(self.upload(), ImportJob.FORMAT_CSV, run_inline=True)
+        self.assertEqual(job.status, ImportJob.STATUS_RUNNING)
+        self.assertIsNone(claim_next_import_job())
+        job = run_import_job(job)
+        self.assertEqual(job.status, ImportJob.STATUS_DONE)
+        self.assertEqual(YouTubeComment.objects.count(), 1)
+
+    def test_queued_job_is_claimed_by_worker(self):
+        job = enqueue_import(self.upload(), ImportJob.FORMAT_CSV)
+        self.assertEqual(job.status, ImportJob.STATUS_QUEUED)
+        self.assertEqual(claim_next_import_job(), job)
+
+
+class ClusterTermWeightTests(SimpleTestCase):
+    """クラスタごとのTF-IDFキーワードが、クラスタのコメントを連結して変換した場合と同じ順位になること"""
+
+    COMMENTS = [
+        'great video great editing',
+        'the editing was great and the music was great too, thanks for the upload',
+        'great music',
+        'loved the music and the editing',
+        'too long video, the intro is too long',
+        'long intro',
+        'the intro music is too loud and the video is too long for me honestly',
+        'skip the intro',
+        'thanks for the tutorial, the tutorial helped a lot',
+        'tutorial please',
+        'helpful tutorial thanks',
+    ]
+    LABELS = [0, 0, 0, 0, 1, 1, 1, 1, 2, 2, 2]
+
+    def test_matches_joined_cluster_transform(self):
+        import numpy as np
+
+        from .analytics import cluster_term_weights, top_term_indices
+        from .clustering import make_vectorizer
+
+        vectorizer = make_vectorizer().fit(self.COMMENTS)
+        weights = cluster_term_weights(self.COMMENTS, self.LABELS, vectorizer, 3)
+        for cluster in range(3):
+            joined = ' '.join(c for c, label in zip(self.COMMENTS, self.LABELS) if label == cluster)
+            expected = vectorizer.transform([joined]).toarray()[0]
+            # このデータでは、連結で生じるコメント境界のバイグラムは語彙に含まれない
+            expected_top = top_term_indices(expected, 15)
+            with self.subTest(cluster=cluster):
+                self.assertEqual(top_term_indices(weights[cluster], 15).tolist(), expected_top.tolist())
+                self.assertTrue(np.allclose(
+                    weights[cluster] / np.linalg.norm(weights[cluster]), expected, atol=1e-5,
+                ))
+
+
+class VectorIndexSyncTests(TestCase):
+    """他のワーカーによる変更を、インデックスを作り直さずに差分で反映できること"""
+
+    def setUp(self):
+        from . import vector_index
+        self.vector_index = vector_index
+        vector_index.clear_vector_indexes()
+        self.addCleanup(vector_index.clear_vector_indexes)
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+        for i in range(6):
+            self.comment(self.alice, f'a{i}', [1.0, float(i), 0.0])
+
+    def comment(self, owner, comment_id, vector):
+        from .embeddings import encode_embedding
+        embedding, dim = encode_embedding(vector)
+        return YouTubeComment.objects.create(
+            owner=owner, video_id='v1', comment_id=comment_id, comment_text=comment_id, author='author',
+            embedding=embedding, embedding_dim=dim,
+        )
+
+    def assertMatchesRebuild(self, index):
+        import numpy as np
+
+        rebuilt = self.vector_index.build_index(self.alice.pk)
+        self.assertEqual(index.ids(), rebuilt.ids())
+        for pk in rebuilt.ids():
+            self.assertTrue(np.allclose(index.vector(pk), rebuilt.vector(pk)))
+
+    def test_changes_from_other_worker_are_applied_without_rebuild(self):
+        from .embeddings import encode_embedding
+        index = self.vector_index.get_index(self.alice.pk)
+        # 他のワーカーでの変更（このプロセスのシグナルでは反映されない）
+        with suspend_version_signals():
+            new = self.comment(self.alice, 'a9', [0.0, 0.0, 1.0])
+            edited = YouTubeComment.objects.get(comment_id='a1')
+            edited.embedding, edited.embedding_dim = encode_embedding([0.0, 1.0, 1.0])
+            edited.save()
+            moved = YouTubeComment.objects.get(comment_id='a2')
+            moved.owner = self.bob
+            moved.save(update_fields=['owner'])
+            YouTubeComment.objects.filter(comment_id='a3').delete()
+            YouTubeComment.objects.bulk_create([
+                YouTubeComment(
+                    owner=self.alice, video_id='v2', comment_id='b1', comment_text='b1', author='author',
+                    embedding=encode_embedding([1.0, 1.0, 1.0])[0], embedding_dim=3,
+                ),
+            ])
+        bump_data_version([self.alice.pk, self.bob.pk])
+
+        with mock.patch.object(self.vector_index, 'build_index') as build_index:
+            synced = self.vector_index.get_index(self.alice.pk)
+        build_index.assert_not_called()
+        self.assertIs(synced, index)
+        self.assertIn(new.pk, index)
+        self.assertNotIn(moved.pk, index)
+        self.assertMatchesRebuild(index)
+
+    def test_late_commit_within_overlap_is_applied(self):
+        index = self.vector_index.get_index(self.alice.pk)
+        # 先に保存されたがコミットが遅れた行（更新日時が前回の最新より古い）
+        with suspend_version_signals():
+            late = self.comment(self.alice, 'late', [0.0, 0.0, 1.0])
+            YouTubeComment.objects.filter(pk=late.pk).update(
+                updated_at=YouTubeComment.objects.exclude(pk=late.pk).order_by('-updated_at')[0].updated_at - timedelta(seconds=5),
+            )
+        bump_data_version([self.alice.pk])
+        self.vector_index.get_index(self.alice.pk)
+        self.assertIn(late.pk, index)
+        self.assertMatchesRebuild(index)
+
+
+class DataVersionTests(TestCase):
+
+    def test_concurrent_first_bump_is_not_lost(self):
+        real_get_or_create = DataVersion.objects.get_or_create
+
+        def created_by_other_transaction(scope, defaults):
+            # 存在確認の後、別のトランザクションが同じスコープを作成してコミットした
+            DataVersion.objects.create(scope=scope, version=1)
+            return real_get_or_create(scope=scope, defaults=defaults)
+
+        with mock.patch.object(versioning.DataVersion.objects, 'get_or_create', created_by_other_transaction):
+            bump_data_version([7])
+        self.assertEqual(get_data_version(7), 2)
+        self.assertEqual(get_data_version(), 2)
+
+    def test_owner_change_bumps_previous_owner(self):
+        alice = User.objects.create_user('alice')
+        bob = User.objects.create_user('bob')
+        comment = _comment(alice, 'v1', 'c1', 1)
+        alice_version, bob_version = get_data_version(alice.pk), get_data_version(bob.pk)
+        comment.owner = bob
+        comment.save()
+        self.assertEqual(get_data_version(alice.pk), alice_version + 1)
+        self.assertEqual(get_data_version(bob.pk), bob_version + 1)
@@ -0,0 +1,172 @@
+"""
+Japanese word extraction for cluster keyword analysis.
+
+Loading the Janome dictionary is the expensive part of tokenization, so a
+single Tokenizer is built lazily and shared by the whole process. Extracted
+words are memoized per comment, keyed on a hash of the text: an in-memory LRU
+(settings.TOKEN_CACHE_SIZE entries) and, when settings.TOKEN_CACHE_PERSIST is
+on, the TokenCache table so that unchanged comments are never tokenized again
+across restarts and worker processes.
+"""
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+
+from .models import TokenCache
+
+try:
+    from janome.tokenizer import Tokenizer
+    JANOME_AVAILABLE = True
+except ImportError:
+    JANOME_AVAILABLE = False
+
+# Bump when the extraction rules change so stale cached words are not reused
+TOKEN_CACHE_VERSION = 1
+DEFAULT_TOKEN_CACHE_SIZE = 10000
+# Hashes per TokenCache lookup query
+PERSIST_LOOKUP_BATCH = 500
+
+STOP_WORDS = {'の', 'に', 'は', 'を', 'が', 'で', 'と', 'も', 'か', 'な', 'だ', 'です', 'ます', 'ました', 'て', 'た', 'する', 'した', 'ある', 'いる', 'なる', 'れる', 'られる', 'でした'}
+STOP_POS = ('助詞', '助動詞', '記号')
+FALLBACK_STOP_WORDS = {'の', 'に', 'は', 'を', 'が', 'で', 'と', 'も', 'か', 'な', 'だ', 'です', 'ます', 'ました', 'て', 'た', 'する', 'した', 'ある', 'いる', 'なる', 'れる', 'られる'}
+
+# {text hash: tuple of words}, most recently used last
+_words_cache = OrderedDict()
+_words_cache_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def get_tokenizer():
+    """Process-wide Janome tokenizer (the dictionary is loaded on first use)."""
+    return Tokenizer()
+
+
+def text_hash(text):
+    return hashlib.sha1(f"{TOKEN_CACHE_VERSION}:{text}".encode('utf-8')).hexdigest()
+
+
+def _tokenize(text):
+    """Extract meaningful Japanese words using morphological analysis."""
+    # Remove URLs, mentions, and clean text
+    text = re.sub(r'http[s]?://\S+', '', text)
+    text = re.sub(r'@\w+', '', text)
+
+    words = []
+
+    if JANOME_AVAILABLE:
+        try:
+            for token in get_tokenizer().tokenize(text):
+                surface = token.surface
+                pos = token.part_of_speech.split(',')[0]
+
+                # Skip stop words and stop parts of speech
+                if surface not in STOP_WORDS and pos not in STOP_POS:
+                    # Keep nouns, verbs, adjectives, and meaningful words
+                    if pos in ['名詞', '動詞', '形容詞'] or len(surface) >= 2:
+                        if len(surface) >= 2 and len(surface) <= 10:
+                            words.append(surface)
+        except Exception:
+            # Fallback to simple extraction if tokenization fails
+            pass
+
+    # Fallback: simple character-based extraction
+    if not words:
+        japanese_pattern = r'[\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FAF\w]+'
+        phrases = re.findall(japanese_pattern, text)
+        words = [p for p in phrases if 2 <= len(p) <= 10 and p not in FALLBACK_STOP_WORDS]
+
+    return words
+
+
+def _cache_get(key):
+    with _words_cache_lock:
+        words = _words_cache.get(key)
+        if words is not None:
+            _words_cache.move_to_end(key)
+        return words
+
+
+def _cache_put(key, words):
+    max_size = getattr(settings, 'TOKEN_CACHE_SIZE', DEFAULT_TOKEN_CACHE_SIZE)
+    with _words_cache_lock:
+        _words_cache[key] = words
+        _words_cache.move_to_end(key)
+        while len(_words_cache) > max_size:
+            _words_cache.popitem(last=False)
+
+
+def _persist_enabled():
+    return getattr(settings, 'TOKEN_CACHE_PERSIST', False)
+
+
+def _load_persisted(keys):
+    """Fetch stored words for the given hashes. Returns {hash: tuple of words}."""
+    found = {}
+    keys = list(keys)
+    for start in range(0, len(keys), PERSIST_LOOKUP_BATCH):
+        rows = TokenCache.objects.filter(
+            text_hash__in=keys[start:start + PERSIST_LOOKUP_BATCH]
+        ).values_list('text_hash', 'words')
+        for key, words in rows:
+            found[key] = tuple(json.loads(words))
+    return found
+
+
+def extract_words_bulk(texts):
+    """
+    Extract words for many comments at once. Returns a list of word lists in
+    the order of texts. Only comments missing from both caches are tokenized,
+    and the persisted cache is read and written with one query per batch.
+    """
+    keys = [text_hash(text) if text else None for text in texts]
+    results = {}
+    missing = set()
+    for key in keys:
+        if key is None or key in results:
+            continue
+        words = _cache_get(key)
+        if words is None:
+            missing.add(key)
+        else:
+            results[key] = words
+
+    if missing and _persist_enabled():
+        stored = _load_persisted(missing)
+        for key, words in stored.items():
+            _cache_put(key, words)
+        results.update(stored)
+        missing -= stored.keys()
+
+    if missing:
+        new_rows = []
+        for key, text in zip(keys, texts):
+            if key not in missing:
+                continue
+            words = tuple(_tokenize(text))
+            results[key] = words
+            _cache_put(key, words)
+            missing.discard(key)
+            if _persist_enabled():
+                new_rows.append(TokenCache(text_hash=key, words=json.dumps(words, ensure_ascii=False)))
+        if new_rows:
+            TokenCache.objects.bulk_create(new_rows, batch_size=PERSIST_LOOKUP_BATCH, ignore_conflicts=True)
+
+    return [list(results[key]) if key is not None else [] for key in keys]
+
+
+def extract_japanese_words(text):
+    """Extract meaningful Japanese words from one comment (cached)."""
+    if not text:
+        return []
+    return extract_words_bulk([text])[0]
+
+
+def clear_token_cache():
+    """Drop the in-memory cache (the persisted table is left untouched)."""
+    with _words_cache_lock:
+        _words_cache.clear()
@@ -5,9 +5,15 @@ urlpatterns = [
     path("", views.index, name="index"),
     path("pricing/", views.pricing, name="pricing"),
     path("comments-table/", views.comments_table, name="comments_table"),
+    # 分析結果のデータAPI（graph / stats / clusters、ETag / Last-Modified 対応）
+    path("api/dashboard/<slug:section>/", views.dashboard_section, name="dashboard_section"),
     # CSV/JSONインポート
     path("import-csv/", views.import_csv, name="import_csv"),
     path("import-json/", views.import_json, name="import_json"),
+    path("import-jobs/<int:pk>/", views.import_job_status, name="import_job_status"),
+    path("import-jobs/<int:pk>/errors/", views.import_job_errors, name="import_job_errors"),
+    # リクエストの計測結果（スタッフ用）
+    path("metrics/requests/", views.request_metrics, name="request_metrics"),
     # プラン変更
     path("downgrade-to-free/", views.downgrade_to_free, name="downgrade_to_free"),
     # Stripe決済関連
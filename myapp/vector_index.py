@@ -0,0 +1,364 @@
+"""
+コメントの埋め込みベクトルによる類似検索（プロセス内のインデックス）
+
+ユーザーごとのインデックスを最初の検索時にバイナリの埋め込み列から作成し、メモリ上に保持する
+（最近使った settings.VECTOR_INDEX_MAX_OWNERS 人分）。このプロセスでの保存・削除は
+YouTubeComment のシグナルで差分として反映する。インデックスはユーザーの DataVersion を記録しており、
+反映していない変更（他のワーカー・一括インポート・一括削除）は次の検索時に差分で反映する:
+updated_at がインデックスの基準日時以降の行を読み込み直し、削除は件数を比較して、
+件数が異なる場合のみユーザーのIDの一覧と照合して検出する。
+作り直すのは、インデックスがまだない場合と、全件比較のインデックスが近似検索のしきい値に達した場合のみ。
+
+インデックスごとにロックを持つ: 同じインデックスへの差分の反映と検索は順番に実行し、
+別のユーザーへの検索は並行して実行できる。
+
+件数が少ない場合はNumPyで全件のコサイン類似度を計算する。
+settings.VECTOR_INDEX_ANN_THRESHOLD 件以上ではHNSWインデックス（hnswlib がインストールされている場合）で
+数ミリ秒の近似検索を行う。
+"""
+import logging
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Max
+
+from .embeddings import EMBEDDING_DTYPE, decode_embedding, load_embedding_matrix
+from .models import YouTubeComment
+from .versioning import get_data_version
+
+try:
+    import hnswlib
+    HNSWLIB_AVAILABLE = True
+except ImportError:
+    HNSWLIB_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+BACKEND_AUTO = 'auto'
+BACKEND_EXACT = 'exact'
+BACKEND_HNSW = 'hnsw'
+
+DEFAULT_ANN_THRESHOLD = 100000
+DEFAULT_MAX_OWNERS = 8
+# 反映済みの最新の更新日時からこの秒数だけ遡って再確認する（コミットが遅れたトランザクション・サーバー間の時計のずれ）
+DEFAULT_SYNC_OVERLAP = 60
+SYNC_CHUNK_SIZE = 2000
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=EMBEDDING_DTYPE)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+class ExactIndex:
+    """拡張可能なfloat32のバッファに対する全件のコサイン類似度"""
+
+    backend = BACKEND_EXACT
+
+    def __init__(self, dim, ids, vectors):
+        self.dim = dim
+        # バッファを保護する: remove() は行を移動し、_grow() はバッファを置き換える
+        self.lock = threading.Lock()
+        capacity = max(16, len(ids))
+        self._data = np.empty((capacity, dim), dtype=EMBEDDING_DTYPE)
+        self._ids = np.empty(capacity, dtype=np.int64)
+        self._size = len(ids)
+        self._data[:self._size] = _normalize(vectors)
+        self._ids[:self._size] = ids
+        self._rows = {int(pk): row for row, pk in enumerate(ids)}
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, pk):
+        return pk in self._rows
+
+    def ids(self):
+        return set(self._rows)
+
+    def add(self, pk, vector):
+        row = self._rows.get(pk)
+        if row is None:
+            if self._size == len(self._ids):
+                self._grow()
+            row = self._size
+            self._size += 1
+            self._rows[pk] = row
+            self._ids[row] = pk
+        self._data[row] = _normalize(vector)
+
+    def remove(self, pk):
+        row = self._rows.pop(pk, None)
+        if row is None:
+            return
+        last = self._size - 1
+        if row != last:
+            # 空いた位置に最後の行を移動し、バッファを詰めた状態に保つ
+            self._data[row] = self._data[last]
+            self._ids[row] = self._ids[last]
+            self._rows[int(self._ids[row])] = row
+        self._size = last
+
+    def vector(self, pk):
+        row = self._rows.get(pk)
+        # コピーを返す: 後の remove() で行が上書きされる場合がある
+        return None if row is None else self._data[row].copy()
+
+    def search(self, vector, k, exclude=None):
+        if self._size == 0:
+            return []
+        scores = self._data[:self._size] @ _normalize(vector)
+        if exclude in self._rows:
+            scores[self._rows[exclude]] = -np.inf
+        k = min(k, self._size - (exclude in self._rows))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self._ids[i]), float(scores[i])) for i in top]
+
+    def _grow(self):
+        capacity = len(self._ids) * 2
+        data = np.empty((capacity, self.dim), dtype=EMBEDDING_DTYPE)
+        data[:self._size] = self._data[:self._size]
+        ids = np.empty(capacity, dtype=np.int64)
+        ids[:self._size] = self._ids[:self._size]
+        self._data, self._ids = data, ids
+
+
+class HnswIndex:
+    """hnswlib（HNSWグラフ）による近似コサイン類似度"""
+
+    backend = BACKEND_HNSW
+
+    def __init__(self, dim, ids, vectors):
+        self.dim = dim
+        # hnswlib では検索中にサイズ変更・削除マークを行ってはならない
+        self.lock = threading.Lock()
+        self._index = hnswlib.Index(space='cosine', dim=dim)
+        self._index.init_index(max_elements=max(1024, int(len(ids) * 1.25)), ef_construction=200, M=16)
+        if len(ids):
+            self._index.add_items(vectors, ids)
+        self._ids = {int(pk) for pk in ids}
+        self._deleted = set()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, pk):
+        return pk in self._ids
+
+    def ids(self):
+        return set(self._ids)
+
+    def add(self, pk, vector):
+        if pk in self._deleted:
+            self._index.unmark_deleted(pk)
+            self._deleted.discard(pk)
+        elif pk not in self._ids and self._index.get_current_count() >= self._index.get_max_elements():
+            self._index.resize_index(self._index.get_max_elements() * 2)
+        self._index.add_items(np.asarray(vector, dtype=EMBEDDING_DTYPE)[np.newaxis], [pk])
+        self._ids.add(pk)
+
+    def remove(self, pk):
+        if pk in self._ids:
+            self._index.mark_deleted(pk)
+            self._ids.discard(pk)
+            self._deleted.add(pk)
+
+    def vector(self, pk):
+        if pk not in self._ids:
+            return None
+        return np.asarray(self._index.get_items([pk])[0], dtype=EMBEDDING_DTYPE)
+
+    def search(self, vector, k, exclude=None):
+        n = min(k + (exclude in self._ids), len(self._ids))
+        if n <= 0:
+            return []
+        self._index.set_ef(max(50, n * 2))
+        labels, distances = self._index.knn_query(np.asarray(vector, dtype=EMBEDDING_DTYPE), k=n)
+        results = [(int(pk), 1.0 - float(d)) for pk, d in zip(labels[0], distances[0]) if pk != exclude]
+        return results[:k]
+
+
+def get_backend(n_vectors):
+    backend = getattr(settings, 'VECTOR_INDEX_BACKEND', BACKEND_AUTO)
+    if backend == BACKEND_AUTO:
+        threshold = getattr(settings, 'VECTOR_INDEX_ANN_THRESHOLD', DEFAULT_ANN_THRESHOLD)
+        backend = BACKEND_HNSW if n_vectors >= threshold else BACKEND_EXACT
+    if backend == BACKEND_HNSW and not HNSWLIB_AVAILABLE:
+        logger.warning("hnswlib is not installed; falling back to exact vector search")
+        backend = BACKEND_EXACT
+    return backend
+
+
+def get_sync_overlap():
+    return timedelta(seconds=getattr(settings, 'VECTOR_INDEX_SYNC_OVERLAP', DEFAULT_SYNC_OVERLAP))
+
+
+def _owner_comments(owner_id):
+    return YouTubeComment.objects.filter(owner_id=owner_id)
+
+
+class _Entry:
+    """読み込み済みのインデックスと、反映済みの変更"""
+
+    def __init__(self, index, version, watermark):
+        self.index = index
+        self.version = version
+        # 反映済みの最新の更新日時と、そこから遡る再確認の範囲内で反映済みの行
+        self.watermark = watermark
+        self.recent = {}
+        # 差分の反映を1つずつ実行する（index.lock はインデックスを変更する間のみ保持する）
+        self.lock = threading.Lock()
+
+
+def build_index(owner_id):
+    """ユーザー1人分のインデックスをDBから作成する"""
+    ids, matrix = load_embedding_matrix(_owner_comments(owner_id))
+    if not len(ids):
+        return None
+    index_class = HnswIndex if get_backend(len(ids)) == BACKEND_HNSW else ExactIndex
+    return index_class(matrix.shape[1], ids, matrix)
+
+
+def _build_entry(owner_id, version):
+    # 基準日時を先に読む: 行列の読み込み中に保存された行は次の差分反映で読み込まれる
+    watermark = _owner_comments(owner_id).aggregate(latest=Max('updated_at'))['latest']
+    return _Entry(build_index(owner_id), version, watermark)
+
+
+def _apply_rows(index, rows):
+    """(pk, 埋め込み, 次元数) の行を追加・置き換える（次元数が異なる行は削除する）"""
+    with index.lock:
+        for pk, embedding, dim in rows:
+            if embedding is None or dim != index.dim:
+                index.remove(pk)
+            else:
+                index.add(pk, decode_embedding(embedding))
+
+
+def sync_index(entry, owner_id, version):
+    """
+    基準日時以降のユーザーの変更をインデックスに反映する
+
+    作り直しが必要な場合（インデックスがない、全件比較のインデックスが近似検索のしきい値に達した）は False を返す
+    """
+    index = entry.index
+    if index is None or entry.watermark is None:
+        return False
+    overlap = get_sync_overlap()
+
+    # 保存された行: 範囲内の全行は (id, updated_at) のみ、埋め込みは未反映の行のみ読み込む
+    window = list(
+        _owner_comments(owner_id)
+        .filter(updated_at__gte=entry.watermark - overlap)
+        .values_list('id', 'updated_at')
+    )
+    changed = [pk for pk, updated_at in window if entry.recent.get(pk) != updated_at]
+    for start in range(0, len(changed), SYNC_CHUNK_SIZE):
+        chunk = changed[start:start + SYNC_CHUNK_SIZE]
+        rows = {
+            pk: (pk, embedding, dim)
+            for pk, embedding, dim in _owner_comments(owner_id)
+            .filter(id__in=chunk)
+            .values_list('id', 'embedding', 'embedding_dim')
+        }
+        # 2つのクエリの間に他のユーザーに移った行は、削除と同じく取り除く
+        _apply_rows(index, [rows.get(pk, (pk, None, None)) for pk in chunk])
+
+    if window:
+        entry.watermark = max(entry.watermark, max(updated_at for _, updated_at in window))
+    cutoff = entry.watermark - overlap
+    entry.recent = {pk: updated_at for pk, updated_at in window if updated_at >= cutoff}
+
+    # 削除された行・他のユーザーに移った行: 件数が異なる場合のみIDの一覧を読み込む
+    current = _owner_comments(owner_id).filter(embedding__isnull=False, embedding_dim=index.dim)
+    if current.count() != len(index):
+        removed = index.ids() - set(current.values_list('id', flat=True))
+        with index.lock:
+            for pk in removed:
+                index.remove(pk)
+
+    if index.backend == BACKEND_EXACT and get_backend(len(index)) == BACKEND_HNSW:
+        return False
+    entry.version = version
+    return True
+
+
+def get_index(owner_id):
+    """
+    ユーザーのインデックスを返す（埋め込みがない場合はNone）
+    インデックスがなければ作成し、データバージョンが変わっていれば変更を差分で反映する
+    """
+    version = get_data_version(owner_id)
+    with _indexes_lock:
+        entry = _indexes.get(owner_id)
+        if entry is not None:
+            _indexes.move_to_end(owner_id)
+    if entry is not None and entry.version != version:
+        with entry.lock:
+            if entry.version != version and not sync_index(entry, owner_id, version):
+                entry = None
+    if entry is not None:
+        return entry.index
+
+    entry = _build_entry(owner_id, version)
+    with _indexes_lock:
+        _indexes[owner_id] = entry
+        _indexes.move_to_end(owner_id)
+        while len(_indexes) > getattr(settings, 'VECTOR_INDEX_MAX_OWNERS', DEFAULT_MAX_OWNERS):
+            _indexes.popitem(last=False)
+    return entry.index
+
+
+def update_index(owner_id, pk, embedding=None, deleted=False):
+    """
+    保存・削除されたコメントを読み込み済みのインデックスに反映する（データバージョンの更新のコミット後に実行）
+    反映していない変更がこの1件のみの場合に最新とみなす。それ以外の場合は次の検索時に差分を反映する
+    """
+    with _indexes_lock:
+        entry = _indexes.get(owner_id)
+    if entry is None or entry.index is None:
+        return
+    version = get_data_version(owner_id)
+    index = entry.index
+    vector = None if deleted else decode_embedding(embedding)
+    with entry.lock:
+        with index.lock:
+            if vector is None or len(vector) != index.dim:
+                index.remove(pk)
+            else:
+                index.add(pk, vector)
+        if version == entry.version + 1:
+            entry.version = version
+
+
+def similar_comments(comment, k=10):
+    """
+    同じユーザーのコメントのうち、comment に最も似ている上位k件
+    (YouTubeComment, コサイン類似度) のリストを返す
+    """
+    index = get_index(comment.owner_id)
+    if index is None:
+        return []
+    with index.lock:
+        vector = index.vector(comment.pk)
+        if vector is None:
+            return []
+        hits = index.search(vector, k, exclude=comment.pk)
+    comments = YouTubeComment.objects.filter(owner_id=comment.owner_id).in_bulk([pk for pk, _ in hits])
+    return [(comments[pk], score) for pk, score in hits if pk in comments]
+
+
+def clear_vector_indexes():
+    with _indexes_lock:
+        _indexes.clear()
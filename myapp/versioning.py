@@ -0,0 +1,74 @@
+"""
+コメントデータのバージョン管理
+
+YouTubeCommentが変更されるたびに DataVersion のカウンタを増やし、
+キャッシュキーやスナップショットのキーとして利用する。
+count() や Max() で全件を走査せずに、インデックス付きの1行を読むだけでデータの更新を判定できる。
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db.models import F
+from django.db.models.functions import Now
+
+from .models import DataVersion
+
+GLOBAL_SCOPE = 'global'
+
+_state = threading.local()
+
+
+def owner_scope(owner_id):
+    """ユーザー別のスコープ名（ownerなしのコメントは 'owner:none'）"""
+    return f"owner:{owner_id if owner_id is not None else 'none'}"
+
+
+def bump_data_version(owner_ids=()):
+    """全体と指定ユーザーのバージョンを1つ進める"""
+    scopes = [GLOBAL_SCOPE] + sorted({owner_scope(owner_id) for owner_id in owner_ids})
+    updated = DataVersion.objects.filter(scope__in=scopes).update(
+        version=F('version') + 1,
+        updated_at=Now(),
+    )
+    if updated < len(scopes):
+        existing = set(DataVersion.objects.filter(scope__in=scopes).values_list('scope', flat=True))
+        for scope in scopes:
+            if scope not in existing:
+                _, created = DataVersion.objects.get_or_create(scope=scope, defaults={'version': 1})
+                if not created:
+                    # 同時に別のトランザクションが作成していた場合は、こちらの更新分も進める
+                    DataVersion.objects.filter(scope=scope).update(version=F('version') + 1, updated_at=Now())
+
+
+def get_data_version(owner_id=None, scope=None):
+    """バージョンを取得する（owner_idを省略すると全体のバージョン）"""
+    if scope is None:
+        scope = GLOBAL_SCOPE if owner_id is None else owner_scope(owner_id)
+    version = DataVersion.objects.filter(scope=scope).values_list('version', flat=True).first()
+    return version or 0
+
+
+def get_data_version_info(owner_id=None):
+    """(バージョン, 更新日時) を取得する"""
+    scope = GLOBAL_SCOPE if owner_id is None else owner_scope(owner_id)
+    row = DataVersion.objects.filter(scope=scope).values_list('version', 'updated_at').first()
+    return row or (0, None)
+
+
+def signals_suspended():
+    return getattr(_state, 'suspended', False)
+
+
+@contextmanager
+def suspend_version_signals():
+    """
+    シグナルによるバージョン・集計テーブル・類似検索インデックスの更新を一時停止する
+    大量削除などでは1件ごとに更新せず、処理後に bump_data_version と
+    集計テーブルの更新（myapp.aggregates）をまとめて1回だけ行う
+    """
+    previous = signals_suspended()
+    _state.suspended = True
+    try:
+        yield
+    finally:
+        _state.suspended = previous
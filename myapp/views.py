@@ -1,252 +1,33 @@
-from django.shortcuts import render, redirect
-from django.http import JsonResponse, HttpResponse
-from django.core.paginator import Paginator
+from django.shortcuts import get_object_or_404, render, redirect
+from django.http import FileResponse, Http404, JsonResponse, HttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import add_never_cache_headers, get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.cache import never_cache
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.contrib import messages
-from django.core.cache import cache
-from django.db.models import Max, Count
-from .models import YouTubeComment, Plan, UserPlan
-import json
-import pandas as pd
-import csv
-from io import TextIOWrapper
-from datetime import datetime
-import numpy as np
-import re
-from collections import Counter
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.decomposition import PCA
-from sklearn.cluster import KMeans
-try:
-    from janome.tokenizer import Tokenizer
-    JANOME_AVAILABLE = True
-except ImportError:
-    JANOME_AVAILABLE = False
-
-
-def clean_text(text):
-    """Basic text cleaning: URLs, mentions, excessive symbols."""
-    if pd.isna(text):
-        return ""
-    
-    text = str(text)
-    # Remove URLs
-    text = re.sub(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', '', text)
-    # Remove mentions (e.g., @username)
-    text = re.sub(r'@\w+', '', text)
-    # Remove excessive whitespace
-    text = re.sub(r'\s+', ' ', text)
-    # Remove excessive symbols (keep basic punctuation)
-    text = re.sub(r'[^\w\s.,!?;:()\-]', '', text)
-    return text.strip()
-
-
-def extract_japanese_words(text):
-    """Extract meaningful Japanese words using morphological analysis."""
-    if not text:
-        return []
-    
-    # Remove URLs, mentions, and clean text
-    text = re.sub(r'http[s]?://\S+', '', text)
-    text = re.sub(r'@\w+', '', text)
-    
-    words = []
-    
-    if JANOME_AVAILABLE:
-        try:
-            tokenizer = Tokenizer()
-            tokens = tokenizer.tokenize(text)
-            
-            # Filter stop words and extract meaningful words
-            stop_words = {'の', 'に', 'は', 'を', 'が', 'で', 'と', 'も', 'か', 'な', 'だ', 'です', 'ます', 'ました', 'て', 'た', 'する', 'した', 'ある', 'いる', 'なる', 'れる', 'られる', 'です', 'ます', 'でした', 'ました', 'です', 'ます', 'です', 'ます'}
-            stop_pos = ['助詞', '助動詞', '記号']
-            
-            for token in tokens:
-                surface = token.surface
-                pos = token.part_of_speech.split(',')[0]
-                
-                # Skip stop words and stop parts of speech
-                if surface not in stop_words and pos not in stop_pos:
-                    # Keep nouns, verbs, adjectives, and meaningful words
-                    if pos in ['名詞', '動詞', '形容詞'] or len(surface) >= 2:
-                        if len(surface) >= 2 and len(surface) <= 10:
-                            words.append(surface)
-        except Exception:
-            # Fallback to simple extraction if tokenization fails
-            pass
-    
-    # Fallback: simple character-based extraction
-    if not words:
-        japanese_pattern = r'[\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FAF\w]+'
-        phrases = re.findall(japanese_pattern, text)
-        stop_words = {'の', 'に', 'は', 'を', 'が', 'で', 'と', 'も', 'か', 'な', 'だ', 'です', 'ます', 'ました', 'て', 'た', 'する', 'した', 'ある', 'いる', 'なる', 'れる', 'られる'}
-        words = [p for p in phrases if 2 <= len(p) <= 10 and p not in stop_words]
-    
-    return words
-
-
-def analyze_cluster_features(comments, cluster_labels, vectorizer, n_clusters):
-    """Analyze features of each cluster and generate summary."""
-    cluster_analyses = []
-    
-    # Get feature names from vectorizer
-    feature_names = vectorizer.get_feature_names_out()
-    
-    for i in range(n_clusters):
-        mask = np.array(cluster_labels) == i
-        cluster_comments = [comments[j] for j in range(len(comments)) if mask[j]]
-        
-        if len(cluster_comments) == 0:
-            continue
-        
-        # Extract meaningful words from comments using morphological analysis
-        all_words = []
-        for comment in cluster_comments:
-            words = extract_japanese_words(comment)
-            all_words.extend(words)
-        
-        # Count word frequency
-        word_freq = Counter(all_words)
-        
-        # Get top keywords: combine TF-IDF and frequency-based approach
-        # First, get TF-IDF top keywords
-        cluster_text = ' '.join(cluster_comments)
-        cluster_vector = vectorizer.transform([cluster_text])
-        feature_array = cluster_vector.toarray()[0]
-        top_indices = np.argsort(feature_array)[-15:][::-1]  # Top 15 keywords
-        tfidf_keywords = [feature_names[idx] for idx in top_indices if feature_array[idx] > 0]
-        
-        # Get top frequent words (at least 2 occurrences)
-        frequent_words = [word for word, count in word_freq.most_common(20) if count >= 2]
-        
-        # Combine and deduplicate, prioritize frequent words
-        combined_keywords = []
-        seen = set()
-        
-        # Add frequent words first (they are more reliable)
-        for word in frequent_words[:5]:
-            if word not in seen and len(word) >= 2:
-                combined_keywords.append(word)
-                seen.add(word)
-        
-        # Add TF-IDF keywords that aren't already included
-        for keyword in tfidf_keywords:
-            if keyword not in seen and len(keyword) >= 2:
-                combined_keywords.append(keyword)
-                seen.add(keyword)
-        
-        # Get top 3 keywords
-        top_keywords = combined_keywords[:3]
-        
-        # Generate summary
-        avg_length = np.mean([len(c) for c in cluster_comments])
-        sample_comments = cluster_comments[:3]  # Sample comments
-        
-        cluster_analyses.append({
-            'cluster_id': i,
-            'comment_count': len(cluster_comments),
-            'top_keywords': top_keywords,  # Top 3 keywords (unified)
-            'avg_comment_length': round(avg_length, 1),
-            'sample_comments': sample_comments
-        })
-    
-    return cluster_analyses
-
-
-def perform_clustering(comments_df, n_clusters=6):
-    """Perform 3D clustering on comments."""
-    if comments_df is None or len(comments_df) == 0:
-        return None
-    
-    # Check if comment_text column exists
-    if 'comment_text' not in comments_df.columns:
-        return None
-    
-    try:
-        # Extract and clean comments
-        comments = comments_df['comment_text'].apply(clean_text).tolist()
-        comments = [c for c in comments if c and len(c.strip()) > 0]  # Remove empty comments
-        
-        # Limit max clusters to 6
-        max_clusters = min(6, n_clusters)
-        if len(comments) < max_clusters:
-            max_clusters = max(2, len(comments) // 2)
-        
-        if len(comments) < 2:
-            return None
-        
-        # Vectorize
-        vectorizer = TfidfVectorizer(
-            max_features=1000,
-            stop_words=None,
-            ngram_range=(1, 2),
-            min_df=1,
-            max_df=0.95
-        )
-        vectors = vectorizer.fit_transform(comments)
-        
-        if vectors.shape[0] < 2:
-            return None
-        
-        # Reduce to 3D
-        pca = PCA(n_components=3, random_state=42)
-        vectors_3d = pca.fit_transform(vectors.toarray())
-        
-        # Cluster
-        kmeans = KMeans(n_clusters=max_clusters, random_state=42, n_init=10)
-        cluster_labels = kmeans.fit_predict(vectors_3d)
-        
-        # Analyze cluster features
-        cluster_analyses = analyze_cluster_features(comments, cluster_labels.tolist(), vectorizer, max_clusters)
-        
-        # Calculate cluster centers and radii for sphere visualization
-        cluster_centers = []
-        cluster_radii = []
-        for i in range(max_clusters):
-            mask = cluster_labels == i
-            if np.sum(mask) > 0:
-                cluster_points = vectors_3d[mask]
-                center = np.mean(cluster_points, axis=0)
-                # Calculate radius as max distance from center to points in cluster
-                distances = np.linalg.norm(cluster_points - center, axis=1)
-                radius = np.max(distances) if len(distances) > 0 else 0.1
-                cluster_centers.append(center.tolist())
-                cluster_radii.append(float(radius))
-            else:
-                cluster_centers.append([0, 0, 0])
-                cluster_radii.append(0.1)
-        
-        # Add jitter to points to prevent overlapping
-        # Calculate the overall scale of the data
-        data_range = np.max(vectors_3d, axis=0) - np.min(vectors_3d, axis=0)
-        jitter_scale = np.mean(data_range) * 0.02  # 2% of average range
-        
-        # Add small random offset to each point
-        np.random.seed(42)  # For reproducibility
-        jitter = np.random.normal(0, jitter_scale, vectors_3d.shape)
-        vectors_3d_jittered = vectors_3d + jitter
-        
-        # Prepare data for visualization
-        cluster_data = {
-            'x': vectors_3d_jittered[:, 0].tolist(),
-            'y': vectors_3d_jittered[:, 1].tolist(),
-            'z': vectors_3d_jittered[:, 2].tolist(),
-            'cluster_labels': cluster_labels.tolist(),
-            'comments': comments,
-            'explained_variance': float(pca.explained_variance_ratio_.sum()),
-            'n_clusters': max_clusters,
-            'cluster_centers': cluster_centers,
-            'cluster_radii': cluster_radii,
-            'cluster_analyses': cluster_analyses
-        }
-        
-        return cluster_data
-    except Exception as e:
-        import traceback
-        print(f"Clustering error: {e}")
-        print(traceback.format_exc())
-        return None
+from django.contrib.admin.views.decorators import staff_member_required
+from django.conf import settings
+from .models import YouTubeComment, Plan, UserPlan, ImportJob
+from .importers import get_import_mode
+from .import_jobs import enqueue_import, fail_stale_import_jobs, job_status, run_import_job
+from .jobs import get_dashboard_result
+from .snapshots import current_data_key, get_or_build_snapshot_data, get_snapshot_info
+from .pagination import KeysetPaginator, attach_links, cached_count
+from .instrumentation import request_summary, timed
+import calendar
+import os
+from datetime import timedelta
+
+
+def get_comment_page(request, limit):
+    """コメント一覧の1ページ分（?cursor= で指定、総件数はデータバージョンごとにキャッシュ）"""
+    queryset = YouTubeComment.objects.all()
+    paginator = KeysetPaginator(queryset, limit, count=cached_count(queryset, 'all'))
+    page_obj = paginator.page(request.GET.get('cursor'))
+    return attach_links(page_obj, request, limit=limit)
 
 
 def index(request):
@@ -256,140 +37,13 @@ def index(request):
     if limit not in limit_options:
         limit = 30
     
-    # ページ番号を取得（デフォルト: 1ページ目）
-    page_number = request.GET.get('page', 1)
-    
-    # テーブル表示用には全件を取得してページネーション
-    all_comments = YouTubeComment.objects.all().order_by('-created_at')
-    
-    # ページネーション
-    paginator = Paginator(all_comments, limit)
-    page_obj = paginator.get_page(page_number)
+    # テーブル表示用: (created_at, id) をキーにしたカーソルでページネーション
+    # （OFFSETを使わないため、何ページ目でも同じコストで表示できる）
+    page_obj = get_comment_page(request, limit)
     comments = page_obj.object_list
 
-    # キャッシュキー生成用：データが更新されたかどうかを判定
-    # コメント数と最新更新時刻を取得
-    comment_count = YouTubeComment.objects.count()
-    latest_update = YouTubeComment.objects.aggregate(Max('created_at'))['created_at__max']
-    cache_key_base = f"index_data_{comment_count}_{latest_update}"
-    
-    # キャッシュからデータを取得
-    graph_data = cache.get(f"{cache_key_base}_graph")
-    stats = cache.get(f"{cache_key_base}_stats")
-    analysis = cache.get(f"{cache_key_base}_analysis")
-    advice = cache.get(f"{cache_key_base}_advice")
-    cluster_data = cache.get(f"{cache_key_base}_cluster")
-    
-    # キャッシュにない場合は計算
-    if graph_data is None or stats is None:
-        # グラフ用には最大300件を使用
-        comments_for_graph = YouTubeComment.objects.all()[:300]
-        
-        if comments_for_graph.exists():
-            df = pd.DataFrame(list(comments_for_graph.values(
-            "like_count",
-            "reply_count",
-            "created_at",
-                "author",
-                "comment_text",
-            )))
-
-            # タイムスタンプを数値に変換
-            df["created_at_num"] = df["created_at"].astype("int64") // 10**9
-            
-            # グラフ用のデータをリスト形式に変換
-            graph_data = {
-                "x": df["like_count"].tolist(),
-                "y": df["reply_count"].tolist(),
-                "z": df["created_at_num"].tolist(),
-                "text": [
-                    f"Author: {author}<br>Likes: {likes}<br>Replies: {replies}<br>Comment: {text[:50]}..."
-                    for author, likes, replies, text in zip(
-                        df["author"], df["like_count"], df["reply_count"], df["comment_text"]
-                    )
-                ],
-                "colors": df["created_at_num"].tolist(),  # 色分け用
-            }
-
-            # 統計情報を計算
-            stats = {
-                "total_comments": len(df),
-                "avg_likes": float(df["like_count"].mean()),
-                "avg_replies": float(df["reply_count"].mean()),
-                "max_likes": int(df["like_count"].max()),
-                "max_replies": int(df["reply_count"].max()),
-                "total_likes": int(df["like_count"].sum()),
-                "total_replies": int(df["reply_count"].sum()),
-            }
-            
-            # 分析結果とアドバイスを生成（有料プラン・無料プラン両方で生成）
-            if analysis is None:
-                analysis = None
-                advice = None
-            
-            if len(df) > 0:
-                # 分析結果を生成
-                high_engagement = df[(df["like_count"] > stats["avg_likes"]) & (df["reply_count"] > stats["avg_replies"])]
-                low_engagement = df[(df["like_count"] < stats["avg_likes"]) & (df["reply_count"] < stats["avg_replies"])]
-                
-                engagement_ratio = len(high_engagement) / len(df) * 100 if len(df) > 0 else 0
-                
-                analysis = {
-                    "high_engagement_count": len(high_engagement),
-                    "low_engagement_count": len(low_engagement),
-                    "engagement_ratio": round(engagement_ratio, 1),
-                    "top_comment_likes": int(df.nlargest(1, "like_count")["like_count"].iloc[0]) if len(df) > 0 else 0,
-                    "top_comment_replies": int(df.nlargest(1, "reply_count")["reply_count"].iloc[0]) if len(df) > 0 else 0,
-                }
-                
-                # アドバイスを生成
-                advice_items = []
-                
-                if stats["avg_likes"] < 5:
-                    advice_items.append("平均いいね数が低い傾向にあります。コメントの内容をより具体的で価値のあるものにすることで、エンゲージメントを向上させることができます。")
-                
-                if stats["avg_replies"] < 2:
-                    advice_items.append("返信数が少ない傾向にあります。質問形式のコメントや議論を促す内容を増やすことで、コミュニティの活性化につながります。")
-                
-                if engagement_ratio < 20:
-                    advice_items.append("高エンゲージメントコメントの割合が低いです。視聴者の興味を引く話題や、タイムリーな内容を意識することで改善できます。")
-                
-                if len(high_engagement) > 0:
-                    top_comment = df.nlargest(1, "like_count").iloc[0]
-                    advice_items.append(f"最もエンゲージメントが高いコメントは{int(top_comment['like_count'])}いいね、{int(top_comment['reply_count'])}返信を獲得しています。このようなコメントの特徴を分析し、同様のアプローチを他のコメントにも適用することをお勧めします。")
-                
-                if stats["max_likes"] > stats["avg_likes"] * 3:
-                    advice_items.append("一部のコメントが非常に高いエンゲージメントを獲得しています。これらの成功パターンを分析し、コンテンツ戦略に反映させることで、全体的なエンゲージメント向上が期待できます。")
-                
-                if not advice_items:
-                    advice_items.append("現在のエンゲージメント状況は良好です。継続的な分析と改善により、さらなる成長が期待できます。")
-                
-                advice = advice_items
-            
-            # 3Dクラスタリング処理
-            if cluster_data is None:
-                cluster_data = None
-                if len(df) > 0:
-                    try:
-                        cluster_data = perform_clustering(df, n_clusters=6)
-                    except Exception as e:
-                        import traceback
-                        print(f"Clustering failed: {e}")
-                        print(traceback.format_exc())
-                        cluster_data = None
-            
-            # キャッシュに保存（5分間有効）
-            cache.set(f"{cache_key_base}_graph", graph_data, 300)
-            cache.set(f"{cache_key_base}_stats", stats, 300)
-            cache.set(f"{cache_key_base}_analysis", analysis, 300)
-            cache.set(f"{cache_key_base}_advice", advice, 300)
-            if cluster_data:
-                cache.set(f"{cache_key_base}_cluster", cluster_data, 300)
-        else:
-            # comments_for_graphが存在しない場合の初期化
-            if cluster_data is None:
-                cluster_data = None
-    
+    # 分析結果（グラフ・統計・クラスタ）はHTMLに埋め込まず、ブラウザが dashboard_section から非同期に読み込む
+
     # 有料プランチェック（ユーザーごとに異なるためキャッシュしない）
     is_premium = False
     if request.user.is_authenticated:
@@ -399,18 +53,90 @@ def index(request):
         except UserPlan.DoesNotExist:
             pass
 
-    return render(request, "index.html", {
-        "graph_data": json.dumps(graph_data) if graph_data else None,
-        "stats": stats,
-        "comments": comments,
-        "page_obj": page_obj,
-        "current_limit": limit,
-        "limit_options": limit_options,
-        "is_premium": is_premium,
-        "analysis": analysis,
-        "advice": advice,
-        "cluster_data": json.dumps(cluster_data) if cluster_data is not None else None,
+    with timed('template'):
+        return render(request, "index.html", {
+            "comments": comments,
+            "page_obj": page_obj,
+            "current_limit": limit,
+            "limit_options": limit_options,
+            "is_premium": is_premium,
+            "import_jobs": recent_import_jobs(request),
+        })
+
+
+# データAPIのセクション名 -> 返す分析結果のキー
+DASHBOARD_SECTIONS = {
+    'graph': ('graph',),
+    'stats': ('stats', 'analysis', 'advice'),
+    'clusters': ('cluster',),
+}
+
+
+def load_dashboard_data(data_key):
+    """分析結果を取得する。戻り値は (結果, 計算中かどうか)"""
+    if getattr(settings, 'ANALYSIS_ASYNC', False):
+        # 非同期モード: 計算はワーカーに任せ、前回の結果を返す
+        data, pending = get_dashboard_result(data_key)
+    else:
+        # 同期モード: 他のワーカーが計算中の場合は前回の結果を返す
+        data, pending = get_or_build_snapshot_data(data_key)
+    return data or {}, pending
+
+
+def snapshot_validators(data_key, section):
+    """
+    スナップショットに対応する (ETag, Last-Modified のUNIX時刻) を返す（なければNone）
+    ETag はデータキー（データバージョン）とスナップショットのIDから作るため、
+    データの更新やクラスタリングの再学習（スナップショットの置き換え）で変わる
+    """
+    info = get_snapshot_info(data_key)
+    if info is None:
+        return None
+    snapshot_id, created_at = info
+    if timezone.is_naive(created_at):
+        created_at = timezone.make_aware(created_at)
+    return quote_etag(f"{section}-{data_key}-{snapshot_id}"), calendar.timegm(created_at.utctimetuple())
+
+
+def set_validators(response, validators):
+    etag, last_modified = validators
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # ブラウザには保存させ、使う前に毎回 ETag で確認させる（max-age=0 のためページキャッシュにも保存されない）
+    patch_cache_control(response, no_cache=True, max_age=0)
+    return response
+
+
+def dashboard_section(request, section):
+    """
+    分析結果のデータAPI（graph / stats / clusters）
+    ETag / Last-Modified に対応し、データが変わっていなければ 304 を返す（分析結果は読み込まない）
+    計算中で前回の結果を返す場合は pending=true とし、ブラウザにキャッシュさせない
+    """
+    keys = DASHBOARD_SECTIONS.get(section)
+    if keys is None:
+        raise Http404("不明なセクションです")
+
+    data_key = current_data_key()
+    validators = snapshot_validators(data_key, section)
+    if validators is not None:
+        etag, last_modified = validators
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            return set_validators(response, validators)
+
+    data, pending = load_dashboard_data(data_key)
+    response = JsonResponse({
+        "pending": pending,
+        **{key: data.get(key) for key in keys},
     })
+    if pending:
+        add_never_cache_headers(response)
+        return response
+    validators = validators or snapshot_validators(data_key, section)
+    if validators is not None:
+        set_validators(response, validators)
+    return response
 
 
 def comments_table(request):
@@ -421,50 +147,86 @@ def comments_table(request):
     if limit not in limit_options:
         limit = 30
     
-    # ページ番号を取得（デフォルト: 1ページ目）
-    page_number = request.GET.get('page', 1)
-    
-    # テーブル表示用には全件を取得してページネーション
-    all_comments = YouTubeComment.objects.all().order_by('-created_at')
-    
-    # ページネーション
-    paginator = Paginator(all_comments, limit)
-    page_obj = paginator.get_page(page_number)
+    # テーブル表示用: (created_at, id) をキーにしたカーソルでページネーション
+    # （OFFSETを使わないため、何ページ目でも同じコストで表示できる）
+    page_obj = get_comment_page(request, limit)
     comments = page_obj.object_list
 
     from django.template.loader import render_to_string
-    html = render_to_string('comments_table.html', {
-        'comments': comments,
-        'page_obj': page_obj,
-        'current_limit': limit,
-        'limit_options': limit_options,
-    }, request=request)
+    with timed('template'):
+        html = render_to_string('comments_table.html', {
+            'comments': comments,
+            'page_obj': page_obj,
+            'current_limit': limit,
+            'limit_options': limit_options,
+        }, request=request)
     
     return JsonResponse({'html': html})
 
 
+@staff_member_required
+@never_cache
+def request_metrics(request):
+    """スタッフ用: ビューごとの直近のリクエストの計測結果（RequestMetricsMiddleware が有効な場合）"""
+    return JsonResponse({
+        'enabled': getattr(settings, 'REQUEST_METRICS_ENABLED', False),
+        'pid': os.getpid(),
+        'views': request_summary(),
+    }, json_dumps_params={'ensure_ascii': False})
+
+
+IMPORT_JOB_SESSION_KEY = 'import_job_ids'
+# ダッシュボードに表示するインポートジョブの期間と件数
+IMPORT_JOB_DISPLAY_HOURS = 1
+IMPORT_JOB_DISPLAY_LIMIT = 5
+
+
+def visible_import_jobs(request):
+    """リクエストのユーザーが参照できるインポートジョブ（未ログインの場合はセッションで登録したもの）"""
+    if request.user.is_authenticated and request.user.is_staff:
+        return ImportJob.objects.all()
+    if request.user.is_authenticated:
+        return ImportJob.objects.filter(owner=request.user)
+    return ImportJob.objects.filter(owner__isnull=True, pk__in=request.session.get(IMPORT_JOB_SESSION_KEY, []))
+
+
+def recent_import_jobs(request):
+    """ダッシュボード上部に進捗を表示するジョブ（直近のもの）"""
+    since = timezone.now() - timedelta(hours=IMPORT_JOB_DISPLAY_HOURS)
+    queryset = visible_import_jobs(request)
+    if request.user.is_authenticated:
+        queryset = queryset.filter(owner=request.user)
+    return list(queryset.filter(created_at__gte=since).order_by('-created_at')[:IMPORT_JOB_DISPLAY_LIMIT])
+
+
+def start_import(request, upload, source_format, owner=None):
+    """
+    アップロードファイルを保存してインポートジョブを登録し、結果メッセージを設定する
+    IMPORT_ASYNC=False の場合はその場で処理する
+    """
+    run_async = getattr(settings, 'IMPORT_ASYNC', False)
+    job = enqueue_import(upload, source_format, owner=owner, mode=get_import_mode(request), run_inline=not run_async)
+    if owner is None:
+        job_ids = request.session.get(IMPORT_JOB_SESSION_KEY, [])
+        request.session[IMPORT_JOB_SESSION_KEY] = (job_ids + [job.pk])[-IMPORT_JOB_DISPLAY_LIMIT:]
+
+    if run_async:
+        messages.info(request, f"{job.file_name} のインポートを受け付けました。進捗はダッシュボード上部に表示されます。")
+        return job
+
+    job = run_import_job(job)
+    if job.status == ImportJob.STATUS_DONE:
+        messages.success(request, job.message)
+    else:
+        messages.error(request, job.message)
+    return job
+
+
 def import_csv(request):
-    """CSVファイルをインポート"""
+    """CSVファイルをインポート（ファイルを保存してインポートジョブとして処理する）"""
     if request.method == "POST" and request.FILES.get("csv_file"):
-        csv_file = TextIOWrapper(request.FILES["csv_file"].file, encoding="utf-8")
-        reader = csv.DictReader(csv_file)
-        count = 0
-        for row in reader:
-            YouTubeComment.objects.create(
-                video_id=row.get("video_id", ""),
-                comment_id=row.get("comment_id", ""),
-                comment_text=row.get("comment_text", ""),
-                author=row.get("author", ""),
-                like_count=int(row.get("like_count") or 0),
-                reply_count=int(row.get("reply_count") or 0),
-                reply_depth_potential=int(row.get("reply_depth_potential") or 0),
-                engagement_score=float(row.get("engagement_score") or 0),
-                created_at=row.get("created_at") or None,
-                ai_reply=row.get("ai_reply") if row.get("ai_reply") and row.get("ai_reply") != "null" else None,
-                embedding=row.get("embedding") if row.get("embedding") else None,
-            )
-            count += 1
-        messages.success(request, f"{count} 件のコメントをインポートしました。")
+        owner = request.user if request.user.is_authenticated else None
+        start_import(request, request.FILES["csv_file"], ImportJob.FORMAT_CSV, owner=owner)
         return redirect("index")
     
     messages.error(request, "CSVファイルを選択してください。")
@@ -472,58 +234,42 @@ def import_csv(request):
 
 
 def import_json(request):
-    """JSONファイルをインポート"""
+    """JSONファイルをインポート（ファイルを保存してインポートジョブとして処理する）"""
     if request.method == "POST" and request.FILES.get("json_file"):
-        json_file = request.FILES["json_file"]
-        try:
-            data = json.load(json_file)
-            count = 0
-            
-            # JSONが配列の場合
-            if isinstance(data, list):
-                for item in data:
-                    YouTubeComment.objects.create(
-                        video_id=item.get("video_id", ""),
-                        comment_id=item.get("comment_id", ""),
-                        comment_text=item.get("comment_text", ""),
-                        author=item.get("author", ""),
-                        like_count=int(item.get("like_count") or 0),
-                        reply_count=int(item.get("reply_count") or 0),
-                        reply_depth_potential=int(item.get("reply_depth_potential") or 0),
-                        engagement_score=float(item.get("engagement_score") or 0),
-                        created_at=item.get("created_at") or None,
-                        ai_reply=item.get("ai_reply") if item.get("ai_reply") and item.get("ai_reply") != "null" else None,
-                        embedding=item.get("embedding") if item.get("embedding") else None,
-                    )
-                    count += 1
-            # JSONがオブジェクトでcommentsキーがある場合
-            elif isinstance(data, dict) and "comments" in data:
-                for item in data["comments"]:
-                    YouTubeComment.objects.create(
-                        video_id=item.get("video_id", ""),
-                        comment_id=item.get("comment_id", ""),
-                        comment_text=item.get("comment_text", ""),
-                        author=item.get("author", ""),
-                        like_count=int(item.get("like_count") or 0),
-                        reply_count=int(item.get("reply_count") or 0),
-                        reply_depth_potential=int(item.get("reply_depth_potential") or 0),
-                        engagement_score=float(item.get("engagement_score") or 0),
-                        created_at=item.get("created_at") or None,
-                        ai_reply=item.get("ai_reply") if item.get("ai_reply") and item.get("ai_reply") != "null" else None,
-                        embedding=item.get("embedding") if item.get("embedding") else None,
-                    )
-                    count += 1
-            
-            messages.success(request, f"{count} 件のコメントをインポートしました。")
-            return redirect("index")
-        except json.JSONDecodeError:
-            messages.error(request, "JSONファイルの形式が正しくありません。")
-            return redirect("index")
+        owner = request.user if request.user.is_authenticated else None
+        start_import(request, request.FILES["json_file"], ImportJob.FORMAT_JSON, owner=owner)
+        return redirect("index")
     
     messages.error(request, "JSONファイルを選択してください。")
     return redirect("index")
 
 
+@never_cache
+def import_job_status(request, pk):
+    """Ajax用: インポートジョブの進捗・残り時間の目安"""
+    job = get_object_or_404(visible_import_jobs(request), pk=pk)
+    if fail_stale_import_jobs(ImportJob.objects.filter(pk=job.pk)):
+        # ワーカーが停止して止まったままのジョブ: 進捗表示を止めて失敗を表示する
+        job.refresh_from_db()
+    data = job_status(job)
+    data['error_report_url'] = reverse('import_job_errors', args=[job.pk]) if job.error_report_path else None
+    return JsonResponse(data)
+
+
+@never_cache
+def import_job_errors(request, pk):
+    """インポートジョブで不正だった行のエラーレポート（CSV）をダウンロード"""
+    job = get_object_or_404(visible_import_jobs(request), pk=pk)
+    if not job.error_report_path or not os.path.exists(job.error_report_path):
+        raise Http404("エラーレポートはありません。")
+    return FileResponse(
+        open(job.error_report_path, 'rb'),
+        as_attachment=True,
+        filename=f"import_{job.pk}_errors.csv",
+        content_type='text/csv; charset=utf-8',
+    )
+
+
 def pricing(request):
     # 現在のユーザーのプラン情報を取得
     current_plan = None
@@ -23,6 +23,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'myapp.middleware.RequestMetricsMiddleware',  # リクエストの計測（REQUEST_METRICS_ENABLED=True の場合のみ有効）
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.cache.UpdateCacheMiddleware',  # キャッシュミドルウェア（上）
@@ -129,16 +130,128 @@ STATIC_URL = '/static/'
 # ============================================
 # キャッシュ設定
 # ============================================
+# キャッシュの保存先（CACHE_BACKEND 環境変数）
+# 'locmem': プロセスごとのメモリ（デフォルト、ワーカー間で共有されない）
+# 'file':   CACHE_LOCATION のディレクトリにファイルで保存（同じホストのワーカーで共有）
+# 'sqlite': CACHE_LOCATION のSQLiteファイルに保存（同じホストのワーカーで共有）
+# 'redis':  CACHE_LOCATION のRedis（例: redis://127.0.0.1:6379/1、redis パッケージが必要）
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+_CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'unique-snowflake'),
+    'file': ('myapp.cache_backends.FileCache', str(BASE_DIR / 'var' / 'cache')),
+    'sqlite': ('myapp.cache_backends.SQLiteCache', str(BASE_DIR / 'var' / 'cache.sqlite3')),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379/1'),
+}
+if CACHE_BACKEND not in _CACHE_BACKENDS:
+    raise ValueError(f"CACHE_BACKEND は {', '.join(_CACHE_BACKENDS)} のいずれかを指定してください: {CACHE_BACKEND}")
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
+        'BACKEND': _CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': os.environ.get('CACHE_LOCATION', _CACHE_BACKENDS[CACHE_BACKEND][1]),
         'TIMEOUT': 300,  # 5分間キャッシュ
-        'OPTIONS': {
-            'MAX_ENTRIES': 1000
+        'OPTIONS': {} if CACHE_BACKEND == 'redis' else {
+            'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', '1000'))
         }
     }
 }
+# 重い計算結果（件数・分析結果）の再計算は、ロックを取った1プロセスだけが行う（myapp.caching）
+# 期限切れ後もこの秒数の間は古い値を保持し、再計算中の他のリクエストには古い値を返す
+CACHE_STALE_TIMEOUT = int(os.environ.get('CACHE_STALE_TIMEOUT', '600'))
+# 再計算のロックの有効期限（秒）。計算中にプロセスが落ちた場合もこの時間で解除される
+CACHE_LOCK_TIMEOUT = int(os.environ.get('CACHE_LOCK_TIMEOUT', '120'))
+
+# ============================================
+# コメントインポート・エクスポート設定
+# ============================================
+# bulk_create 1回あたりの件数（1チャンク = 1トランザクション）
+COMMENT_IMPORT_BATCH_SIZE = int(os.environ.get('COMMENT_IMPORT_BATCH_SIZE', '1000'))
+# アップロードされたインポートファイルとエラーレポートの保存先
+IMPORT_SPOOL_DIR = os.environ.get('IMPORT_SPOOL_DIR', str(BASE_DIR / 'var' / 'imports'))
+# True の場合、インポートはリクエスト内で行わず、
+# run_import_worker コマンド（python manage.py run_import_worker）がバックグラウンドで処理する。
+# 進捗と残り時間の目安はダッシュボード上部に表示される。
+IMPORT_ASYNC = os.environ.get('IMPORT_ASYNC', 'false').lower() in ('1', 'true', 'yes')
+# 実行中のままこの秒数を過ぎたインポートジョブは、ワーカーが停止したとみなして失敗にする
+IMPORT_JOB_TIMEOUT = int(os.environ.get('IMPORT_JOB_TIMEOUT', '7200'))
+# エクスポート時に1回のフェッチで読み込む件数（サーバーサイドカーソルのチャンクサイズ）
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', '2000'))
+# Parquetエクスポートの圧縮方式（zstd / snappy / gzip / none）。Parquet / Arrow の出力には pyarrow が必要
+EXPORT_PARQUET_COMPRESSION = os.environ.get('EXPORT_PARQUET_COMPRESSION', 'zstd')
+
+# ============================================
+# ダッシュボード分析ジョブ設定
+# ============================================
+# True の場合、クラスタリング等の分析はリクエスト内で行わず、
+# run_analysis_worker コマンド（python manage.py run_analysis_worker）がバックグラウンドで計算する。
+# 計算中は前回の結果を表示する。
+ANALYSIS_ASYNC = os.environ.get('ANALYSIS_ASYNC', 'false').lower() in ('1', 'true', 'yes')
+# 実行中のままこの秒数を過ぎた分析ジョブは、ワーカーが停止したとみなして再実行する
+ANALYSIS_JOB_TIMEOUT = int(os.environ.get('ANALYSIS_JOB_TIMEOUT', '1800'))
+# 分析ジョブが失敗したデータキーは、この秒数が過ぎるまで再計算しない
+ANALYSIS_RETRY_DELAY = int(os.environ.get('ANALYSIS_RETRY_DELAY', '600'))
+# 保持するダッシュボードスナップショット（DashboardSnapshot）の件数
+DASHBOARD_SNAPSHOT_KEEP = 5
+
+# ============================================
+# クラスタリング設定
+# ============================================
+# 3次元への次元削減方法
+# 'svd': 疎行列のままTruncatedSVDで削減（デフォルト、大量データ向け）
+# 'pca': 密行列に変換してPCAで削減（従来の方法）
+# 精度比較: python manage.py compare_reducers
+CLUSTERING_REDUCER = os.environ.get('CLUSTERING_REDUCER', 'svd')
+# 学習済みモデルを再利用し、以下のしきい値を超えた場合のみ再学習する
+# （手動で再学習する場合: python manage.py refit_clustering）
+# 最寄りの重心までの平均距離が学習時の何倍になったら再学習するか
+CLUSTERING_DRIFT_THRESHOLD = 1.5
+# 既知の語彙を1つも含まないコメントの割合がこれを超えたら再学習する
+CLUSTERING_UNSEEN_THRESHOLD = 0.2
+# クラスタリングエンジン
+# 'auto': 件数が CLUSTERING_MINIBATCH_THRESHOLD 以上なら MiniBatchKMeans、未満なら KMeans（デフォルト）
+# 'kmeans': 常に KMeans（n_init=10 の全件計算）
+# 'minibatch': 常に MiniBatchKMeans
+CLUSTERING_ENGINE = os.environ.get('CLUSTERING_ENGINE', 'auto')
+CLUSTERING_MINIBATCH_THRESHOLD = int(os.environ.get('CLUSTERING_MINIBATCH_THRESHOLD', '5000'))
+# MiniBatchKMeans の1バッチあたりの件数
+CLUSTERING_MINIBATCH_SIZE = 1024
+# クラスタ特徴分析の形態素解析キャッシュ（コメント本文のハッシュ単位）
+# メモリ上に保持する件数（LRU）
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', '10000'))
+# True の場合、解析結果を TokenCache テーブルにも保存し、再起動後・他プロセスでも再利用する
+TOKEN_CACHE_PERSIST = os.environ.get('TOKEN_CACHE_PERSIST', 'false').lower() in ('1', 'true', 'yes')
+
+# ============================================
+# 類似コメント検索（埋め込みベクトルのインデックス）設定
+# ============================================
+# 'auto': 件数が VECTOR_INDEX_ANN_THRESHOLD 以上なら近似検索（hnswlib）、未満なら全件比較（デフォルト）
+# 'exact': 常にNumPyで全件比較
+# 'hnsw': 常に近似検索（hnswlib が必要。未インストールの場合は全件比較）
+VECTOR_INDEX_BACKEND = os.environ.get('VECTOR_INDEX_BACKEND', 'auto')
+VECTOR_INDEX_ANN_THRESHOLD = int(os.environ.get('VECTOR_INDEX_ANN_THRESHOLD', '100000'))
+# メモリ上に保持するユーザー別インデックスの数
+VECTOR_INDEX_MAX_OWNERS = 8
+# 他のワーカーの変更を差分で反映する際、最新の反映済み更新日時からこの秒数だけ遡って再確認する
+# （コミットが遅れたトランザクション・サーバー間の時計のずれへの余裕）
+VECTOR_INDEX_SYNC_OVERLAP = int(os.environ.get('VECTOR_INDEX_SYNC_OVERLAP', '60'))
+
+# ============================================
+# リクエストの計測
+# ============================================
+# True の場合、リクエストごとにSQLの件数・DB時間・キャッシュのヒット/ミス・
+# クラスタリングやテンプレート描画の時間を計測し、Server-Timing ヘッダーで返す
+# （ブラウザの開発者ツールの Network > Timing で確認できる）。
+# ビューごとの直近の集計はスタッフ用の /metrics/requests/ で確認できる（プロセスごと）。
+REQUEST_METRICS_ENABLED = os.environ.get('REQUEST_METRICS_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+# ビューごとに保持する直近のリクエスト数
+REQUEST_METRICS_WINDOW = int(os.environ.get('REQUEST_METRICS_WINDOW', '1000'))
+
+# ============================================
+# 起動時間の上限
+# ============================================
+# python manage.py check_import_time で計測する、新しいプロセスでの起動（Django の初期化と URLconf の読み込み）の上限（ミリ秒）
+# NumPy / scikit-learn / pyarrow などは分析・エクスポート時に初めて読み込み、起動時には読み込まない
+IMPORT_TIME_BUDGET_MS = int(os.environ.get('IMPORT_TIME_BUDGET_MS', '1000'))
+
 STATICFILES_DIRS = [BASE_DIR / 'myapp' / 'static']
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
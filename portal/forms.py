@@ -81,3 +81,19 @@ class YouTubeCommentForm(forms.ModelForm):
             'ai_reply': 'AI返信',
         }
 
+    def clean(self):
+        """
+        (所有者, 動画ID, コメントID) の重複チェック
+        ownerはフォーム項目ではないため、DB制約違反になる前にここで検証する
+        """
+        cleaned_data = super().clean()
+        comment_id = cleaned_data.get('comment_id')
+        video_id = cleaned_data.get('video_id')
+        owner = self.instance.owner
+        if comment_id and owner is not None:
+            duplicates = YouTubeComment.objects.filter(
+                owner=owner, video_id=video_id, comment_id=comment_id
+            ).exclude(pk=self.instance.pk)
+            if duplicates.exists():
+                self.add_error('comment_id', 'この動画には同じコメントIDのコメントが既に登録されています。')
+        return cleaned_data
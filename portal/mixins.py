@@ -5,6 +5,7 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import PermissionDenied
 from django.shortcuts import get_object_or_404
 from django.http import Http404
+from myapp.pagination import DEFAULT_ORDERING, KeysetPaginator, attach_links
 
 
 class PortalLoginRequiredMixin(LoginRequiredMixin):
@@ -55,3 +56,27 @@ class OwnerRequiredMixin:
         
         return obj
 
+
+
+class KeysetPaginationMixin:
+    """
+    ListViewのページネーションをキーセット（カーソル）方式にするMixin
+    ?cursor= でページを指定する。COUNT(*) と OFFSET を使わないため、何ページ目でも同じコストで表示できる
+    """
+    keyset_ordering = DEFAULT_ORDERING
+    
+    def get_keyset_ordering(self):
+        return self.keyset_ordering
+    
+    def get_page_count(self, queryset):
+        """表示用の総件数（キャッシュ済みの値を返す。不要な場合は None）"""
+        return None
+    
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(
+            queryset, page_size,
+            ordering=self.get_keyset_ordering(),
+            count=self.get_page_count(queryset),
+        )
+        page = attach_links(paginator.page(self.request.GET.get('cursor')), self.request)
+        return (paginator, page, page.object_list, page.has_other_pages())
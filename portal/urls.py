@@ -20,5 +20,8 @@ urlpatterns = [
     path('comments/<int:pk>/', views.CommentDetailView.as_view(), name='comment_detail'),
     path('comments/<int:pk>/edit/', views.CommentUpdateView.as_view(), name='comment_update'),
     path('comments/<int:pk>/delete/', views.CommentDeleteView.as_view(), name='comment_delete'),
+    
+    # API
+    path('api/comments/<int:pk>/similar/', views.SimilarCommentsAPIView.as_view(), name='api_similar_comments'),
 ]
 
@@ -6,12 +6,14 @@ from django.contrib.auth import login
 from django.contrib.auth.views import LoginView, LogoutView
 from django.contrib.auth.forms import AuthenticationForm
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
+from django.http import JsonResponse
 from django.contrib import messages
-from django.db.models import Q
 from myapp.models import YouTubeComment
+from myapp.search import search_comments
+from myapp.pagination import DEFAULT_ORDERING, cached_count
 from .forms import YouTubeCommentForm
-from .mixins import PortalLoginRequiredMixin, OwnerRequiredMixin
+from .mixins import PortalLoginRequiredMixin, OwnerRequiredMixin, KeysetPaginationMixin
 
 
 class PortalLoginView(LoginView):
@@ -49,7 +51,7 @@ class PortalLogoutView(LogoutView):
         return super().dispatch(request, *args, **kwargs)
 
 
-class PortalDashboardView(PortalLoginRequiredMixin, ListView):
+class PortalDashboardView(PortalLoginRequiredMixin, KeysetPaginationMixin, ListView):
     """
     ポータルダッシュボード（一覧ページ）
     """
@@ -63,28 +65,28 @@ class PortalDashboardView(PortalLoginRequiredMixin, ListView):
         """
         queryset = YouTubeComment.objects.filter(owner=self.request.user)
         
-        # 検索機能
-        search_query = self.request.GET.get('search', '')
-        if search_query:
-            queryset = queryset.filter(
-                Q(comment_text__icontains=search_query) |
-                Q(author__icontains=search_query) |
-                Q(video_id__icontains=search_query)
-            )
-        
-        return queryset.order_by('-created_at')
+        # 検索機能（PostgreSQLでは全文検索インデックスを使い、関連度順に並べる）
+        queryset, self.search_ranked = search_comments(queryset, self.request.GET.get('search', ''))
+        return queryset
+    
+    def get_keyset_ordering(self):
+        if getattr(self, 'search_ranked', False):
+            return (('rank', True),) + DEFAULT_ORDERING
+        return DEFAULT_ORDERING
     
     def get_context_data(self, **kwargs):
         """
         コンテキストデータに追加情報を設定
         """
         context = super().get_context_data(**kwargs)
-        context['total_count'] = YouTubeComment.objects.filter(owner=self.request.user).count()
+        context['total_count'] = cached_count(
+            YouTubeComment.objects.filter(owner=self.request.user), 'all', owner_id=self.request.user.pk
+        )
         context['search_query'] = self.request.GET.get('search', '')
         return context
 
 
-class CommentListView(PortalLoginRequiredMixin, OwnerRequiredMixin, ListView):
+class CommentListView(PortalLoginRequiredMixin, OwnerRequiredMixin, KeysetPaginationMixin, ListView):
     """
     コメント一覧ビュー
     """
@@ -99,16 +101,17 @@ class CommentListView(PortalLoginRequiredMixin, OwnerRequiredMixin, ListView):
         """
         queryset = super().get_queryset()
         
-        # 検索機能
-        search_query = self.request.GET.get('search', '')
-        if search_query:
-            queryset = queryset.filter(
-                Q(comment_text__icontains=search_query) |
-                Q(author__icontains=search_query) |
-                Q(video_id__icontains=search_query)
-            )
-        
-        return queryset.order_by('-created_at')
+        # 検索機能（PostgreSQLでは全文検索インデックスを使い、関連度順に並べる）
+        queryset, self.search_ranked = search_comments(queryset, self.request.GET.get('search', ''))
+        return queryset
+    
+    def get_keyset_ordering(self):
+        if getattr(self, 'search_ranked', False):
+            return (('rank', True),) + DEFAULT_ORDERING
+        return DEFAULT_ORDERING
+    
+    def get_page_count(self, queryset):
+        return cached_count(queryset, f"search:{self.request.GET.get('search', '')}", owner_id=self.request.user.pk)
     
     def get_context_data(self, **kwargs):
         """
@@ -126,6 +129,52 @@ class CommentDetailView(PortalLoginRequiredMixin, OwnerRequiredMixin, DetailView
     model = YouTubeComment
     template_name = 'portal/comment_detail.html'
     context_object_name = 'comment'
+    similar_count = 5
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # 埋め込みベクトルが近いコメント（同じ所有者のコメントのみ）
+        from myapp.vector_index import similar_comments
+        context['similar_comments'] = similar_comments(self.object, k=self.similar_count)
+        return context
+
+
+class SimilarCommentsAPIView(PortalLoginRequiredMixin, OwnerRequiredMixin, DetailView):
+    """
+    類似コメントAPI（JSON）
+    GET /portal/api/comments/<pk>/similar/?k=10
+    """
+    model = YouTubeComment
+    max_k = 50
+
+    def get_k(self):
+        try:
+            k = int(self.request.GET.get('k', 10))
+        except ValueError:
+            k = 10
+        return max(1, min(k, self.max_k))
+
+    def render_to_response(self, context, **response_kwargs):
+        # NumPy を使うため、類似検索は最初の呼び出し時に読み込む
+        from myapp.vector_index import similar_comments
+
+        comment = self.object
+        results = [
+            {
+                'id': similar.pk,
+                'score': round(score, 6),
+                'video_id': similar.video_id,
+                'author': similar.author,
+                'comment_text': similar.comment_text,
+                'url': reverse('portal:comment_detail', args=[similar.pk]),
+            }
+            for similar, score in similar_comments(comment, k=self.get_k())
+        ]
+        return JsonResponse({
+            'id': comment.pk,
+            'has_embedding': comment.embedding_dim is not None,
+            'results': results,
+        })
 
 
 class CommentCreateView(PortalLoginRequiredMixin, CreateView):
@@ -137,6 +186,14 @@ class CommentCreateView(PortalLoginRequiredMixin, CreateView):
     template_name = 'portal/comment_form.html'
     success_url = reverse_lazy('portal:comment_list')
     
+    def get_form_kwargs(self):
+        """
+        重複チェックのため、検証前にownerを設定したインスタンスを渡す
+        """
+        kwargs = super().get_form_kwargs()
+        kwargs['instance'] = YouTubeComment(owner=self.request.user)
+        return kwargs
+    
     def form_valid(self, form):
         """
         フォームが有効な場合、ownerを現在のユーザーに設定
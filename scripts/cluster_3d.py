@@ -5,8 +5,10 @@ import pandas as pd
 import numpy as np
 import re
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.decomposition import PCA
-from sklearn.cluster import KMeans
+from sklearn.decomposition import PCA, TruncatedSVD
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import adjusted_rand_score, silhouette_score
+from scipy.linalg import subspace_angles
 import plotly.graph_objects as go
 import plotly.express as px
 import argparse
@@ -56,26 +58,71 @@ def vectorize_comments(comments, max_features=1000):
         stop_words=None,  # Keep all words for Japanese/English
         ngram_range=(1, 2),
         min_df=1,
-        max_df=0.95
+        max_df=0.95,
+        dtype=np.float32
     )
     vectors = vectorizer.fit_transform(comments)
     return vectors, vectorizer
 
 
-def reduce_to_3d(vectors):
-    """Reduce vectors to 3 dimensions using PCA."""
-    pca = PCA(n_components=3, random_state=42)
-    reduced = pca.fit_transform(vectors.toarray())
-    return reduced, pca
-
-
-def cluster_comments(vectors_3d, n_clusters=10):
-    """Cluster comments using KMeans."""
-    kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
+def make_reducer(method='svd'):
+    """TruncatedSVD works on the sparse matrix; PCA needs a dense copy."""
+    if method == 'pca':
+        return PCA(n_components=3, random_state=42)
+    return TruncatedSVD(n_components=3, algorithm='randomized', random_state=42)
+
+
+def reduce_to_3d(vectors, method='svd'):
+    """Reduce sparse TF-IDF vectors to 3 dimensions (TruncatedSVD by default)."""
+    reducer = make_reducer(method)
+    data = vectors.toarray() if method == 'pca' else vectors
+    reduced = reducer.fit_transform(data)
+    return reduced, reducer
+
+
+def compare_reducers(vectors, n_clusters):
+    """Compare TruncatedSVD and PCA: explained variance, subspace angle and cluster agreement."""
+    labels = {}
+    components = {}
+    for method in ('svd', 'pca'):
+        reduced, reducer = reduce_to_3d(vectors, method)
+        labels[method], _ = cluster_comments(reduced, n_clusters=n_clusters)
+        components[method] = reducer.components_.T
+        print(f"  {method.upper()} explained variance ratio: {reducer.explained_variance_ratio_.sum():.3f}")
+    angle = np.degrees(subspace_angles(components['svd'], components['pca']).max())
+    print(f"  Max subspace angle: {angle:.1f} deg")
+    print(f"  Cluster agreement (ARI): {adjusted_rand_score(labels['svd'], labels['pca']):.3f}")
+
+
+def select_engine(n_samples, engine='auto', minibatch_threshold=5000):
+    """'auto' uses MiniBatchKMeans from minibatch_threshold comments upward."""
+    if engine != 'auto':
+        return engine
+    return 'minibatch' if n_samples >= minibatch_threshold else 'kmeans'
+
+
+def cluster_comments(vectors_3d, n_clusters=10, engine='kmeans', batch_size=1024):
+    """Cluster comments using KMeans or MiniBatchKMeans."""
+    if engine == 'minibatch':
+        kmeans = MiniBatchKMeans(n_clusters=n_clusters, batch_size=batch_size, n_init=3, random_state=42)
+    else:
+        kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
     cluster_labels = kmeans.fit_predict(vectors_3d)
     return cluster_labels, kmeans
 
 
+def clustering_quality(vectors_3d, cluster_labels, kmeans, sample_size=2000):
+    """Return (inertia, silhouette); silhouette is sampled and None for a single cluster."""
+    distances = kmeans.transform(vectors_3d)[np.arange(len(cluster_labels)), cluster_labels]
+    inertia = float(np.square(distances).sum())
+    silhouette = None
+    if 2 <= len(np.unique(cluster_labels)) < len(cluster_labels):
+        silhouette = float(silhouette_score(vectors_3d, cluster_labels,
+                                            sample_size=min(len(cluster_labels), sample_size),
+                                            random_state=42))
+    return inertia, silhouette
+
+
 def create_3d_visualization(vectors_3d, cluster_labels, comments, output_path):
     """Create interactive 3D scatter plot using Plotly."""
     # Create color map for clusters
@@ -132,6 +179,14 @@ def main():
                        help='Number of clusters (default: 10)')
     parser.add_argument('--text-column', '-t', type=str, default=None,
                        help='Text column name (auto-detected if not specified)')
+    parser.add_argument('--reducer', '-r', choices=['svd', 'pca'], default='svd',
+                       help='3D reduction: svd (sparse TruncatedSVD) or pca (dense PCA) (default: svd)')
+    parser.add_argument('--compare-reducers', action='store_true',
+                       help='Print SVD vs PCA accuracy comparison before clustering')
+    parser.add_argument('--engine', '-e', choices=['auto', 'kmeans', 'minibatch'], default='auto',
+                       help='Clustering engine; auto uses MiniBatchKMeans for large inputs (default: auto)')
+    parser.add_argument('--minibatch-threshold', type=int, default=5000,
+                       help='Comment count from which auto selects MiniBatchKMeans (default: 5000)')
     
     args = parser.parse_args()
     
@@ -160,15 +215,23 @@ def main():
     vectors, vectorizer = vectorize_comments(comments)
     print(f"Vector shape: {vectors.shape}")
     
+    if args.compare_reducers:
+        print("Comparing reducers...")
+        compare_reducers(vectors, args.clusters)
+    
     # Reduce to 3D
-    print("Reducing to 3 dimensions with PCA...")
-    vectors_3d, pca = reduce_to_3d(vectors)
-    print(f"Explained variance ratio: {pca.explained_variance_ratio_.sum():.3f}")
+    print(f"Reducing to 3 dimensions with {args.reducer.upper()}...")
+    vectors_3d, reducer = reduce_to_3d(vectors, args.reducer)
+    print(f"Explained variance ratio: {reducer.explained_variance_ratio_.sum():.3f}")
     
     # Cluster
-    print(f"Clustering into {args.clusters} clusters...")
-    cluster_labels, kmeans = cluster_comments(vectors_3d, n_clusters=args.clusters)
+    engine = select_engine(len(comments), args.engine, args.minibatch_threshold)
+    print(f"Clustering into {args.clusters} clusters ({engine})...")
+    cluster_labels, kmeans = cluster_comments(vectors_3d, n_clusters=args.clusters, engine=engine)
     print(f"Cluster distribution: {np.bincount(cluster_labels)}")
+    inertia, silhouette = clustering_quality(vectors_3d, cluster_labels, kmeans)
+    print(f"Inertia: {inertia:.4f}")
+    print(f"Silhouette: {'-' if silhouette is None else f'{silhouette:.3f}'}")
     
     # Visualize
     print(f"Creating visualization...")